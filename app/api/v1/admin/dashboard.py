@@ -1,8 +1,6 @@
 import math
 from fastapi import APIRouter, Request, Depends, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
-import asyncio
-import re
 from core import state, security
 from core.templates import templates
 from app.api.dependencies import get_admin_service, get_system_ops, get_network_scanner
@@ -26,7 +24,7 @@ def admin_panel(
     stats = admin_svc.get_dashboard_stats()
     
     total_users_count = len(state.users)
-    active_users_count = sum(1 for u in state.users.values() if u.get("status") == "connected")
+    active_users_count = state.users.count("connected")
 
     dhcp_leases = net_scan.get_dhcp_leases()
     enriched_users = []
@@ -83,6 +81,8 @@ def admin_panel(
         "global_speed_limit": state.config.get("global_speed_limit", 5),
         "gaming_mode_enabled": state.config.get("gaming_mode_enabled", False),
         "coin_rates": state.config.get("coin_rates", "1:10,5:60,10:180,20:300"),
+        "quota_rates": state.config.get("quota_rates", ""),
+        "quota_exhausted_action": state.config.get("quota_exhausted_action", "block"),
         "banner_text": state.config.get("banner_text", ""),
         "banner_link": state.config.get("banner_link", ""),
         "banner_files": banner_files,
@@ -96,23 +96,45 @@ def admin_panel(
 
 @router.get("/admin/system_stats")
 async def get_system_stats(authorized: bool = Depends(security.is_admin), sys_ops: SystemOps = Depends(get_system_ops)):
-    return sys_ops.get_system_stats()
+    from services import background
+    # The shared sampler's last reading; sample directly only before it has run
+    return background.stats_sampler.latest or sys_ops.get_system_stats()
+
+@router.get("/admin/api/system_stats/history")
+async def get_system_stats_history(seconds: int = None, authorized: bool = Depends(security.is_admin)):
+    """Recent samples of the headline numbers (cpu, ram, temp, WAN byte totals)."""
+    from services import background
+    sampler = background.stats_sampler
+    return {"interval": state.config.get("system_stats_interval", 3), "samples": sampler.get_history(seconds)}
 
 @router.websocket("/admin/ws/system_stats")
-async def websocket_system_stats(websocket: WebSocket, sys_ops: SystemOps = Depends(get_system_ops)):
+async def websocket_system_stats(websocket: WebSocket):
+    from services import background
+    sampler = background.stats_sampler
     await websocket.accept()
+    # The sampler pushes to us; this loop only waits for the tab to go away
+    await sampler.subscribe(websocket)
     try:
-        while True:
-            if getattr(state, "is_shutting_down", False):
-                break
-            stats = sys_ops.get_system_stats()
-            await websocket.send_json(stats)
-            await asyncio.sleep(3)
+        while not getattr(state, "is_shutting_down", False):
+            await websocket.receive_text()
     except WebSocketDisconnect:
         pass
     except Exception as e:
         import logging
         logging.error(f"WebSocket System Stats Error: {e}")
+    finally:
+        sampler.unsubscribe(websocket)
+
+@router.get("/admin/api/scheduler")
+async def get_scheduler_stats(authorized: bool = Depends(security.is_admin)):
+    """Per-job timing stats for the background scheduler (runs, overruns, durations)."""
+    from services import background
+    return {"jobs": background.scheduler.stats()}
+
+@router.get("/admin/api/websockets")
+async def get_websocket_stats(authorized: bool = Depends(security.is_admin)):
+    """Portal socket counts: live, reaped by the heartbeat, evicted, and send queue totals."""
+    return state.manager.stats()
 
 @router.get("/admin/get_infrastructure_devices")
 def get_infrastructure_devices(authorized: bool = Depends(security.is_admin), net_scan: NetworkScanner = Depends(get_network_scanner)):
@@ -135,45 +157,19 @@ async def get_logs_json(
 
 @router.websocket("/admin/ws/logs")
 async def websocket_logs(websocket: WebSocket):
+    from services import background
+    tailer = background.log_tailer
     await websocket.accept()
-    # This regex pulls apart your professional log format: [Time] [Type] Message
-    log_pattern = re.compile(r"\[(.*?)\] \[(.*?)\] (.*)")
-    
     try:
-        with open("system.log", "r") as f:
-            # 1. Grab the last 50 lines for the initial load
-            lines = f.readlines()
-            last_lines = lines[-200:] if len(lines) > 200 else lines
-            
-            for line in last_lines:
-                match = log_pattern.search(line)
-                if match:
-                    await websocket.send_json({
-                        "timestamp": match.group(1),
-                        "type": match.group(2),
-                        "message": match.group(3)
-                    })
-
-            # 2. Tail the file continuously (Zero CPU overhead loop)
-            while True:
-                if getattr(state, "is_shutting_down", False):
-                    break
-                line = f.readline()
-                if not line:
-                    await asyncio.sleep(0.5) # Wait half a second if no new logs
-                    continue
-                
-                match = log_pattern.search(line)
-                if match:
-                    await websocket.send_json({
-                        "timestamp": match.group(1),
-                        "type": match.group(2),
-                        "message": match.group(3)
-                    })
-                    
+        # Last 200 entries, then every new line as the shared tailer parses it
+        await tailer.subscribe(websocket)
+        while not getattr(state, "is_shutting_down", False):
+            await websocket.receive_text()
     except WebSocketDisconnect:
         # Admin closed the dashboard tab
         pass
     except Exception as e:
         import logging
-        logging.error(f"WebSocket Log Error: {e}")
\ No newline at end of file
+        logging.error(f"WebSocket Log Error: {e}")
+    finally:
+        tailer.unsubscribe(websocket)
\ No newline at end of file
@@ -7,24 +7,22 @@ from fastapi.responses import RedirectResponse
 
 from core import database, state, security, utils
 from network import firewall
-from app.domain.models import RestartScheduleRequest, PointsConfigRequest
-from app.api.dependencies import get_system_ops
-from infrastructure.system_ops import SystemOps
+from app.domain.models import RestartScheduleRequest, PointsConfigRequest, MaintenanceJobRequest, SimulatedCoinsRequest, LogRetentionRequest
 from core.logger import audit_log
+from services.scheduler import CronSpec
 
 router = APIRouter()
 
 @router.post("/admin/reboot")
-async def reboot_device(
-    request: Request, authorized: bool = Depends(security.is_admin),
-    sys_ops: SystemOps = Depends(get_system_ops)
-):
+async def reboot_device(request: Request, authorized: bool = Depends(security.is_admin)):
     client_ip = request.client.host
     client_mac = utils.get_mac(client_ip) or "Unknown-MAC"
     
     try:
         audit_log("SYSTEM_REBOOT", client_ip, client_mac, "Initiated manual system reboot")
-        sys_ops.reboot_device()
+        # Drain (coins, flush, warm-restart snapshot) in the background so this response still goes out
+        from services import background
+        background.shutdown_coordinator.start(reason="manual")
         return {"status": "success", "message": "Rebooting now..."}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -107,6 +105,7 @@ async def update_settings(
     banner_link: str = Form(""), free_time_toggle: str = Form(None),
     free_time_duration: int = Form(5), sound_insert: str = Form("insert_coin_sound.mp3"),
     sound_coin: str = Form("coin-recieved.mp3"),
+    quota_rates: str = Form(None), quota_exhausted_action: str = Form(None),
     authorized: bool = Depends(security.is_admin)
 ):
     client_ip = request.client.host
@@ -127,12 +126,25 @@ async def update_settings(
         "sound_insert": sound_insert, "sound_coin": sound_coin,
         "free_time_enabled": new_free_enabled, "free_time_duration": free_time_duration
     })
+    # Only the portal tab posts the data plan fields
+    if quota_rates is not None:
+        state.config["quota_rates"] = quota_rates.strip()
+    if quota_exhausted_action in ("block", "throttle"):
+        state.config["quota_exhausted_action"] = quota_exhausted_action
     state.save_config()
     firewall.refresh_all_limits(state.users)
     
     audit_log("CONFIG_UPDATE", client_ip, client_mac, "Updated core system settings")
     return RedirectResponse(url="/admin", status_code=303)
 
+@router.get("/admin/api/shutdown")
+async def get_shutdown_report(authorized: bool = Depends(security.is_admin)):
+    """Per-phase timings of the shutdown in progress (or the last one since boot)."""
+    from services import background
+    coordinator = background.shutdown_coordinator
+    return {"in_progress": coordinator.in_progress, "report": coordinator.last_report,
+            "previous": state.last_shutdown}
+
 @router.get("/admin/get_restart_schedule")
 async def get_restart_schedule(authorized: bool = Depends(security.is_admin)):
     return state.config.get("restart_schedule", {"enabled": False, "time": "03:00"})
@@ -142,15 +154,111 @@ async def set_restart_schedule(request: Request, data: RestartScheduleRequest, a
     client_ip = request.client.host
     client_mac = utils.get_mac(client_ip) or "Unknown-MAC"
 
+    # Accepts "HH:MM" (daily) or a full cron expression
+    try: CronSpec(data.time)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
     state.config["restart_schedule"] = {
         "enabled": data.enabled,
         "time": data.time
     }
     state.save_config()
+
+    from services import background
+    background.reschedule_maintenance_job("reboot")
     
     audit_log("CONFIG_UPDATE", client_ip, client_mac, f"Modified restart schedule to {data.time} (Enabled: {data.enabled})")
     return {"status": "success", "message": "Schedule updated"}
 
+# --- MAINTENANCE JOBS ---
+@router.get("/admin/api/jobs")
+async def get_maintenance_jobs(authorized: bool = Depends(security.is_admin)):
+    """Maintenance jobs (cron, next/last run) plus the recent run history with durations."""
+    from services import background
+    return {
+        "jobs": background.scheduler.cron_stats(),
+        "history": list(reversed(background.scheduler.history))
+    }
+
+@router.post("/admin/api/jobs/{name}")
+async def set_maintenance_job(name: str, request: Request, data: MaintenanceJobRequest, authorized: bool = Depends(security.is_admin)):
+    client_ip = request.client.host
+    client_mac = utils.get_mac(client_ip) or "Unknown-MAC"
+
+    from services import background
+    if name not in background.maintenance_svc.jobs:
+        return {"status": "error", "message": f"Unknown job '{name}'"}
+    try: CronSpec(data.cron)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    if name == "reboot":
+        state.config["restart_schedule"] = {"enabled": data.enabled, "time": data.cron}
+    else:
+        jobs = dict(state.config.get("maintenance_jobs", {}))
+        jobs[name] = {"enabled": data.enabled, "cron": data.cron}
+        state.config["maintenance_jobs"] = jobs
+    state.save_config()
+    background.reschedule_maintenance_job(name)
+
+    audit_log("CONFIG_UPDATE", client_ip, client_mac, f"Maintenance job '{name}' set to '{data.cron}' (Enabled: {data.enabled})")
+    return {"status": "success", "message": "Job updated"}
+
+@router.post("/admin/api/jobs/{name}/run")
+async def run_maintenance_job(name: str, request: Request, authorized: bool = Depends(security.is_admin)):
+    client_ip = request.client.host
+    client_mac = utils.get_mac(client_ip) or "Unknown-MAC"
+
+    from services import background
+    if name not in background.scheduler.cron_jobs:
+        return {"status": "error", "message": f"Unknown job '{name}'"}
+
+    audit_log("SYSTEM_MAINTENANCE", client_ip, client_mac, f"Manually ran maintenance job '{name}'")
+    entry = await background.scheduler.run_cron_now(name)
+    return {"status": "success", "history": entry}
+
+# --- LOG STORE ---
+@router.get("/admin/api/logs/store")
+async def log_store_stats(authorized: bool = Depends(security.is_admin)):
+    """Size and age of logs.db plus the retention the log_prune job applies."""
+    from core.log_store import log_store
+    try: stats = log_store.stats()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    return {**stats, "retention_days": state.config.get("log_retention_days", 30)}
+
+@router.post("/admin/api/logs/retention")
+async def set_log_retention(request: Request, data: LogRetentionRequest, authorized: bool = Depends(security.is_admin)):
+    client_ip = request.client.host
+    client_mac = utils.get_mac(client_ip) or "Unknown-MAC"
+    if not 1 <= data.days <= 3650:
+        return {"status": "error", "message": "Retention must be between 1 and 3650 days"}
+
+    state.config["log_retention_days"] = data.days
+    state.save_config()
+    audit_log("CONFIG_UPDATE", client_ip, client_mac, f"Log retention set to {data.days} day(s)")
+    return {"status": "success", "message": "Retention updated"}
+
+@router.post("/admin/api/simulate/coins")
+async def simulate_coins(data: SimulatedCoinsRequest, authorized: bool = Depends(security.is_admin)):
+    """Feeds pulse trains into the simulated coin acceptor (GPIO_BACKEND=simulated only)."""
+    from hardware import controller
+    if not 1 <= data.slot <= len(controller.slots):
+        return {"status": "error", "message": f"No coin slot {data.slot}"}
+    try:
+        controller.simulate_coins(data.coins, interval=data.interval, slot=data.slot - 1, width=data.width,
+                                  gap=data.gap, jitter=data.jitter, bounce=data.bounce)
+    except RuntimeError as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "success", "coins": len(data.coins), "slot_user": controller.slots[data.slot - 1].user}
+
+@router.get("/admin/api/coin_queue")
+async def coin_queue_metrics(authorized: bool = Depends(security.is_admin)):
+    """Coin event queue depth, counters and credit latency (coin counted -> balance updated)."""
+    from services import background
+    return background.coin_queue.metrics()
+
 @router.get("/admin/get_points_config")
 async def get_points_config(authorized: bool = Depends(security.is_admin)):
     return {
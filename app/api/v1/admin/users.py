@@ -1,5 +1,6 @@
-from datetime import datetime
-from fastapi import APIRouter, Request, Form, Depends
+import time
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Request, Form, Depends, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse, RedirectResponse
 
 from core import database, state, security, utils
@@ -62,12 +63,13 @@ async def admin_manage_points(
     if mac in state.users:
         try:
             amount = abs(float(amount))
-            if action == "subtract":
-                state.users[mac]["points"] -= amount
-            elif action == "add":
-                state.users[mac]["points"] += amount
-            
-            if state.users[mac]["points"] < 0: state.users[mac]["points"] = 0
+            with state.users.lock:
+                if action == "subtract":
+                    state.users[mac]["points"] -= amount
+                elif action == "add":
+                    state.users[mac]["points"] += amount
+                
+                if state.users[mac]["points"] < 0: state.users[mac]["points"] = 0
             database.sync_user(mac, state.users[mac])
             
             audit_log("POINTS_UPDATE", client_ip, client_mac, f"{action.upper()} {amount} points applied to target user {mac}")
@@ -123,4 +125,84 @@ async def rename_device(request: Request, data: RenameRequest, authorized: bool
     state.save_config()
     
     audit_log("DEVICE_RENAMED", client_ip, client_mac, f"Renamed device {data.mac} to '{data.name.strip()}'")
-    return {"status": "success"}
\ No newline at end of file
+    return {"status": "success"}
+# --- LIVE USER TABLE ---
+@router.get("/admin/api/users/live")
+async def live_users_snapshot(page: int = 1, per_page: int = 50, search: str = "", status: str = None,
+                              authorized: bool = Depends(security.is_admin)):
+    """Paginated user table for /admin/ws/users clients: apply deltas with a higher seq on top."""
+    from services import background
+    return background.admin_feed.snapshot(page, per_page, search, status)
+
+@router.websocket("/admin/ws/users")
+async def websocket_users(websocket: WebSocket):
+    if not security.is_admin_socket(websocket):
+        await websocket.close(code=1008)
+        return
+    from services import background
+    feed = background.admin_feed
+    await websocket.accept()
+    feed.subscribe(websocket)
+    try:
+        while not getattr(state, "is_shutting_down", False):
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        feed.unsubscribe(websocket)
+
+# --- THROUGHPUT HISTORY ---
+@router.get("/admin/api/users/{mac}/throughput")
+async def user_throughput(mac: str, minutes: int = 60, authorized: bool = Depends(security.is_admin)):
+    """Per-minute bytes/packets for one device over the last `minutes` (max 24h)."""
+    from services import background
+    history = background.monitor_svc.history
+    start, byte_series, packet_series = history.series(mac, minutes, time.time())
+    return {
+        "mac": mac,
+        "resolution": history.resolution,
+        "start": start,
+        "bytes": byte_series,
+        "packets": packet_series,
+        "current": background.monitor_svc.snapshot.get(mac)
+    }
+
+@router.get("/admin/api/traffic")
+async def traffic_snapshot(authorized: bool = Depends(security.is_admin)):
+    """Latest download (rx) / upload (tx) counters and rates per connected user."""
+    from services import background
+    monitor = background.monitor_svc
+    return {"timestamp": monitor.snapshot_time, "users": monitor.snapshot}
+
+@router.get("/admin/api/top_talkers")
+async def top_talkers(minutes: int = 60, limit: int = 10, authorized: bool = Depends(security.is_admin)):
+    """Devices that moved the most bytes over the last `minutes`."""
+    from services import background
+    custom_names = state.config.get("custom_device_names", {})
+    talkers = []
+    for mac, total_bytes, total_packets in background.monitor_svc.history.top_talkers(minutes, time.time(), limit):
+        user = state.users.snapshot().get(mac) or {}
+        talkers.append({
+            "mac": mac,
+            "name": custom_names.get(mac),
+            "ip": user.get("ip"),
+            "status": user.get("status"),
+            "bytes": total_bytes,
+            "packets": total_packets,
+            "avg_bps": round(total_bytes * 8 / (max(1, minutes) * 60))
+        })
+    return {"minutes": minutes, "talkers": talkers}
+
+@router.get("/admin/api/usage/top")
+async def top_usage(start: str = None, end: str = None, limit: int = 10, authorized: bool = Depends(security.is_admin)):
+    """Heaviest users by finished-session traffic between two days (YYYY-MM-DD, inclusive; default: last 7 days)."""
+    try:
+        end_day = datetime.strptime(end, "%Y-%m-%d").date() if end else datetime.now().date()
+        start_day = datetime.strptime(start, "%Y-%m-%d").date() if start else end_day - timedelta(days=6)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    custom_names = state.config.get("custom_device_names", {})
+    users = database.get_top_usage(start_day.isoformat(), end_day.isoformat(), max(1, min(limit, 100)))
+    for user in users:
+        user["name"] = custom_names.get(user["mac"])
+    return {"start": start_day.isoformat(), "end": end_day.isoformat(), "users": users}
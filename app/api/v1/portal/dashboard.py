@@ -6,6 +6,7 @@ from fastapi.responses import HTMLResponse
 from core import state, utils
 from core.templates import templates
 from hardware import controller
+from services.sync_publisher import quota_mb
 
 router = APIRouter()
 
@@ -14,11 +15,15 @@ async def home(request: Request):
     client_ip = request.client.host
     client_mac = utils.get_mac(client_ip)
     
+    user_data = {}
     if client_mac:
-        if client_mac not in state.users:
-            state.users[client_mac] = {"time": 0, "status": "new", "balance": 0, "free_claimed": 0, "points": 0}
-        state.users[client_mac]["ip"] = client_ip
-        state.users[client_mac]["last_active"] = time.time()
+        # A miss reads SQLite: keep it off the event loop
+        from services import background
+        user_data = await background.scheduler.run_blocking(
+            state.users.get_or_create, client_mac,
+            {"time": 0, "status": "new", "balance": 0, "free_claimed": 0, "points": 0})
+        user_data["ip"] = client_ip
+        user_data["last_active"] = time.time()
     
     # Check for banners
     banner_dir = "static/banners/set"
@@ -32,7 +37,6 @@ async def home(request: Request):
     if not banners:
         banners = ["/static/banners/default/banner_default.jpg"]
 
-    user_data = state.users.get(client_mac, {})
     is_claimed = (user_data.get("free_claimed", 0) == 1)
     s_insert = state.config.get("sound_insert", "insert_coin_sound.mp3")
     s_coin = state.config.get("sound_coin", "coin-recieved.mp3")
@@ -52,29 +56,40 @@ async def home(request: Request):
         "sound_coin_url": f"/static/sounds/{s_coin}",
         "points": user_data.get("points", 0),
         "points_enabled": state.config.get("points_enabled", False),
-        "coin_point_map": state.config.get("coin_point_map", {}) 
+        "coin_point_map": state.config.get("coin_point_map", {}),
+        "quota_rates": state.config.get("quota_rates", ""),
+        "quota_mb": quota_mb(user_data)
     })
 
 @router.get("/status")
 async def check_status(mac: str, request: Request):
-    user = state.users.get(mac, {"time": 0, "status": "new", "balance": 0})
+    from services import background
+    user = await background.scheduler.run_blocking(state.users.get, mac)
+    if user is None: user = {"time": 0, "status": "new", "balance": 0}
     if "balance" not in user: user["balance"] = 0
     if request.client.host: user["ip"] = request.client.host
 
-    is_busy = (controller.current_slot_user is not None and controller.current_slot_user != mac)
-    slot_seconds_left = int(max(0, state.config.get("slot_expiry_timestamp", 0) - time.time())) if controller.current_slot_user == mac else 0
+    own_slot = controller.slot_of(mac)
+    is_busy = own_slot is None and all(s.user is not None for s in controller.slots)
+    slot_seconds_left = own_slot.seconds_left() if own_slot else 0
 
     return {
         "time_remaining": user["time"], 
+        "expires_at": user.get("expires_at") if user["status"] == "connected" else None,
+        "server_time": time.time(),
         "status": user["status"], 
         "balance": user["balance"], 
         "is_busy": is_busy,
         "slot_seconds": slot_seconds_left,
+        "slot": own_slot.number if own_slot else None,
+        "slot_count": len(controller.slots),
         "slot_max_seconds": state.config.get("slot_timeout", 30),
         "coin_rates": state.config.get("coin_rates", "1:10,5:60,10:180,20:300"),
         "banner_text": state.config.get("banner_text", ""),
         "banner_link": state.config.get("banner_link", ""),
         "points": user.get("points", 0),
         "points_enabled": state.config.get("points_enabled", False),
-        "coin_point_map": state.config.get("coin_point_map", {})
+        "coin_point_map": state.config.get("coin_point_map", {}),
+        "quota_mb": quota_mb(user),
+        "quota_rates": state.config.get("quota_rates", "")
     }
\ No newline at end of file
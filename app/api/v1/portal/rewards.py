@@ -16,17 +16,17 @@ def claim_free_time(mac: str):
     if not state.config.get("free_time_enabled", False): return {"result": "disabled"}
     user = state.users.get(mac)
     if not user: return {"result": "error"} 
-    if user.get("free_claimed", 0) == 1: return {"result": "already_claimed"}
-
     duration = state.config.get("free_time_duration", 5) 
-    user["time"] += (duration * 60)
-    user["free_claimed"] = 1
-    user["status"] = "connected"
-    user["last_active"] = time.time()
-    user["expires_at"] = time.time() + user["time"]  # set deadline
+    with state.users.lock:
+        if user.get("free_claimed", 0) == 1: return {"result": "already_claimed"}
+        user["time"] += (duration * 60)
+        user["free_claimed"] = 1
+        user["status"] = "connected"
+        user["last_active"] = time.time()
+        user["expires_at"] = time.time() + user["time"]  # set deadline
     firewall.allow_user(mac, user.get("ip"))
     
-    if controller.current_slot_user == mac: controller.turn_slot_off()
+    controller.release_slot(mac)
     database.sync_user(mac, user)
     
     system_log(f"[{user.get('ip', 'Unknown')} | {mac}] Claimed {duration} mins of Free Time.")
@@ -42,10 +42,12 @@ def claim_free_time(mac: str):
 async def rewards_page(request: Request):
     client_ip = request.client.host
     mac = utils.get_mac(client_ip)
-    if mac and mac not in state.users:
-        state.users[mac] = {"time": 0, "status": "new", "balance": 0, "points": 0}
-        
-    user = state.users.get(mac, {})
+    user = {}
+    if mac:
+        # A miss reads SQLite: keep it off the event loop
+        user = await background.scheduler.run_blocking(
+            state.users.get_or_create, mac, {"time": 0, "status": "new", "balance": 0, "points": 0})
+
     return templates.TemplateResponse("rewards.html", {
         "request": request, "mac": mac, "points": user.get("points", 0),
         "promos": state.config.get("point_promos", []),
@@ -67,13 +69,14 @@ def redeem_points(data: dict, request: Request):
     target_promo = next((p for p in state.config.get("point_promos", []) if p["id"] == promo_id), None)
     
     if not target_promo: return {"status": "error", "message": "Invalid Promo"}
-    if user.get("points", 0) < target_promo["cost"]: return {"status": "error", "message": "Not enough points"}
-        
-    user["points"] = round(user["points"] - target_promo["cost"], 2)
-    user["time"] += target_promo["minutes"] * 60
-    user["status"] = "connected"
-    user["last_active"] = time.time()
-    user["expires_at"] = time.time() + user["time"]  # set deadline
+    with state.users.lock:
+        if user.get("points", 0) < target_promo["cost"]: return {"status": "error", "message": "Not enough points"}
+            
+        user["points"] = round(user["points"] - target_promo["cost"], 2)
+        user["time"] += target_promo["minutes"] * 60
+        user["status"] = "connected"
+        user["last_active"] = time.time()
+        user["expires_at"] = time.time() + user["time"]  # set deadline
     
     firewall.allow_user(mac, user.get("ip"))
     database.sync_user(mac, user)
@@ -11,8 +11,9 @@ router = APIRouter()
 
 # --- ACTION ROUTES ---
 @router.post("/connect")
-async def start_internet(mac: str, session: SessionService = Depends(get_session_service)):
-    return await session.connect_user(mac) 
+async def start_internet(mac: str, plan: str = "time", session: SessionService = Depends(get_session_service)):
+    # plan=data converts the balance with "quota_rates" (MB cap) instead of "coin_rates"
+    return await session.connect_user(mac, plan) 
 
 @router.post("/pause")
 def pause_internet(mac: str, session: SessionService = Depends(get_session_service)):
@@ -22,31 +23,34 @@ def pause_internet(mac: str, session: SessionService = Depends(get_session_servi
 # Prevent captive portals from caching the request by forcing POST
 @router.post("/enable_slot")
 async def enable_slot(mac: str):
-    user = state.users.get(mac, {})
+    from services import background
+    user = await background.scheduler.run_blocking(state.users.get, mac) or {}
     if user.get("status") == "blocked": return {"result": "blocked"}
+    # Draining for a reboot: no new coins
+    if getattr(state, "is_shutting_down", False): return {"result": "busy"}
 
-    if controller.current_slot_user is None or controller.current_slot_user == mac:
-        controller.current_slot_user = mac
-        controller.turn_slot_on()
-        state.config["slot_expiry_timestamp"] = time.time() + state.config.get("slot_timeout", 30)
-        system_log(f"[PORTAL_EVENT] SLOT OPENED by Device: {mac}")
+    # Their own slot if they already hold one, else the first free acceptor
+    slot = controller.acquire_slot(mac, state.config.get("slot_timeout", 30))
+    if slot:
+        if user: user["last_active"] = time.time()
+        system_log(f"[PORTAL_EVENT] SLOT {slot.number} OPENED by Device: {mac}")
         
         if mac in state.manager.active_connections:
             await state.manager.send_personal_message({
                 "type": "slot_opened",
+                "slot": slot.number,
+                "slot_count": len(controller.slots),
                 "slot_seconds": state.config.get("slot_timeout", 30),
                 "balance": user.get("balance", 0),
                 "points": user.get("points", 0),
                 "coin_rates": state.config.get("coin_rates", "1:10,5:60,10:180,20:300"),
                 "time_remaining": user.get("time", 0)
             }, mac)
-        return {"result": "success"}
+        return {"result": "success", "slot": slot.number}
     return {"result": "busy"}
 
 @router.post("/cancel_slot")
 async def cancel_slot(mac: str):
-    if controller.current_slot_user == mac:
-        controller.turn_slot_off()
-        state.config["slot_expiry_timestamp"] = 0
+    if controller.release_slot(mac):
         return {"result": "success"}
     return {"result": "fail"}
\ No newline at end of file
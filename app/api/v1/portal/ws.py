@@ -2,18 +2,31 @@ import time
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 from core import state
+from core.connection_manager import PONG
 
 router = APIRouter()
 
 @router.websocket("/ws/{mac}")
 async def websocket_endpoint(websocket: WebSocket, mac: str):
     await state.manager.connect(mac, websocket)
-    if mac in state.users and websocket.client.host:
-        state.users[mac]["ip"] = websocket.client.host
-        state.users[mac]["last_active"] = time.time()
+    # A miss reads SQLite: keep it off the event loop
+    from services import background
+    user = await background.scheduler.run_blocking(state.users.get, mac)
+    if user is not None and websocket.client.host:
+        user["ip"] = websocket.client.host
+        user["last_active"] = time.time()
     try:
         while True:
-            await websocket.receive_text()
-            if mac in state.users: state.users[mac]["last_active"] = time.time()
-    except WebSocketDisconnect:
-        state.manager.disconnect(mac, websocket)
\ No newline at end of file
+            text = await websocket.receive_text()
+            state.manager.touch(websocket)
+            # A pong only proves the tab is open, not that the user is active:
+            # it must not hold off the idle auto-pause
+            if text == PONG:
+                continue
+            # Resident check only: a DB lookup per frame would run on the event loop
+            if state.users.is_resident(mac): state.users[mac]["last_active"] = time.time()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        # Reaped or evicted sockets are already gone; this is a no-op for them
+        state.manager.disconnect(mac, websocket)
@@ -7,6 +7,24 @@ COIN_PIN_WPI = "3"        # Coin Signal
 RELAY_PINS = ["5"]   # Light/Power
 PULSE_VALUE = 1          # 1 Credits per Pulse
 
+# GPIO backend: "wiringpi" (Orange Pi) or "simulated" (no hardware; $GPIO_BACKEND overrides)
+GPIO_BACKEND = "wiringpi"
+
+# Coin pulse detection: "isr" (wiringPiISR), "chardev" (/dev/gpiochip edge events),
+# "poll" (1 ms digitalRead loop) or "auto" (chardev -> poll). wiringPi exit()s the
+# process when ISR setup fails, so "auto" never tries it on real hardware.
+COIN_EDGE_MODE = "auto"
+COIN_GPIO_CHIP = "/dev/gpiochip0"
+COIN_GPIO_LINE = None     # Kernel line offset of the coin pin (chardev mode only)
+COIN_PULSE_GAP = 0.6      # Seconds of silence that end a coin's pulse train
+COIN_DEBOUNCE = 0.01      # Edges closer than this to the previous one are bounce
+
+# Coin acceptors, one entry each (physical pins). /enable_slot hands out the first free one.
+COIN_SLOTS = [
+    {"coin_pin": COIN_PIN_WPI, "relay_pins": RELAY_PINS, "gpio_line": COIN_GPIO_LINE},
+    # {"coin_pin": "7", "relay_pins": ["11"], "gpio_line": None},
+]
+
 load_dotenv()
 
 # --- SECURITY SECRETS ---
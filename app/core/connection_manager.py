@@ -0,0 +1,207 @@
+import json
+import time
+import asyncio
+from collections import deque
+from typing import Dict, Set
+from fastapi import WebSocket
+
+# Message types where only the newest queued copy matters
+COALESCE_TYPES = {"sync", "ping"}
+
+
+def encode(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"))
+
+PING = encode({"type": "ping"})
+PONG = encode({"type": "pong"})
+
+
+async def fan_out(sockets, text: str, timeout: float) -> list:
+    """Sends the same text to every socket concurrently. Returns the ones that failed or stalled."""
+    sockets = list(sockets)
+    results = await asyncio.gather(*(asyncio.wait_for(ws.send_text(text), timeout) for ws in sockets),
+                                   return_exceptions=True)
+    return [ws for ws, result in zip(sockets, results) if isinstance(result, BaseException)]
+
+
+class _Outbox:
+    """
+    Bounded send queue for one socket, drained by its own writer task.
+
+    A slow phone only backs up its own queue: once `maxlen` messages are
+    waiting the oldest one-off messages are dropped, and a newer "sync"
+    replaces the queued one instead of piling up behind it.
+    """
+
+    def __init__(self, ws: WebSocket, maxlen: int):
+        self.ws = ws
+        self.items = deque()  # [coalesce_key or None, text]
+        self.maxlen = maxlen
+        self.ready = asyncio.Event()
+        self.task = None
+        self.opened = self.last_seen = time.monotonic()
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put(self, text: str, key: str = None) -> None:
+        if key is not None:
+            stale = next((item for item in self.items if item[0] == key), None)
+            if stale is not None:
+                # Latest wins, and goes to the back so it's never older than what precedes it
+                self.items.remove(stale)
+                self.coalesced += 1
+        if len(self.items) >= self.maxlen:
+            # Shed the oldest one-off message; a queued sync is the latest state, keep it
+            victim = next((item for item in self.items if item[0] is None), self.items[0])
+            self.items.remove(victim)
+            self.dropped += 1
+        self.items.append([key, text])
+        self.ready.set()
+
+
+class ConnectionManager:
+    """
+    Portal sockets by MAC. A MAC may have several sockets open at once (a
+    second tab, the captive-portal mini browser next to the real browser);
+    messages for a MAC go to all of them.
+
+    Sends never await the socket: messages are serialized (once, for
+    broadcasts) and queued on each socket's outbox, and a writer task per
+    socket does the actual send_text(). heartbeat() pings quiet sockets and
+    reaps the ones that stopped answering.
+    """
+
+    QUEUE_SIZE = 32
+    SEND_TIMEOUT = 10.0
+    MAX_SOCKETS_PER_MAC = 4
+
+    def __init__(self):
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self._outboxes: Dict[WebSocket, _Outbox] = {}
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.reaped = 0
+        self.evicted = 0
+
+    async def connect(self, mac: str, websocket: WebSocket):
+        await websocket.accept()
+        sockets = self.active_connections.setdefault(mac, set())
+        if len(sockets) >= self.MAX_SOCKETS_PER_MAC:
+            # Too many tabs: let the oldest one go
+            oldest = min(sockets, key=lambda ws: self._outboxes[ws].opened)
+            self.evicted += 1
+            self._drop(mac, oldest)
+        outbox = _Outbox(websocket, self.QUEUE_SIZE)
+        outbox.task = asyncio.create_task(self._writer(mac, outbox))
+        self._outboxes[websocket] = outbox
+        sockets.add(websocket)
+
+    def disconnect(self, mac: str, websocket: WebSocket):
+        sockets = self.active_connections.get(mac)
+        if sockets is None or websocket not in sockets:
+            return
+        sockets.discard(websocket)
+        if not sockets:
+            del self.active_connections[mac]
+        outbox = self._outboxes.pop(websocket, None)
+        if outbox:
+            self._retire(outbox)
+
+    def _drop(self, mac: str, websocket: WebSocket):
+        """Server-side close: forget the socket now, close it in the background."""
+        self.disconnect(mac, websocket)
+        asyncio.create_task(self._close(websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try: await websocket.close()
+        except: pass
+
+    def _retire(self, outbox: _Outbox):
+        self.dropped += outbox.dropped + len(outbox.items)
+        self.coalesced += outbox.coalesced
+        outbox.items.clear()
+        if outbox.task and outbox.task is not asyncio.current_task():
+            outbox.task.cancel()
+
+    def touch(self, websocket: WebSocket):
+        """The client sent something (pong or otherwise): it's alive."""
+        outbox = self._outboxes.get(websocket)
+        if outbox:
+            outbox.last_seen = time.monotonic()
+
+    # --- SENDING (event loop only) ---
+    def send_text(self, mac: str, text: str, key: str = None) -> bool:
+        """Queues pre-serialized JSON on every socket of `mac`. Returns False if they have none."""
+        sockets = self.active_connections.get(mac)
+        if not sockets:
+            return False
+        for ws in sockets:
+            self._outboxes[ws].put(text, key)
+        return True
+
+    def send(self, mac: str, message: dict) -> bool:
+        if mac not in self.active_connections:
+            return False
+        key = message.get("type") if message.get("type") in COALESCE_TYPES else None
+        return self.send_text(mac, encode(message), key)
+
+    def broadcast(self, message: dict, macs=None) -> int:
+        """Serializes once and queues for every MAC in `macs` (default: everyone). Returns recipients."""
+        text = encode(message)
+        key = message.get("type") if message.get("type") in COALESCE_TYPES else None
+        targets = list(self.active_connections) if macs is None else macs
+        return sum(1 for mac in targets if self.send_text(mac, text, key))
+
+    async def send_personal_message(self, message: dict, mac: str):
+        self.send(mac, message)
+
+    async def _writer(self, mac: str, outbox: _Outbox):
+        ws = outbox.ws
+        try:
+            while True:
+                await outbox.ready.wait()
+                while outbox.items:
+                    _, text = outbox.items.popleft()
+                    await asyncio.wait_for(ws.send_text(text), self.SEND_TIMEOUT)
+                    self.sent += 1
+                outbox.ready.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Dead or stuck socket: drop it so nothing else queues behind it
+            self.disconnect(mac, ws)
+            await self._close(ws)
+
+    # --- HEARTBEAT ---
+    def heartbeat(self, interval: float, timeout: float) -> int:
+        """
+        Pings sockets that have been quiet for `interval` seconds and reaps the
+        ones silent for longer than `timeout`. Returns how many were reaped.
+        """
+        now = time.monotonic()
+        reaped = 0
+        for mac, sockets in list(self.active_connections.items()):
+            for ws in list(sockets):
+                idle = now - self._outboxes[ws].last_seen
+                if idle > timeout:
+                    self._drop(mac, ws)
+                    reaped += 1
+                elif idle >= interval:
+                    self._outboxes[ws].put(PING, "ping")
+        self.reaped += reaped
+        return reaped
+
+    def stats(self) -> dict:
+        boxes = list(self._outboxes.values())
+        return {
+            "macs": len(self.active_connections),
+            "sockets": len(boxes),
+            "reaped": self.reaped,
+            "evicted": self.evicted,
+            "queued": sum(len(b.items) for b in boxes),
+            "sent": self.sent,
+            "dropped": self.dropped + sum(b.dropped for b in boxes),
+            "coalesced": self.coalesced + sum(b.coalesced for b in boxes),
+        }
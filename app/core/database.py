@@ -1,6 +1,7 @@
 # pisowifi/core/database.py
 import sqlite3
 import time
+import datetime
 from passlib.context import CryptContext
 import config
 
@@ -58,6 +59,18 @@ def init_db():
         except:
             pass
 
+        # --- MIGRATION: PERSISTED DEADLINE (Warm Restart) ---
+        try:
+            c.execute("ALTER TABLE users ADD COLUMN expires_at REAL")
+        except:
+            pass
+
+        # --- MIGRATION: DATA PLAN QUOTA (NULL = time plan, no cap) ---
+        try:
+            c.execute("ALTER TABLE users ADD COLUMN quota_bytes INTEGER")
+        except:
+            pass
+
         # 2. Sales Table
         c.execute('''CREATE TABLE IF NOT EXISTS sales (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -65,6 +78,66 @@ def init_db():
                         amount INTEGER,
                         timestamp INTEGER
                     )''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_sales_timestamp ON sales(timestamp)")
+
+        # --- MIGRATION: COIN EVENT ID (replayed journal events are credited once) ---
+        try:
+            c.execute("ALTER TABLE sales ADD COLUMN event_id TEXT")
+        except:
+            pass
+        c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_sales_event_id ON sales(event_id)")
+
+        # 2b. Daily sales rollup (filled by the sales_rollup maintenance job)
+        c.execute('''CREATE TABLE IF NOT EXISTS sales_daily (
+                        day TEXT PRIMARY KEY,
+                        total INTEGER,
+                        count INTEGER
+                    )''')
+
+        # 2c. Hourly traffic counter snapshots (counter_snapshot maintenance job)
+        c.execute('''CREATE TABLE IF NOT EXISTS traffic_snapshots (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        mac TEXT,
+                        bytes INTEGER,
+                        packets INTEGER,
+                        timestamp INTEGER,
+                        rx_bytes INTEGER DEFAULT 0,
+                        tx_bytes INTEGER DEFAULT 0
+                    )''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_traffic_snapshots_ts ON traffic_snapshots(timestamp)")
+        for column in ("rx_bytes", "tx_bytes"):
+            try:
+                c.execute(f"ALTER TABLE traffic_snapshots ADD COLUMN {column} INTEGER DEFAULT 0")
+            except:
+                pass
+
+        # 2d. Per-session traffic usage (written with the batch user sync)
+        c.execute('''CREATE TABLE IF NOT EXISTS usage (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        mac TEXT,
+                        start_ts INTEGER,
+                        end_ts INTEGER,
+                        duration INTEGER,
+                        bytes INTEGER,
+                        packets INTEGER,
+                        rx_bytes INTEGER,
+                        tx_bytes INTEGER,
+                        end_status TEXT
+                    )''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_usage_end_ts ON usage(end_ts)")
+
+        # 2e. Daily per-MAC usage rollup (usage_rollup maintenance job)
+        c.execute('''CREATE TABLE IF NOT EXISTS usage_daily (
+                        day TEXT,
+                        mac TEXT,
+                        bytes INTEGER,
+                        packets INTEGER,
+                        rx_bytes INTEGER,
+                        tx_bytes INTEGER,
+                        seconds INTEGER,
+                        sessions INTEGER,
+                        PRIMARY KEY (day, mac)
+                    )''')
 
         # 3. Admins Table
         c.execute('''CREATE TABLE IF NOT EXISTS admins (
@@ -107,49 +180,85 @@ def verify_admin(username, plain_password):
         return False
 
 # --- USER FUNCTIONS ---
-def load_users():
+USER_COLUMNS = "mac, ip, time_remaining, status, balance, free_claimed, points, expires_at, quota_bytes"
+
+USER_UPSERT = ("INSERT OR REPLACE INTO users (mac, ip, time_remaining, status, last_updated, balance, free_claimed, points, expires_at, quota_bytes) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+def _row_to_user(row) -> dict:
+    # Handle potential NULLs or missing columns from old DB versions
+    balance = row[4] if len(row) > 4 and row[4] is not None else 0
+    claimed = row[5] if len(row) > 5 and row[5] is not None else 0
+    points = row[6] if len(row) > 6 and row[6] is not None else 0
+    
+    user = {
+        "ip": row[1], 
+        "time": row[2] or 0, 
+        "status": row[3],
+        "balance": balance,
+        "free_claimed": claimed,
+        "points": points  # <--- Load Points
+    }
+    # Deadline of a connected session (only kept while connected)
+    if len(row) > 7 and row[7] is not None and row[3] == "connected":
+        user["expires_at"] = row[7]
+    # Remaining bytes of a data plan (absent for plain time plans)
+    if len(row) > 8 and row[8] is not None:
+        user["quota_bytes"] = row[8]
+    return user
+
+def _user_values(mac, data) -> tuple:
+    return (mac, 
+            data.get("ip", ""), 
+            data["time"], 
+            data["status"], 
+            int(time.time()), 
+            data.get("balance", 0), 
+            data.get("free_claimed", 0), 
+            data.get("points", 0),  # <--- Save Points
+            data.get("expires_at") if data["status"] == "connected" else None,
+            data.get("quota_bytes"))
+
+def load_users(active_only=False):
+    """
+    Loads users into memory. With active_only=True only the working set is
+    loaded (anyone with time, balance, or a connected/paused/blocked status);
+    idle history stays in SQLite and is reloaded on demand with load_user().
+    """
     users_dict = {}
     try:
         with get_connection() as conn:
             c = conn.cursor()
-            # Updated Query to include 'points'
-            c.execute("SELECT mac, ip, time_remaining, status, balance, free_claimed, points FROM users")
+            query = f"SELECT {USER_COLUMNS} FROM users"
+            if active_only:
+                query += " WHERE status IN ('connected', 'paused', 'blocked') OR time_remaining > 0 OR balance > 0"
+            c.execute(query)
             rows = c.fetchall()
         
         for row in rows:
-            # Handle potential NULLs or missing columns from old DB versions
-            balance = row[4] if len(row) > 4 and row[4] is not None else 0
-            claimed = row[5] if len(row) > 5 and row[5] is not None else 0
-            points = row[6] if len(row) > 6 and row[6] is not None else 0
-            
-            users_dict[row[0]] = {
-                "ip": row[1], 
-                "time": row[2], 
-                "status": row[3],
-                "balance": balance,
-                "free_claimed": claimed,
-                "points": points  # <--- Load Points
-            }
+            users_dict[row[0]] = _row_to_user(row)
     except Exception as e:
         print(f"DB Error (load_users): {e}")
         
     return users_dict
 
+def load_user(mac):
+    """Fetch a single user by MAC (lazy reload of evicted records). Returns None if unknown."""
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute(f"SELECT {USER_COLUMNS} FROM users WHERE mac=?", (mac,))
+            row = c.fetchone()
+        return _row_to_user(row) if row else None
+    except Exception as e:
+        print(f"DB Error (load_user): {e}")
+        return None
+
 def sync_user(mac, data):
     try:
         with get_connection() as conn:
             c = conn.cursor()
-            # Updated Query to save 'points'
-            c.execute("INSERT OR REPLACE INTO users (mac, ip, time_remaining, status, last_updated, balance, free_claimed, points) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", 
-                         (mac, 
-                          data.get("ip", ""), 
-                          data["time"], 
-                          data["status"], 
-                          int(time.time()), 
-                          data.get("balance", 0), 
-                          data.get("free_claimed", 0), 
-                          data.get("points", 0)  # <--- Save Points
-                         ))
+            c.execute(USER_UPSERT, _user_values(mac, data))
             conn.commit()
     except Exception as e:
         print(f"DB Error (sync_user): {e}")
@@ -183,6 +292,21 @@ def add_sale(mac, amount):
     except Exception as e:
         print(f"DB Error (add_sale): {e}")
 
+def coin_recorded(event_id) -> bool:
+    """True if the coin event's sale is already in the DB. Raises on DB errors."""
+    with get_connection() as conn:
+        return conn.execute("SELECT 1 FROM sales WHERE event_id = ?", (event_id,)).fetchone() is not None
+
+def record_coin(mac, data, amount, event_id=None):
+    """
+    Saves the credited user and the sale in ONE transaction. Unlike sync_user/
+    add_sale this raises on failure, so the coin queue leaves the event unacked.
+    """
+    with get_connection() as conn:
+        conn.execute(USER_UPSERT, _user_values(mac, data))
+        conn.execute("INSERT INTO sales (mac, amount, timestamp, event_id) VALUES (?, ?, ?, ?)",
+                     (mac, amount, int(time.time()), event_id))
+
 def get_total_sales():
     try:
         with get_connection() as conn:
@@ -229,33 +353,111 @@ def get_user_sales(mac):
         print(f"DB Error (get_user_sales): {e}")
         return []
     
-def sync_multiple_users(users_data):
+USAGE_INSERT = ("INSERT INTO usage (mac, start_ts, end_ts, duration, bytes, packets, rx_bytes, tx_bytes, end_status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+def sync_multiple_users(users_data, usage_rows=None):
     """
     Batch update multiple users in a single database transaction to reduce I/O overhead.
+    Finished-session usage rows (see UsageTracker) ride along in the same transaction.
+    Returns False if the write failed.
     """
-    if not users_data:
-        return
+    if not users_data and not usage_rows:
+        return True
     try:
         with get_connection() as conn:
             c = conn.cursor()
-            values = []
-            for mac, data in users_data:
-                values.append((
-                    mac,
-                    data.get("ip", ""),
-                    data["time"],
-                    data["status"],
-                    int(time.time()),
-                    data.get("balance", 0),
-                    data.get("free_claimed", 0),
-                    data.get("points", 0)
-                ))
-            
-            c.executemany(
-                "INSERT OR REPLACE INTO users (mac, ip, time_remaining, status, last_updated, balance, free_claimed, points) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                values
-            )
+            values = [_user_values(mac, data) for mac, data in users_data]
+            c.executemany(USER_UPSERT, values)
+            if usage_rows:
+                c.executemany(USAGE_INSERT, usage_rows)
             conn.commit()
+        return True
     except Exception as e:
         import logging
-        logging.error(f"DB Error (sync_multiple_users): {e}")
\ No newline at end of file
+        logging.error(f"DB Error (sync_multiple_users): {e}")
+        return False
+
+# --- MAINTENANCE FUNCTIONS ---
+def _local_midnight(days_back=0) -> int:
+    day = datetime.date.today() - datetime.timedelta(days=days_back)
+    return int(datetime.datetime.combine(day, datetime.time.min).timestamp())
+
+def rollup_sales_daily(days=2):
+    """Recomputes the per-day sales totals for the last `days` days (local time)."""
+    try:
+        # Whole days only: a partial day would REPLACE the stored total with a smaller one
+        since = _local_midnight(days - 1)
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""INSERT OR REPLACE INTO sales_daily (day, total, count)
+                         SELECT date(timestamp, 'unixepoch', 'localtime') AS day, SUM(amount), COUNT(*)
+                         FROM sales WHERE timestamp >= ? GROUP BY day""", (since,))
+            conn.commit()
+            return c.rowcount
+    except Exception as e:
+        print(f"DB Error (rollup_sales_daily): {e}")
+        return 0
+
+def get_sales_daily(limit=30):
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT day, total, count FROM sales_daily ORDER BY day DESC LIMIT ?", (limit,))
+            return [{"day": r[0], "total": r[1], "count": r[2]} for r in c.fetchall()]
+    except Exception as e:
+        print(f"DB Error (get_sales_daily): {e}")
+        return []
+
+def rollup_usage_daily(days=2):
+    """Recomputes per-day, per-MAC usage totals for the last `days` days (by session end, local time)."""
+    try:
+        since = _local_midnight(days - 1)
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""INSERT OR REPLACE INTO usage_daily (day, mac, bytes, packets, rx_bytes, tx_bytes, seconds, sessions)
+                         SELECT date(end_ts, 'unixepoch', 'localtime') AS day, mac, SUM(bytes), SUM(packets),
+                                SUM(rx_bytes), SUM(tx_bytes), SUM(duration), COUNT(*)
+                         FROM usage WHERE end_ts >= ? GROUP BY day, mac""", (since,))
+            conn.commit()
+            return c.rowcount
+    except Exception as e:
+        print(f"DB Error (rollup_usage_daily): {e}")
+        return 0
+
+def get_top_usage(start_day, end_day, limit=10):
+    """Heaviest users between two 'YYYY-MM-DD' days (inclusive), from the daily rollup."""
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""SELECT mac, SUM(bytes), SUM(packets), SUM(rx_bytes), SUM(tx_bytes), SUM(seconds), SUM(sessions)
+                         FROM usage_daily WHERE day >= ? AND day <= ?
+                         GROUP BY mac ORDER BY SUM(bytes) DESC LIMIT ?""", (start_day, end_day, limit))
+            return [{"mac": r[0], "bytes": r[1], "packets": r[2], "rx_bytes": r[3], "tx_bytes": r[4],
+                     "seconds": r[5], "sessions": r[6]} for r in c.fetchall()]
+    except Exception as e:
+        print(f"DB Error (get_top_usage): {e}")
+        return []
+
+def save_traffic_snapshot(traffic, keep_days=30):
+    """Stores one row per MAC from firewall.get_all_traffic() and prunes old snapshots."""
+    now = int(time.time())
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.executemany("INSERT INTO traffic_snapshots (mac, bytes, packets, rx_bytes, tx_bytes, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                          [(mac, t.bytes, t.packets, t.rx_bytes, t.tx_bytes, now) for mac, t in traffic.items()])
+            c.execute("DELETE FROM traffic_snapshots WHERE timestamp < ?", (now - keep_days * 86400,))
+            conn.commit()
+    except Exception as e:
+        print(f"DB Error (save_traffic_snapshot): {e}")
+
+def vacuum():
+    """Checkpoints the WAL and rebuilds the file. Takes an exclusive lock: off-peak only."""
+    conn = sqlite3.connect(DB_FILE, timeout=30, isolation_level=None)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
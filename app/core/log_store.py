@@ -0,0 +1,205 @@
+import os
+import re
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+LOG_DB_FILE = "logs.db"
+LOG_FILE = "system.log"
+TIMESTAMP_FORMAT = "%Y-%m-%d %I:%M:%S %p"  # same as the file log
+
+# Admin log-viewer categories -> log types (mirrors frontend getLogCategory).
+# Anything else is SYSTEM.
+TYPE_MAP = {
+    "COIN":     {"COIN_INSERT", "COIN_SUCCESS"},
+    "PORTAL":   {"PORTAL_EVENT"},
+    "ADMIN":    {"ADMIN_AUDIT"},
+    "SECURITY": {"SECURITY_ALERT", "CRITICAL"},
+}
+_CATEGORY_OF = {t: cat for cat, types in TYPE_MAP.items() for t in types}
+
+# "[TYPE] message" as written by system_log()/audit_log()
+_TAGGED = re.compile(r"\[(.+?)\] (.*)", re.S)
+
+_INSERT = "INSERT INTO logs (ts, type, category, message) VALUES (?, ?, ?, ?)"
+
+
+def category_of(log_type: str) -> str:
+    return _CATEGORY_OF.get(log_type, "SYSTEM")
+
+
+def split_message(msg: str):
+    """'[TYPE] message' -> (type, message); untagged lines are SYSTEM."""
+    match = _TAGGED.match(msg)
+    return (match.group(1), match.group(2)) if match else ("SYSTEM", msg)
+
+
+class LogStore:
+    """
+    Structured copy of the system log in SQLite: one row per entry with a
+    (category, ts) index, so the admin log viewer does an indexed, paginated
+    lookup over the whole retention window instead of parsing system.log
+    (and never seeing the rotated backups).
+
+    Loggers only put entries on a queue; a writer thread inserts them in
+    batches on its own connection. On the first start the current log file
+    and its backups are imported. Rows older than the retention are removed
+    by the "log_prune" maintenance job.
+    """
+
+    BATCH = 500
+
+    def __init__(self, path: str = LOG_DB_FILE, log_file: str = LOG_FILE):
+        self.path = path
+        self.log_file = log_file
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._started_at = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def init(self, conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute('''CREATE TABLE IF NOT EXISTS logs (
+                            id INTEGER PRIMARY KEY,
+                            ts REAL NOT NULL,
+                            type TEXT NOT NULL,
+                            category TEXT NOT NULL,
+                            message TEXT NOT NULL
+                        )''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_type_ts ON logs (type, ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_category_ts ON logs (category, ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs (ts)")
+
+    # --- WRITING ---
+    def add(self, ts: float, log_type: str, message: str):
+        """Called by the logging handler on whatever thread logged. Never touches SQLite."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._started_at = ts
+                    self._thread = threading.Thread(target=self._writer, name="Piso-LogDB", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+        self._queue.put((ts, log_type, category_of(log_type), message))
+
+    def close(self, timeout: float = 2.0):
+        """Lets the writer drain what's queued (process exit)."""
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _writer(self):
+        try:
+            conn = self.connect()
+            self.init(conn)
+            if conn.execute("SELECT 1 FROM logs LIMIT 1").fetchone() is None:
+                self._import_files(conn)
+        except Exception as e:
+            print(f"Log store unavailable: {e}")
+            return
+        while True:
+            rows = [self._queue.get()]
+            while len(rows) < self.BATCH:
+                try: rows.append(self._queue.get_nowait())
+                except queue.Empty: break
+            stop = None in rows
+            rows = [r for r in rows if r is not None]
+            try:
+                with conn:
+                    conn.executemany(_INSERT, rows)
+                self.written += len(rows)
+            except Exception:
+                self.dropped += len(rows)  # still in system.log
+            if stop:
+                conn.close()
+                return
+
+    def _import_files(self, conn):
+        """One-time backfill from system.log and its rotated backups (oldest first)."""
+        from core.logger import parse_log_line
+        paths = [f"{self.log_file}.{i}" for i in range(9, 0, -1)] + [self.log_file]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            rows, last_ts = [], 0.0
+            with open(path, errors="replace") as f:
+                for line in f:
+                    entry = parse_log_line(line)
+                    if not entry:
+                        continue
+                    try: last_ts = datetime.strptime(entry["timestamp"], TIMESTAMP_FORMAT).timestamp()
+                    except ValueError: pass  # continuation line: keep the previous entry's time
+                    # Lines logged since this start are already queued
+                    if last_ts < int(self._started_at or time.time()):
+                        rows.append((last_ts, entry["type"], category_of(entry["type"]), entry["message"]))
+            with conn:
+                conn.executemany(_INSERT, rows)
+
+    # --- QUERIES ---
+    def query(self, limit: int = 200, offset: int = 0, log_type: str = None) -> dict:
+        """
+        Newest first. log_type is a category (COIN/PORTAL/ADMIN/SECURITY/SYSTEM),
+        an exact type (e.g. COIN_INSERT) or ALL/None.
+        """
+        where, args = "", ()
+        if log_type and log_type.upper() != "ALL":
+            key = log_type.upper()
+            if key in TYPE_MAP or key == "SYSTEM":
+                where, args = "WHERE category = ?", (key,)
+            else:
+                where, args = "WHERE type = ?", (log_type,)
+        with self.connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM logs {where}", args).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT ts, type, message FROM logs {where} ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?",
+                args + (limit, offset)
+            ).fetchall()
+        logs = [{"timestamp": time.strftime(TIMESTAMP_FORMAT, time.localtime(ts)), "type": t, "message": m}
+                for ts, t, m in rows]
+        return {"logs": logs, "total": total, "offset": offset, "limit": limit}
+
+    def prune(self, days: int) -> int:
+        """Deletes entries older than `days`. Returns how many went."""
+        cutoff = time.time() - days * 86400
+        with self.connect() as conn:
+            return conn.execute("DELETE FROM logs WHERE ts < ?", (cutoff,)).rowcount
+
+    def stats(self) -> dict:
+        with self.connect() as conn:
+            count, oldest = conn.execute("SELECT COUNT(*), MIN(ts) FROM logs").fetchone()
+        return {
+            "entries": count,
+            "oldest": oldest,
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+class SQLiteLogHandler(logging.Handler):
+    """Feeds log records into a LogStore's queue."""
+
+    def __init__(self, store: LogStore):
+        super().__init__()
+        self.store = store
+
+    def emit(self, record):
+        try:
+            log_type, message = split_message(record.getMessage())
+            self.store.add(record.created, log_type, message)
+        except Exception:
+            self.handleError(record)
+
+
+log_store = LogStore()
@@ -0,0 +1,219 @@
+import os
+import json
+import ctypes
+import struct
+import asyncio
+
+from core.connection_manager import fan_out
+from core.logger import parse_log_line
+
+# <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+# struct inotify_event { int wd; u32 mask; u32 cookie; u32 len; char name[len]; }
+_EVENT = struct.Struct("iIII")
+
+
+def read_backlog(path: str, lines: int, block: int = 8192) -> list:
+    """Parsed entries for the last `lines` lines, read backwards from the end of the file."""
+    try:
+        with open(path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END)
+            data = b""
+            while pos > 0 and data.count(b"\n") <= lines:
+                step = min(block, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+    except OSError:
+        return []
+    tail = data.decode("utf-8", "replace").splitlines()[-lines:]
+    return [entry for entry in map(parse_log_line, tail) if entry]
+
+
+class LogTailer:
+    """
+    One follower of system.log for every admin log socket.
+
+    Wakes up on inotify events for the log's directory (or polls when inotify
+    isn't available), parses each new line once and sends the same JSON to
+    every subscriber. A rotation (RotatingFileHandler renames the file and
+    opens a new one) is noticed by inode: the rest of the old file is read,
+    then the new one is followed from its start. Nothing runs while nobody is
+    subscribed.
+    """
+
+    SEND_TIMEOUT = 5.0
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, path: str = "system.log", backlog: int = 200):
+        self.path = os.path.abspath(path)
+        self.backlog = backlog
+        self.mode = None  # "inotify" / "poll" while running
+        self.lines = 0
+        self.rotations = 0
+        # ws -> None once live, or the lines that arrived while its backlog was being sent
+        self._subscribers = {}
+        self._file = None
+        self._inode = None
+        self._partial = b""
+        self._inotify_fd = None
+        self._poll_task = None
+        self._outgoing = []
+        self._flushing = False
+
+    # --- SUBSCRIBERS (event loop only) ---
+    async def subscribe(self, websocket):
+        """Sends the backlog, then streams new entries. Duplicates around the seam are deduped by the UI."""
+        self._subscribers[websocket] = []
+        if self.mode is None:
+            self._start()
+        backlog = await asyncio.get_running_loop().run_in_executor(None, read_backlog, self.path, self.backlog)
+        try:
+            for entry in backlog:
+                await websocket.send_text(json.dumps(entry))
+            # Catch up on what was tailed meanwhile, then go live
+            while self._subscribers.get(websocket):
+                pending, self._subscribers[websocket] = self._subscribers[websocket], []
+                for text in pending:
+                    await websocket.send_text(text)
+        finally:
+            if websocket in self._subscribers:
+                self._subscribers[websocket] = None
+
+    def unsubscribe(self, websocket):
+        self._subscribers.pop(websocket, None)
+        if not self._subscribers and self.mode is not None:
+            self._stop()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    # --- FOLLOWING ---
+    def _start(self):
+        self._open(from_start=False)
+        loop = asyncio.get_running_loop()
+        try:
+            self._inotify_fd = self._inotify_watch(os.path.dirname(self.path))
+            loop.add_reader(self._inotify_fd, self._on_inotify)
+            self.mode = "inotify"
+        except Exception:
+            if self._inotify_fd is not None:
+                os.close(self._inotify_fd)
+                self._inotify_fd = None
+            self._poll_task = loop.create_task(self._poll())
+            self.mode = "poll"
+
+    def _stop(self):
+        if self._inotify_fd is not None:
+            try: asyncio.get_running_loop().remove_reader(self._inotify_fd)
+            except: pass
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self._file:
+            self._file.close()
+            self._file = None
+        self.mode = None
+
+    @staticmethod
+    def _inotify_watch(directory: str) -> int:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CREATE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+        if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"inotify_add_watch({directory}) failed")
+        return fd
+
+    def _on_inotify(self):
+        name = os.path.basename(self.path).encode()
+        relevant = False
+        while True:
+            try: data = os.read(self._inotify_fd, 4096)
+            except (BlockingIOError, InterruptedError): break
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                _, _, _, length = _EVENT.unpack_from(data, offset)
+                event_name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                # The database and journals share this directory: only our file and its backups matter
+                relevant = relevant or event_name.startswith(name)
+                offset += _EVENT.size + length
+        if relevant:
+            self._check()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            self._check()
+
+    def _open(self, from_start: bool):
+        if self._file:
+            self._file.close()
+        self._partial = b""
+        try:
+            self._file = open(self.path, "rb")
+        except OSError:
+            self._file, self._inode = None, None
+            return
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        if not from_start:
+            self._file.seek(0, os.SEEK_END)
+
+    def _check(self):
+        entries = self._read_new()
+        try: st = os.stat(self.path)
+        except OSError: st = None  # mid-rotation: the new file isn't there yet
+        if st and (st.st_ino != self._inode or (self._file and st.st_size < self._file.tell())):
+            # Rotated or truncated: the old file was drained above, follow the new one
+            if self._inode is not None:
+                self.rotations += 1
+            self._open(from_start=True)
+            entries += self._read_new()
+        if entries:
+            self._publish(entries)
+
+    def _read_new(self) -> list:
+        if not self._file:
+            return []
+        data = self._file.read()
+        if not data:
+            return []
+        *lines, self._partial = (self._partial + data).split(b"\n")
+        entries = [parse_log_line(line.decode("utf-8", "replace")) for line in lines]
+        return [e for e in entries if e]
+
+    # --- FAN-OUT ---
+    def _publish(self, entries: list):
+        texts = [json.dumps(entry) for entry in entries]
+        self.lines += len(texts)
+        for buffered in self._subscribers.values():
+            if buffered is not None:
+                buffered.extend(texts)
+        self._outgoing.extend(texts)
+        if not self._flushing:
+            self._flushing = True
+            asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        # One sender keeps every socket's entries in file order
+        try:
+            while self._outgoing:
+                batch, self._outgoing = self._outgoing, []
+                for text in batch:
+                    live = [ws for ws, buffered in self._subscribers.items() if buffered is None]
+                    for ws in await fan_out(live, text, self.SEND_TIMEOUT):
+                        self.unsubscribe(ws)
+        finally:
+            self._flushing = False
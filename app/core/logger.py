@@ -1,3 +1,4 @@
+import re
 import logging
 import sys
 from logging.handlers import RotatingFileHandler
@@ -28,6 +29,31 @@ if not logger.handlers:
     logger.addHandler(file_handler)
     logger.addHandler(console_handler)
 
+    # Indexed copy for the admin log viewer (see core/log_store.py)
+    from core.log_store import log_store, SQLiteLogHandler
+    logger.addHandler(SQLiteLogHandler(log_store))
+
+# [timestamp] [TYPE] message
+LOG_LINE = re.compile(r"\[(.+?)\] \[(.+?)\] (.*)")
+
+def parse_log_line(line: str) -> dict | None:
+    """Parse a structured log line into a dict with timestamp, type, and message."""
+    line = line.strip()
+    if not line:
+        return None
+    match = LOG_LINE.search(line)
+    if match:
+        return {
+            "timestamp": match.group(1),
+            "type": match.group(2),
+            "message": match.group(3)
+        }
+    # Fallback: legacy format [timestamp] message
+    if line.startswith("[") and "]" in line:
+        split_idx = line.find("]")
+        return {"timestamp": line[1:split_idx], "type": "SYSTEM", "message": line[split_idx+1:].strip()}
+    return {"timestamp": "--", "type": "SYSTEM", "message": line}
+
 def system_log(msg: str):
     """Helper function to safely log portal, slot, and coin activities."""
     try:
@@ -41,4 +67,19 @@ def audit_log(action: str, ip: str, mac: str, details: str):
         # Formats exactly how the Admin UI expects it
         logger.info(f"[ADMIN_AUDIT] [{ip} | {mac}] {action}: {details}")
     except Exception:
-        pass
\ No newline at end of file
+        pass
+
+def compact_logs(min_bytes: int = 1024 * 1024):
+    """
+    Rolls system.log over if it holds more than min_bytes, so the rotation
+    (and the admin log viewer's big read) happens off-peak instead of mid-day.
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, RotatingFileHandler):
+            try:
+                if handler.stream and handler.stream.tell() >= min_bytes:
+                    handler.doRollover()
+                    return True
+            except Exception:
+                pass
+    return False
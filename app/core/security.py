@@ -60,4 +60,9 @@ def is_admin(request: Request) -> bool:
             headers={"Location": "/login"}
         )
 
-    return True
\ No newline at end of file
+    return True
+
+def is_admin_socket(websocket) -> bool:
+    """is_admin() for WebSocket routes: the browser sends the same cookie on the upgrade."""
+    payload = verify_token(websocket.cookies.get("admin_token") or "")
+    return bool(payload) and payload.get("sub") == config.ADMIN_USERNAME
\ No newline at end of file
@@ -1,23 +1,37 @@
 import json
 import os
 import asyncio
-from fastapi import WebSocket
 from typing import List, Dict
+from core.user_store import UserStore
+from core.connection_manager import ConnectionManager
 
 CONFIG_FILE = "config.json"
 
-users = {}
+users = UserStore()
 
 defaults = {
     "slot_timeout": 30,
-    "slot_expiry_timestamp": 0,
     "inactive_timeout": 60,
     "auto_pause_enabled": True,
     "speed_limit_enabled": False,
     "global_speed_limit": 5,
     "gaming_mode_enabled": False,
-    "inactive_packet_threshold": 100,
+    # Auto-pause: a user is idle while their smoothed rates stay below both limits.
+    # tau is the EWMA time constant; larger rides out longer gaps between bursts
+    # but also takes longer to notice a user who really went quiet.
+    "inactive_bytes_rate": 1024,      # bytes/second
+    "inactive_packet_rate": 2,        # packets/second
+    "idle_rate_tau_seconds": 20,
+    "monitor_interval_min": 5,
+    "monitor_interval_max": 30,
+    # Devices tracked by the per-minute throughput history (24h each, ~17 KB per device)
+    "throughput_history_max_users": 256,
     "coin_rates": "1:10,5:60,10:180,20:300",
+    # Data plans: "amount:MB:validity_minutes", e.g. "10:500:1440" = 500 MB for ₱10, valid 24h.
+    # Empty = data plans off. When a plan runs out the user is blocked (expired) or throttled.
+    "quota_rates": "",
+    "quota_exhausted_action": "block",   # "block" | "throttle"
+    "quota_throttle_mbps": 1,
     "pulse_value": 1,
     "restart_schedule": {
         "enabled": False,
@@ -32,12 +46,42 @@ defaults = {
     },
     "point_promos": [    # Default Promo
         {"id": 1, "name": "3 Hours Free", "cost": 20, "minutes": 180}
-    ]
+    ],
+    # In-memory user table bounds (idle "new"/"expired" records stay in SQLite only)
+    "user_cache_max": 500,
+    "user_idle_evict_seconds": 1800,
+    # Keep paying users online across app restarts/reboots (restore from persisted deadlines)
+    "warm_restart_enabled": True,
+    # Portal sync is change-driven; a full resync is pushed at this coarse interval
+    "ws_sync_checkpoint_seconds": 60,
+    # Portal sockets quiet this long get a ping; no reply (pong) within the timeout and they're closed
+    "ws_ping_interval": 20,
+    "ws_idle_timeout": 60,
+    # Admin dashboard system stats: one shared sample per interval for every open tab
+    "system_stats_interval": 3,
+    # Log entries kept in logs.db for the admin log viewer (pruned by the "log_prune" job)
+    "log_retention_days": 30,
+    # Maintenance jobs (cron: "minute hour day month weekday"). The reboot job
+    # is driven by "restart_schedule" above.
+    "maintenance_jobs": {
+        "sales_rollup": {"enabled": True, "cron": "15 0 * * *"},
+        "log_compaction": {"enabled": True, "cron": "30 3 * * *"},
+        "db_vacuum": {"enabled": True, "cron": "45 3 * * 0"},
+        "free_claim_reset": {"enabled": False, "cron": "0 0 * * *"},
+        "counter_snapshot": {"enabled": True, "cron": "0 * * * *"},
+        "usage_rollup": {"enabled": True, "cron": "5 * * * *"},
+        "log_prune": {"enabled": True, "cron": "20 3 * * *"}
+    }
 }
 
 # Start with defaults
 config = defaults.copy()
 
+# Set once a drain/shutdown starts (coins refused, loops wind down)
+is_shutting_down = False
+# Marker left by the previous clean shutdown (reason, timestamp, sessions), None after a crash
+last_shutdown = None
+
 def save_config():
     """
     Saves configuration safely using Atomic Write.
@@ -89,25 +133,6 @@ def load_config():
 # Connection Manager
 loop: asyncio.AbstractEventLoop = None 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-
-    async def connect(self, mac: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[mac] = websocket
-
-    def disconnect(self, mac: str, websocket: WebSocket):
-        if mac in self.active_connections and self.active_connections[mac] == websocket:
-            del self.active_connections[mac]
-
-    async def send_personal_message(self, message: dict, mac: str):
-        if mac in self.active_connections:
-            ws = self.active_connections[mac]
-            try:
-                await ws.send_json(message)
-            except:
-                self.disconnect(mac, ws)
-
 manager = ConnectionManager()
-load_config()
\ No newline at end of file
+load_config()
+users.max_users = int(config.get("user_cache_max", 500))
\ No newline at end of file
@@ -0,0 +1,426 @@
+# core/user_store.py
+import time
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+# Every status a user record can be in. Anything else still gets indexed,
+# these are just created up-front so lookups never miss.
+STATUSES = ("connected", "paused", "expired", "blocked", "new")
+
+# Record keys whose changes must be reflected in the store's indexes
+INDEXED_FIELDS = ("status", "ip")
+
+# Record keys whose changes are broadcast to subscribers (WS sync, admin feeds)
+WATCHED_FIELDS = ("status", "balance", "points", "quota_bytes", "expires_at")
+
+# Only these records may be dropped from memory (they stay in SQLite)
+EVICTABLE_STATUSES = ("new", "expired")
+
+# A MAC that isn't in SQLite either is not looked up again for this long
+# (portal polls and sockets from unknown devices would hit the DB every time)
+MISS_TTL = 30
+MAX_MISSES = 1024
+
+
+class UserRecord(dict):
+    """
+    A plain user dict that reports status/IP changes back to its store.
+    The rest of the app keeps doing `user["status"] = "paused"` as before.
+    """
+    __slots__ = ("_store", "_mac")
+
+    def __init__(self, store, mac: str, data: dict):
+        super().__init__(data)
+        self._store = store
+        self._mac = mac
+
+    def __setitem__(self, key, value):
+        if key == "last_active":
+            super().__setitem__(key, value)
+            self._store._touch(self._mac)
+            return
+        if key not in INDEXED_FIELDS:
+            old = self.get(key)
+            super().__setitem__(key, value)
+            if key in WATCHED_FIELDS and old != value:
+                self._store._notify(self, key, old, value)
+            return
+        # Record + index must change together, otherwise a reader could see
+        # a "paused" record still sitting in the connected set.
+        with self._store.lock:
+            old = self.get(key)
+            super().__setitem__(key, value)
+            if old != value:
+                self._store._on_field_change(self, key, old, value)
+        if key in WATCHED_FIELDS and old != value:
+            self._store._notify(self, key, old, value)
+
+    def __delitem__(self, key):
+        with self._store.lock:
+            old = self.get(key)
+            super().__delitem__(key)
+            if key in INDEXED_FIELDS and old is not None:
+                self._store._on_field_change(self, key, old, None)
+
+    def pop(self, key, *default):
+        with self._store.lock:
+            had_key = key in self
+            value = super().pop(key, *default)
+            if had_key and key in INDEXED_FIELDS and value is not None:
+                self._store._on_field_change(self, key, value, None)
+            return value
+
+    def update(self, *args, **kwargs):
+        with self._store.lock:
+            for key, value in dict(*args, **kwargs).items():
+                self[key] = value
+
+    def setdefault(self, key, default=None):
+        with self._store.lock:
+            if key not in self:
+                self[key] = default
+            return self[key]
+
+
+class UserStore(MutableMapping):
+    """
+    Drop-in replacement for the old `state.users` dict.
+
+    Keeps secondary indexes so hot loops don't have to scan everyone:
+      - one set of MACs per status (connected, paused, expired, blocked, new)
+      - MAC -> IP and IP -> MAC maps
+    Indexes are updated automatically whenever a record's status or IP changes.
+
+    Thread safety: the coin, timer and monitor threads plus the async handlers
+    all write here. Writers serialize on `lock`; readers never lock. The MAC
+    table and the status sets are copy-on-write, so any dict/frozenset a reader
+    got hold of is never mutated and can be iterated without `list(...)` copies.
+
+    Multi-field read-modify-write sequences (e.g. converting balance to time)
+    must hold `lock` so a coin credited halfway through isn't lost:
+
+        with state.users.lock:
+            user["time"] += ...
+            user["balance"] = 0
+
+    Memory is bounded by active devices: idle zero-balance "new"/"expired"
+    records are evicted (least recently active first) once they pass the idle
+    limit or the table goes over `max_users`. A lookup that misses in memory
+    transparently reloads the record from SQLite by MAC; MACs found in neither
+    are remembered for MISS_TTL seconds. Hot async paths that only care about
+    loaded users should use is_resident(), which never touches the database.
+    """
+
+    def __init__(self, max_users=None):
+        self.lock = threading.RLock()
+        self.version = 0
+        self.max_users = max_users
+        self.evicted_total = 0
+        self.reloaded_total = 0
+        self._misses = {}  # MAC -> time it was last not found in SQLite
+        self._data = {}
+        self._by_status = {s: frozenset() for s in STATUSES}
+        self._mac_to_ip = {}
+        self._ip_to_mac = {}
+        # LRU order by last activity: oldest first
+        self._lru = OrderedDict()
+        self._listeners = []
+
+    # --- MAPPING PROTOCOL ---
+    def __getitem__(self, mac):
+        record = self._data.get(mac)
+        if record is None:
+            record = self._reload(mac)
+            if record is None:
+                raise KeyError(mac)
+        return record
+
+    def __setitem__(self, mac, data):
+        with self.lock:
+            evicted = self._insert(mac, data)
+        self._persist_evicted(evicted)
+
+    def __delitem__(self, mac):
+        with self.lock:
+            data_copy = dict(self._data)
+            record = data_copy.pop(mac)
+            self._data = data_copy
+            self._unindex(mac, record)
+            self._lru.pop(mac, None)
+            self.version += 1
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, mac):
+        return mac in self._data or self._reload(mac) is not None
+
+    # Views over the current snapshot (safe to iterate while others write)
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+    def items(self):
+        return self._data.items()
+
+    def get(self, mac, default=None):
+        record = self._data.get(mac)
+        if record is None:
+            record = self._reload(mac)
+        return default if record is None else record
+
+    def get_or_create(self, mac, defaults: dict):
+        """
+        The record for mac, reloaded from SQLite or else created from `defaults`.
+        May read the database: async code runs it through scheduler.run_blocking.
+        """
+        record = self.get(mac)
+        if record is not None:
+            return record
+        with self.lock:
+            record = self._data.get(mac)
+            evicted = [] if record is not None else self._insert(mac, dict(defaults))
+            record = self._data[mac]
+        self._persist_evicted(evicted)
+        return record
+
+    def is_resident(self, mac) -> bool:
+        """Membership check that never touches the database."""
+        return mac in self._data
+
+    def snapshot(self) -> dict:
+        """Returns the current MAC -> record table. Treat it as read-only."""
+        return self._data
+
+    def load(self, users: dict):
+        """Replaces the whole table (used at boot with database.load_users())."""
+        with self.lock:
+            self._data = {}
+            self._by_status = {s: frozenset() for s in STATUSES}
+            self._mac_to_ip = {}
+            self._ip_to_mac = {}
+            self._lru = OrderedDict()
+            self._misses = {}
+            data = {}
+            for mac, user in users.items():
+                record = UserRecord(self, mac, user)
+                data[mac] = record
+                self._index(mac, record)
+                self._lru[mac] = None
+            self._data = data
+            self.version += 1
+
+    # --- INDEXED QUERIES ---
+    def macs_with_status(self, *statuses) -> frozenset:
+        """Returns the MACs currently in any of the given statuses."""
+        if len(statuses) == 1:
+            return self._by_status.get(statuses[0], frozenset())
+        result = frozenset()
+        for s in statuses:
+            result = result | self._by_status.get(s, frozenset())
+        return result
+
+    def with_status(self, *statuses):
+        """Yields (mac, record) for users in any of the given statuses."""
+        data = self._data
+        for mac in self.macs_with_status(*statuses):
+            record = data.get(mac)
+            if record is not None:
+                yield mac, record
+
+    def count(self, status: str) -> int:
+        return len(self._by_status.get(status, ()))
+
+    def ip_of(self, mac: str):
+        return self._mac_to_ip.get(mac)
+
+    def mac_of(self, ip: str):
+        return self._ip_to_mac.get(ip)
+
+    # --- CHANGE EVENTS ---
+    def subscribe(self, callback):
+        """
+        Registers callback(mac, field, old, new) for changes to WATCHED_FIELDS.
+        Called from whichever thread made the change, so keep it cheap
+        (e.g. add the MAC to a dirty set).
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, record, key, old, new):
+        mac = record._mac
+        if self._data.get(mac) is not record:
+            return
+        for callback in self._listeners:
+            try: callback(mac, key, old, new)
+            except Exception: pass
+
+    # --- EVICTION & LAZY RELOAD ---
+    def evict_idle(self, idle_seconds: int) -> int:
+        """
+        Drops evictable records idle for longer than idle_seconds, plus anything
+        needed to get back under max_users. Returns how many were evicted.
+        """
+        cutoff = time.time() - idle_seconds
+        macs = []
+        with self.lock:
+            # The LRU is ordered by activity, so stop at the first recent record
+            for mac in list(self._lru):
+                record = self._data.get(mac)
+                if record is None:
+                    self._lru.pop(mac, None)
+                    continue
+                if record.get("last_active", 0) > cutoff:
+                    break
+                if self._is_evictable(record):
+                    macs.append(mac)
+            evicted = self._drop(macs)
+            evicted.extend(self._evict_over_cap())
+        self._persist_evicted(evicted)
+        return len(evicted)
+
+    def _evict_over_cap(self, keep=None) -> list:
+        """Drops LRU evictable records until under max_users (caller holds the lock)."""
+        if not self.max_users:
+            return []
+        excess = len(self._data) - self.max_users
+        macs = []
+        for mac in self._lru:
+            if len(macs) >= excess:
+                break
+            record = self._data.get(mac)
+            if mac != keep and record is not None and self._is_evictable(record):
+                macs.append(mac)
+        return self._drop(macs)
+
+    @staticmethod
+    def _is_evictable(record) -> bool:
+        return record.get("status") in EVICTABLE_STATUSES and not record.get("balance", 0)
+
+    def _drop(self, macs) -> list:
+        """Removes records from memory only, with one table copy per pass (caller holds the lock)."""
+        if not macs:
+            return []
+        data_copy = dict(self._data)
+        evicted = [(mac, data_copy.pop(mac)) for mac in macs]
+        self._data = data_copy
+        for mac, record in evicted:
+            self._unindex(mac, record)
+            self._lru.pop(mac, None)
+        self.version += 1
+        self.evicted_total += len(evicted)
+        return evicted
+
+    def _persist_evicted(self, evicted):
+        # A brand-new device with nothing on it is identical to an unknown one,
+        # so only records that carry something (points, free claim, history) are written.
+        to_sync = [(mac, r) for mac, r in evicted
+                   if r.get("status") != "new" or r.get("time") or r.get("points") or r.get("free_claimed")]
+        if to_sync:
+            from core import database
+            database.sync_multiple_users(to_sync)
+
+    def _reload(self, mac):
+        if not mac:
+            return None
+        missed_at = self._misses.get(mac)
+        if missed_at and time.time() - missed_at < MISS_TTL:
+            return None
+        from core import database
+        user = database.load_user(mac)
+        if user is None:
+            with self.lock:
+                if mac not in self._data:
+                    if len(self._misses) >= MAX_MISSES:
+                        self._misses.clear()
+                    self._misses[mac] = time.time()
+            return None
+        evicted = []
+        with self.lock:
+            # Someone may have re-created it while we were reading the DB
+            record = self._data.get(mac)
+            if record is None:
+                evicted = self._insert(mac, user)
+                record = self._data[mac]
+                self.reloaded_total += 1
+        # Written outside the lock: the timer/monitor/coin threads never wait on SQLite
+        self._persist_evicted(evicted)
+        return record
+
+    def _insert(self, mac, data) -> list:
+        """Adds/replaces a record, evicting over the cap. Returns the evicted (caller holds the lock)."""
+        data_copy = dict(self._data)
+        if mac in data_copy:
+            self._unindex(mac, data_copy[mac])
+        self._misses.pop(mac, None)
+        record = UserRecord(self, mac, data)
+        if "last_active" not in record:
+            # Freshly created/reloaded records count as active right now (LRU order)
+            dict.__setitem__(record, "last_active", time.time())
+        data_copy[mac] = record
+        self._data = data_copy
+        self._index(mac, record)
+        self._lru[mac] = None
+        self._lru.move_to_end(mac)
+        self.version += 1
+        if self.max_users and len(data_copy) > self.max_users:
+            return self._evict_over_cap(keep=mac)
+        return []
+
+    def _touch(self, mac):
+        with self.lock:
+            if mac in self._lru:
+                self._lru.move_to_end(mac)
+
+    # --- INDEX MAINTENANCE (caller holds the lock) ---
+    def _add_status(self, status, mac):
+        self._by_status[status] = self._by_status.get(status, frozenset()) | {mac}
+
+    def _remove_status(self, status, mac):
+        current = self._by_status.get(status)
+        if current and mac in current:
+            self._by_status[status] = current - {mac}
+
+    def _index(self, mac, record):
+        self._add_status(record.get("status"), mac)
+        ip = record.get("ip")
+        if ip:
+            self._link_ip(mac, ip)
+
+    def _unindex(self, mac, record):
+        self._remove_status(record.get("status"), mac)
+        self._unlink_ip(mac)
+
+    def _link_ip(self, mac, ip):
+        self._unlink_ip(mac)
+        # An IP can only belong to one device at a time (DHCP reassignments)
+        previous_owner = self._ip_to_mac.get(ip)
+        if previous_owner and previous_owner != mac:
+            self._mac_to_ip.pop(previous_owner, None)
+        self._mac_to_ip[mac] = ip
+        self._ip_to_mac[ip] = mac
+
+    def _unlink_ip(self, mac):
+        ip = self._mac_to_ip.pop(mac, None)
+        if ip and self._ip_to_mac.get(ip) == mac:
+            del self._ip_to_mac[ip]
+
+    def _on_field_change(self, record, key, old, new):
+        # Records removed/replaced in the store may still be referenced by a loop; ignore them
+        mac = record._mac
+        if self._data.get(mac) is not record:
+            return
+        if key == "status":
+            self._remove_status(old, mac)
+            self._add_status(new, mac)
+        elif key == "ip":
+            if new:
+                self._link_ip(mac, new)
+            else:
+                self._unlink_ip(mac)
+        self.version += 1
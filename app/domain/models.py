@@ -5,6 +5,22 @@ class RestartScheduleRequest(BaseModel):
     enabled: bool
     time: str
 
+class MaintenanceJobRequest(BaseModel):
+    enabled: bool
+    cron: str
+
+class LogRetentionRequest(BaseModel):
+    days: int
+
+class SimulatedCoinsRequest(BaseModel):
+    coins: List[int]
+    slot: int = 1
+    interval: float = 1.0
+    width: float = 0.03
+    gap: float = 0.07
+    jitter: float = 0.0
+    bounce: int = 0
+
 class PromoItem(BaseModel):
     id: int
     name: str
@@ -1,6 +1,8 @@
-import wiringpi
 import time
+import threading
 import config
+from hardware.gpio_backend import create_backend
+from hardware.pulse_counter import PulseCounter
 
 # Import the centralized logger and alias it as 'print' to avoid changing 
 # the rest of the code below.
@@ -8,46 +10,163 @@ from core.logger import system_log as print
 
 # ---------------------------
 
-# Global state
-current_slot_user = None
+# GPIO backend (config.GPIO_BACKEND / $GPIO_BACKEND): "wiringpi" on the board, "simulated" anywhere
+gpio = create_backend(getattr(config, "GPIO_BACKEND", None))
+
+
+class Slot:
+    """
+    One coin acceptor: its coin pin, relay pins, current owner (MAC) and the
+    time its portal slot closes. Each slot gets its own listener thread.
+    """
+
+    def __init__(self, index, coin_pin, relay_pins, gpio_line=None):
+        self.index = index
+        self.coin_pin = int(coin_pin)
+        self.relay_pins = [int(p) for p in relay_pins]
+        self.gpio_line = gpio_line
+        self.user = None
+        self.expires_at = 0
+        # Edge-triggered coin detection (set up by setup()); None = polling fallback
+        self.detection_mode = "poll"
+        self.pulse_counter = None
+
+    @property
+    def number(self):
+        """1-based, for logs and the portal."""
+        return self.index + 1
+
+    def seconds_left(self):
+        return max(0, int(self.expires_at - time.time())) if self.user else 0
+
+    def turn_on(self):
+        for pin in self.relay_pins:
+            gpio.write(pin, 1)
+
+    def turn_off(self):
+        self.user = None
+        self.expires_at = 0
+        for pin in self.relay_pins:
+            gpio.write(pin, 0)
+
+    def read_pin(self):
+        return gpio.read(self.coin_pin)
+
+    def wait_for_pulse(self, on_detected=None):
+        """
+        Blocks until a coin's pulse train is complete and returns the pulse count.
+        Sleeps on the edge queue when edge detection is up, otherwise polls the pin.
+        """
+        if self.pulse_counter is not None:
+            return self.pulse_counter.wait_for_coin(on_first_pulse=on_detected)
+        return _poll_for_pulse(self, on_detected)
+
+
+# One Slot per configured acceptor (config.COIN_SLOTS)
+slots = [Slot(i, s["coin_pin"], s.get("relay_pins", []), s.get("gpio_line"))
+         for i, s in enumerate(config.COIN_SLOTS)]
+# Slot assignment happens on the loop, releases also from worker threads
+_slots_lock = threading.Lock()
 
 def setup():
     """
-    Initialize GPIO modes based on config using native WiringPi.
+    Initialize GPIO modes based on config through the selected backend.
     """
-    # 1. Initialize WiringPi (Uses Physical Pin Numbers 1-40)
-    wiringpi.wiringPiSetupPhys()
-    
-    # 2. Setup Coin Pin (Input + Pull Up)
-    coin_pin = int(config.COIN_PIN_WPI)
-    wiringpi.pinMode(coin_pin, 0)         # 0 = INPUT
-    wiringpi.pullUpDnControl(coin_pin, 2) # 2 = PULL_UP
-    
-    # 3. Setup Relay Pins (Output + Default OFF)
-    for pin in config.RELAY_PINS:
-        p = int(pin)
-        wiringpi.pinMode(p, 1)        # 1 = OUTPUT
-        wiringpi.digitalWrite(p, 0)   # 0 = OFF
+    # 1. Initialize the backend (Uses Physical Pin Numbers 1-40)
+    gpio.setup()
     
-    print(f"Hardware Ready (Coin Pin: {config.COIN_PIN_WPI})")
+    for slot in slots:
+        # 2. Setup Coin Pin (Input + Pull Up)
+        gpio.input_pullup(slot.coin_pin)
+        
+        # 3. Setup Relay Pins (Output + Default OFF)
+        for p in slot.relay_pins:
+            gpio.output(p)
+            gpio.write(p, 0)
+        
+        _start_edge_detection(slot)
+        print(f"Hardware Ready (Backend: {gpio.name}, Slot {slot.number}, Coin Pin: {slot.coin_pin}, Detection: {slot.detection_mode})")
+
+def _start_edge_detection(slot):
+    """Tries the configured edge source(s); on failure the slot keeps polling."""
+    mode = getattr(config, "COIN_EDGE_MODE", "auto")
+    counter = PulseCounter(gap=float(getattr(config, "COIN_PULSE_GAP", 0.6)),
+                           debounce=float(getattr(config, "COIN_DEBOUNCE", 0.01)))
+
+    if mode in ("auto", "chardev") and slot.gpio_line is not None and gpio.name == "wiringpi":
+        try:
+            from hardware import gpio_events
+            fd = gpio_events.open_falling_edges(config.COIN_GPIO_CHIP, int(slot.gpio_line))
+            gpio_events.start_reader(fd, counter.push, name=f"Piso-Edge-{slot.number}")
+            slot.detection_mode, slot.pulse_counter = "chardev", counter
+            return
+        except Exception as e:
+            print(f"   [Warning] GPIO chardev edge detection unavailable: {e}")
+
+    # A failed wiringPiISR() exit()s the whole daemon instead of raising,
+    # so real hardware only uses it when explicitly configured
+    if mode == "isr" or (mode == "auto" and gpio.name != "wiringpi"):
+        try:
+            gpio.on_falling_edge(slot.coin_pin, counter.push)
+            slot.detection_mode, slot.pulse_counter = gpio.edge_mode, counter
+            return
+        except Exception as e:
+            print(f"   [Warning] ISR edge detection unavailable: {e}")
 
-def turn_slot_on():
-    for pin in config.RELAY_PINS:
-        wiringpi.digitalWrite(int(pin), 1)
+# --- SLOT ASSIGNMENT ---
+def slot_of(mac):
+    """The slot `mac` currently owns, or None."""
+    for slot in slots:
+        if slot.user == mac:
+            return slot
+    return None
 
-def turn_slot_off():
-    global current_slot_user
-    current_slot_user = None
-    for pin in config.RELAY_PINS:
-        wiringpi.digitalWrite(int(pin), 0)
+def acquire_slot(mac, timeout):
+    """
+    Opens a slot for `mac` for `timeout` seconds: the one they already hold,
+    else the first free one. Returns the Slot, or None if all are busy.
+    """
+    with _slots_lock:
+        slot = slot_of(mac) or next((s for s in slots if s.user is None), None)
+        if slot is None:
+            return None
+        slot.user = mac
+        slot.expires_at = time.time() + timeout
+    slot.turn_on()
+    return slot
+
+def extend_slot(mac, timeout):
+    """Pushes back the closing time of `mac`'s slot (coins are still dropping)."""
+    slot = slot_of(mac)
+    if slot:
+        slot.expires_at = time.time() + timeout
+    return slot
 
-def read_pin():
-    return wiringpi.digitalRead(int(config.COIN_PIN_WPI))
+def release_slot(mac):
+    """Closes `mac`'s slot. Returns the Slot it held, or None."""
+    with _slots_lock:
+        slot = slot_of(mac)
+        if slot:
+            slot.turn_off()
+    return slot
 
-def wait_for_pulse(on_detected=None):
+def turn_all_off():
+    with _slots_lock:
+        for slot in slots:
+            slot.turn_off()
+
+def simulate_coins(coins, interval=1.0, slot=0, **timing):
+    """Plays pulse trains (one per coin) on a simulated acceptor (simulated backend only)."""
+    if gpio.name != "simulated":
+        raise RuntimeError("Coin simulation needs GPIO_BACKEND=simulated")
+    return gpio.play(slots[slot].coin_pin, coins, interval=interval, **timing)
+
+def _poll_for_pulse(slot, on_detected=None):
     """
     Smart Pulse Counter (Native WiringPi + Anti-Stuck Logic + Instant Logs)
     """
+    read_pin = slot.read_pin
+
     # SAFETY: If pin is stuck LOW (0), wait for it to clear.
     if read_pin() == 0:
         print("   [Warning] Signal Stuck LOW. Waiting for clear...") 
@@ -88,7 +207,7 @@ def wait_for_pulse(on_detected=None):
     last_state = 1
 
     # Keep listening until silence
-    while (time.time() - last_pulse_time) < 0.6:
+    while (time.time() - last_pulse_time) < float(getattr(config, "COIN_PULSE_GAP", 0.6)):
         state = read_pin()
         if state == 0 and last_state == 1:
             total_pulses += 1
@@ -0,0 +1,150 @@
+import os
+import time
+import random
+import threading
+from abc import ABC, abstractmethod
+
+INPUT, OUTPUT = 0, 1
+PULL_UP = 2
+INT_EDGE_FALLING = 1
+
+
+class GpioBackend(ABC):
+    """
+    The GPIO surface the controller needs. Pins are physical (header) numbers.
+    `edge_mode` names the edge source on_falling_edge() uses ("isr", "sim", ...).
+    """
+    name = "base"
+    edge_mode = None
+
+    def setup(self):
+        """One-time init before any pin is used. Optional."""
+
+    @abstractmethod
+    def input_pullup(self, pin: int): ...
+
+    @abstractmethod
+    def output(self, pin: int): ...
+
+    @abstractmethod
+    def write(self, pin: int, value: int): ...
+
+    @abstractmethod
+    def read(self, pin: int) -> int: ...
+
+    @abstractmethod
+    def on_falling_edge(self, pin: int, callback):
+        """Calls callback() on every falling edge of `pin`. Raises if the backend can't (the slot then polls)."""
+
+
+class WiringPiBackend(GpioBackend):
+    """Native WiringPi (Orange Pi / wiringOP). Imported on setup() so the app still loads without it."""
+    name = "wiringpi"
+    edge_mode = "isr"
+
+    def __init__(self):
+        self.wp = None
+
+    def setup(self):
+        import wiringpi
+        self.wp = wiringpi
+        wiringpi.wiringPiSetupPhys()
+
+    def input_pullup(self, pin):
+        self.wp.pinMode(pin, INPUT)
+        self.wp.pullUpDnControl(pin, PULL_UP)
+
+    def output(self, pin):
+        self.wp.pinMode(pin, OUTPUT)
+
+    def write(self, pin, value):
+        self.wp.digitalWrite(pin, value)
+
+    def read(self, pin):
+        return self.wp.digitalRead(pin)
+
+    def on_falling_edge(self, pin, callback):
+        if self.wp.wiringPiISR(pin, INT_EDGE_FALLING, callback) < 0:
+            raise OSError("wiringPiISR failed")
+
+
+class SimulatedBackend(GpioBackend):
+    """
+    In-memory pins for running and load-testing the app off the board.
+
+    Inputs idle HIGH (pulled up). emit_coin() plays a pulse train on a pin
+    from a background thread: the level goes LOW for `width` seconds per
+    pulse (visible to the polling fallback) and edge callbacks fire on each
+    falling edge. Gap jitter and contact bounce can be added to reproduce
+    timing-dependent miscounts.
+    """
+    name = "simulated"
+    edge_mode = "sim"
+
+    def __init__(self, seed=None):
+        self.levels = {}
+        self.modes = {}
+        self.writes = 0
+        self._callbacks = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def input_pullup(self, pin):
+        self.modes[pin] = INPUT
+        self.levels.setdefault(pin, 1)
+
+    def output(self, pin):
+        self.modes[pin] = OUTPUT
+        self.levels.setdefault(pin, 0)
+
+    def write(self, pin, value):
+        self.levels[pin] = 1 if value else 0
+        self.writes += 1
+
+    def read(self, pin):
+        return self.levels.get(pin, 1)
+
+    def on_falling_edge(self, pin, callback):
+        self._callbacks.setdefault(pin, []).append(callback)
+
+    def _fall(self, pin):
+        self.levels[pin] = 0
+        for callback in self._callbacks.get(pin, ()):
+            callback()
+
+    def emit_coin(self, pin, pulses, width=0.03, gap=0.07, jitter=0.0, bounce=0):
+        """Plays one coin's pulse train synchronously (call from a worker thread)."""
+        with self._lock:  # trains on the same acceptor never overlap
+            for i in range(pulses):
+                self._fall(pin)
+                for _ in range(bounce):
+                    # Contact chatter: extra falling edges within the first ~2 ms
+                    time.sleep(0.0005)
+                    self.levels[pin] = 1
+                    time.sleep(0.0005)
+                    self._fall(pin)
+                time.sleep(width)
+                self.levels[pin] = 1
+                if i < pulses - 1:
+                    time.sleep(max(0.0, gap + self._random.uniform(-jitter, jitter)))
+
+    def play(self, pin, coins, interval=1.0, **timing):
+        """Emits each coin's pulse train `interval` seconds apart on a daemon thread. Returns the thread."""
+        def run():
+            for pulses in coins:
+                self.emit_coin(pin, int(pulses), **timing)
+                time.sleep(interval)
+        thread = threading.Thread(target=run, name="Piso-SimCoin", daemon=True)
+        thread.start()
+        return thread
+
+
+BACKENDS = {"wiringpi": WiringPiBackend, "simulated": SimulatedBackend}
+
+
+def create_backend(name: str = None) -> GpioBackend:
+    """Backend from $GPIO_BACKEND, else `name` (config.GPIO_BACKEND), else wiringpi."""
+    name = (os.getenv("GPIO_BACKEND") or name or "wiringpi").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown GPIO backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
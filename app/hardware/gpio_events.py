@@ -0,0 +1,75 @@
+import os
+import time
+import fcntl
+import struct
+import threading
+
+# Linux GPIO character device, v1 ABI (<linux/gpio.h>)
+GPIOHANDLE_REQUEST_INPUT = 1 << 0
+GPIOHANDLE_REQUEST_BIAS_PULL_UP = 1 << 5
+GPIOEVENT_REQUEST_RISING_EDGE = 1 << 0
+GPIOEVENT_REQUEST_FALLING_EDGE = 1 << 1
+GPIOEVENT_REQUEST_BOTH_EDGES = GPIOEVENT_REQUEST_RISING_EDGE | GPIOEVENT_REQUEST_FALLING_EDGE
+GPIOEVENT_EVENT_RISING_EDGE = 0x01
+GPIOEVENT_EVENT_FALLING_EDGE = 0x02
+
+# struct gpioevent_request { u32 lineoffset; u32 handleflags; u32 eventflags; char consumer_label[32]; int fd; }
+_EVENT_REQUEST = struct.Struct("=III32si")
+# struct gpioevent_data { u64 timestamp; u32 id; } (padded to 16 bytes)
+_EVENT_DATA = struct.Struct("=QI4x")
+# _IOWR(0xB4, 0x04, struct gpioevent_request)
+GPIO_GET_LINEEVENT_IOCTL = (3 << 30) | (_EVENT_REQUEST.size << 16) | (0xB4 << 8) | 0x04
+
+
+def open_falling_edges(chip: str, line: int, consumer: str = "piso-coin") -> int:
+    """Requests falling-edge events (with pull-up) for one line. Returns the event fd."""
+    return open_line_events(chip, line, GPIOEVENT_REQUEST_FALLING_EDGE, consumer)
+
+
+def open_line_events(chip: str, line: int, event_flags: int, consumer: str = "piso-coin") -> int:
+    chip_fd = os.open(chip, os.O_RDONLY)
+    try:
+        request = bytearray(_EVENT_REQUEST.pack(
+            int(line),
+            GPIOHANDLE_REQUEST_INPUT | GPIOHANDLE_REQUEST_BIAS_PULL_UP,
+            event_flags,
+            consumer.encode()[:31], 0
+        ))
+        fcntl.ioctl(chip_fd, GPIO_GET_LINEEVENT_IOCTL, request)
+        return _EVENT_REQUEST.unpack(request)[4]
+    finally:
+        os.close(chip_fd)
+
+
+def read_events(fd: int, max_events: int = 16):
+    """One blocking read: [(timestamp_ns, event_id)] in arrival order."""
+    data = os.read(fd, _EVENT_DATA.size * max_events)
+    return [_EVENT_DATA.unpack_from(data, offset)
+            for offset in range(0, len(data) - _EVENT_DATA.size + 1, _EVENT_DATA.size)]
+
+
+def start_reader(fd: int, on_edge, name: str = "Piso-Edge") -> threading.Thread:
+    """
+    Blocks in read() on the event fd and calls on_edge(monotonic_ts) per edge.
+    The kernel timestamps each edge when it happens, so a batch read after a
+    stall still carries the real spacing. Kernels before 5.7 stamp with the
+    realtime clock; then we fall back to the time of the read.
+    """
+    def run():
+        kernel_clock = None
+        while True:
+            try:
+                events = read_events(fd)
+            except InterruptedError:
+                continue
+            except OSError:
+                return
+            now = time.monotonic()
+            for ts_ns, _ in events:
+                if kernel_clock is None:
+                    kernel_clock = abs(ts_ns / 1e9 - now) < 5
+                on_edge(ts_ns / 1e9 if kernel_clock else now)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,89 @@
+import time
+import threading
+from array import array
+
+
+class PulseCounter:
+    """
+    Groups timestamped coin pulses into coins.
+
+    The edge source (wiringPiISR callback or GPIO chardev reader) only calls
+    push(): it stores a monotonic timestamp in a fixed ring and wakes the
+    listener. wait_for_coin() then counts pulses until a gap of `gap` seconds,
+    judged on the recorded timestamps rather than on when the listener thread
+    happened to run, so a busy or descheduled thread can't merge or split coins.
+    A pulse that arrives after the gap stays queued and starts the next coin.
+    """
+
+    def __init__(self, gap: float = 0.6, debounce: float = 0.01, capacity: int = 512):
+        self.gap = gap
+        self.debounce = debounce
+        self.capacity = capacity
+        self._ts = array("d", [0.0]) * capacity
+        self._head = 0  # total pulses written
+        self._tail = 0  # total pulses consumed
+        self._cond = threading.Condition()
+        self.last_edge = 0.0
+        self.pulses = 0
+        self.bounced = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def push(self, ts: float = None):
+        """Records one falling edge. Safe to call from any thread (ISR/reader)."""
+        ts = time.monotonic() if ts is None else ts
+        with self._cond:
+            if ts - self.last_edge < self.debounce:
+                self.bounced += 1
+                return
+            self.last_edge = ts
+            if self._head - self._tail >= self.capacity:
+                # Nobody is consuming: drop the oldest rather than block the edge source
+                self._tail += 1
+                self.dropped += 1
+            self._ts[self._head % self.capacity] = ts
+            self._head += 1
+            self.pulses += 1
+            self._cond.notify()
+
+    def wait_for_coin(self, on_first_pulse=None, timeout: float = None) -> int:
+        """
+        Blocks until a full pulse train has arrived and returns its pulse count
+        (0 if `timeout` passed without a pulse). `on_first_pulse` is called as
+        soon as the first pulse is seen, before the train is complete.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._head > self._tail, timeout):
+                return 0
+            last = self._pop()
+
+        if on_first_pulse:
+            try: on_first_pulse()
+            except Exception as e:
+                from core.logger import system_log
+                system_log(f"Callback Error: {e}")
+
+        pulses = 1
+        with self._cond:
+            while True:
+                while self._head > self._tail:
+                    ts = self._ts[self._tail % self.capacity]
+                    if ts - last >= self.gap:
+                        return pulses  # belongs to the next coin
+                    self._tail += 1
+                    pulses += 1
+                    last = ts
+                remaining = last + self.gap - time.monotonic()
+                if remaining <= 0:
+                    return pulses
+                self._cond.wait(remaining)
+
+    def _pop(self) -> float:
+        ts = self._ts[self._tail % self.capacity]
+        self._tail += 1
+        return ts
+
+    def stats(self) -> dict:
+        return {"pulses": self.pulses, "bounced": self.bounced, "dropped": self.dropped, "queued": len(self)}
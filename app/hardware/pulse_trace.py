@@ -0,0 +1,297 @@
+"""
+Coin pulse traces: record raw edges from the coin pin, then analyze them offline
+to calibrate COIN_PULSE_GAP / COIN_DEBOUNCE.
+
+    python -m hardware.pulse_trace record trace.ptr --seconds 120 [--line N]
+    python -m hardware.pulse_trace analyze trace.ptr [--expected 1,5,10]
+
+File format (little endian): a 16-byte header (b"PTRC", version, pin,
+start time in unix microseconds) followed by one u32 per edge:
+(microseconds since the previous record << 1) | new level. Gaps longer than
+~35 minutes are bridged with records that repeat the current level.
+"""
+import os
+import sys
+import time
+import select
+import struct
+import argparse
+
+from hardware.pulse_counter import PulseCounter
+
+MAGIC = b"PTRC"
+VERSION = 1
+_HEADER = struct.Struct("<4sBxHQ")
+_RECORD = struct.Struct("<I")
+_MAX_DELTA_US = (1 << 31) - 1
+
+HISTOGRAM_BINS_MS = [1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 2000]
+
+
+# --- RECORDING ---
+class TraceWriter:
+    def __init__(self, path: str, pin: int, start: float = None):
+        self.start = time.monotonic() if start is None else start
+        self.edges = 0
+        self._last_us = 0
+        self._level = 1
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, int(pin), int(time.time() * 1_000_000)))
+
+    def edge(self, ts: float, level: int):
+        """Records a level change at monotonic time `ts` (seconds)."""
+        now_us = max(self._last_us, int((ts - self.start) * 1_000_000))
+        delta = now_us - self._last_us
+        while delta > _MAX_DELTA_US:
+            self._file.write(_RECORD.pack((_MAX_DELTA_US << 1) | self._level))
+            delta -= _MAX_DELTA_US
+        self._file.write(_RECORD.pack((delta << 1) | (1 if level else 0)))
+        self._last_us = now_us
+        self._level = 1 if level else 0
+        self.edges += 1
+
+    def close(self):
+        self._file.close()
+
+
+def record_polling(gpio, pin: int, seconds: float, writer: TraceWriter) -> dict:
+    """Samples the pin as fast as the backend allows (diagnostics only: this spins a core)."""
+    samples, last = 0, gpio.read(pin)
+    end = time.monotonic() + seconds
+    while True:
+        now = time.monotonic()
+        if now >= end: break
+        level = gpio.read(pin)
+        samples += 1
+        if level != last:
+            writer.edge(now, level)
+            last = level
+    return {"source": "poll", "samples": samples, "sample_rate_hz": round(samples / seconds)}
+
+
+def record_chardev(chip: str, line: int, seconds: float, writer: TraceWriter) -> dict:
+    """Both edges from the GPIO character device, with kernel timestamps."""
+    from hardware import gpio_events
+    fd = gpio_events.open_line_events(chip, line, gpio_events.GPIOEVENT_REQUEST_BOTH_EDGES, "piso-trace")
+    end = time.monotonic() + seconds
+    offset = None
+    try:
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0: break
+            if not select.select([fd], [], [], remaining)[0]: continue
+            for ts_ns, event_id in gpio_events.read_events(fd):
+                if offset is None:
+                    # Kernel clock -> our monotonic clock (same clock on >= 5.7, shifted otherwise)
+                    offset = time.monotonic() - ts_ns / 1e9
+                writer.edge(ts_ns / 1e9 + offset, 1 if event_id == gpio_events.GPIOEVENT_EVENT_RISING_EDGE else 0)
+    finally:
+        os.close(fd)
+    return {"source": "chardev"}
+
+
+def read_trace(path: str):
+    """Returns (pin, start_unix_seconds, [(seconds_since_start, level)])."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, pin, start_us = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a v{VERSION} pulse trace")
+    edges, t_us, level = [], 0, 1
+    for (record,) in _RECORD.iter_unpack(data[_HEADER.size:]):
+        t_us += record >> 1
+        if (record & 1) != level:
+            level = record & 1
+            edges.append((t_us / 1_000_000, level))
+    return pin, start_us / 1_000_000, edges
+
+
+# --- ANALYSIS ---
+def histogram(values_s):
+    """Counts per millisecond bin: [(label, count)]."""
+    counts = [0] * (len(HISTOGRAM_BINS_MS) + 1)
+    for v in values_s:
+        ms = v * 1000
+        i = 0
+        while i < len(HISTOGRAM_BINS_MS) and ms >= HISTOGRAM_BINS_MS[i]: i += 1
+        counts[i] += 1
+    labels = [f"<{HISTOGRAM_BINS_MS[0]}ms"]
+    labels += [f"{lo}-{hi}ms" for lo, hi in zip(HISTOGRAM_BINS_MS, HISTOGRAM_BINS_MS[1:])]
+    labels.append(f">={HISTOGRAM_BINS_MS[-1]}ms")
+    return list(zip(labels, counts))
+
+
+def pulse_widths(edges):
+    """LOW time of each pulse (falling edge to the following rising edge)."""
+    widths, fell = [], None
+    for t, level in edges:
+        if level == 0: fell = t
+        elif fell is not None:
+            widths.append(t - fell)
+            fell = None
+    return widths
+
+
+def split_threshold(intervals):
+    """
+    Falling-to-falling intervals are bimodal: pulses within a coin vs the pause
+    between coins. Returns the geometric midpoint of the widest jump in the
+    sorted intervals, or None when there's no clear second mode.
+    """
+    values = sorted(v for v in intervals if v > 0)
+    best, threshold = 3.0, None
+    for lo, hi in zip(values, values[1:]):
+        if hi / lo > best:
+            best, threshold = hi / lo, (lo * hi) ** 0.5
+    return threshold
+
+
+def replay(falling, gap: float, debounce: float):
+    """
+    Runs falling-edge times through PulseCounter (the live counting logic).
+    Returns [(pulses, latency)] per coin; latency runs from the coin's first
+    pulse to the moment it would be credited (last pulse + gap).
+    """
+    if not falling:
+        return []
+    counter = PulseCounter(gap=gap, debounce=debounce, capacity=len(falling) + 1)
+    # Shift into the past so every pulse train is already "complete"
+    shift = time.monotonic() - falling[-1] - gap - 1
+    for t in falling:
+        counter.push(t + shift)
+    accepted = [counter._ts[i] - shift for i in range(counter._head)]
+
+    coins, index = [], 0
+    while True:
+        pulses = counter.wait_for_coin(timeout=0)
+        if not pulses: break
+        first, last = accepted[index], accepted[index + pulses - 1]
+        coins.append((pulses, last - first + gap))
+        index += pulses
+    return coins
+
+
+def miscounts(counted, expected):
+    """Coins whose pulse count differs from the expected sequence (merged/split coins count too)."""
+    wrong = sum(1 for a, b in zip(counted, expected) if a != b)
+    return wrong + abs(len(counted) - len(expected))
+
+
+def analyze(edges, gap: float = 0.6, debounce: float = 0.01, expected=None) -> dict:
+    falling = [t for t, level in edges if level == 0]
+    widths = pulse_widths(edges)
+    intervals = [b - a for a, b in zip(falling, falling[1:])]
+    # Anything under 5 ms is contact bounce, not a pulse
+    clean = [v for v in intervals if v > 0.005]
+    threshold = split_threshold(clean)
+
+    # Suggestions: debounce under half the shortest real intra-coin spacing,
+    # gap with 50% headroom over the longest one but clear of the inter-coin pause
+    intra = [v for v in clean if threshold is None or v < threshold]
+    inter = [v for v in clean if threshold is not None and v >= threshold]
+    suggested_debounce = round(min(0.02, max(0.002, 0.5 * min(intra))), 4) if intra else debounce
+    suggested_gap = gap
+    if intra:
+        suggested_gap = max(max(intra) * 1.5, max(intra) + 0.03)
+        if inter:
+            suggested_gap = min(suggested_gap, 0.8 * min(inter))
+        suggested_gap = round(suggested_gap, 3)
+
+    if expected is None:
+        # Without ground truth, group on the natural split with the suggested debounce
+        reference = [p for p, _ in replay(falling, threshold or gap, suggested_debounce)]
+    else:
+        reference = list(expected)
+
+    def score(g, d):
+        coins = replay(falling, g, d)
+        counts = [p for p, _ in coins]
+        latencies = [lat for _, lat in coins]
+        return {
+            "gap": g, "debounce": d, "coins": len(coins), "pulses": sum(counts),
+            "miscounted": miscounts(counts, reference),
+            "miscount_rate": round(miscounts(counts, reference) / max(1, len(reference)), 4),
+            "latency_avg": round(sum(latencies) / len(latencies), 3) if latencies else 0,
+            "latency_max": round(max(latencies), 3) if latencies else 0,
+        }
+
+    return {
+        "edges": len(edges),
+        "pulses": len(falling),
+        "width_hist": histogram(widths),
+        "interval_hist": histogram(intervals),
+        "width_min": round(min(widths), 4) if widths else None,
+        "width_max": round(max(widths), 4) if widths else None,
+        "intra_max": round(max(intra), 4) if intra else None,
+        "inter_min": round(min(inter), 4) if inter else None,
+        "reference_coins": reference,
+        "current": score(gap, debounce),
+        "suggested": score(suggested_gap, suggested_debounce),
+    }
+
+
+# --- CLI ---
+def _print_hist(title, rows):
+    print(title)
+    peak = max((c for _, c in rows), default=0) or 1
+    for label, count in rows:
+        if count:
+            print(f"  {label:>12} {count:6d} {'#' * max(1, round(40 * count / peak))}")
+
+
+def _print_report(report):
+    print(f"Edges: {report['edges']}  Pulses: {report['pulses']}  "
+          f"Width: {report['width_min']}-{report['width_max']}s  "
+          f"Longest in-coin spacing: {report['intra_max']}s  Shortest between coins: {report['inter_min']}s")
+    _print_hist("Pulse widths (LOW time):", report["width_hist"])
+    _print_hist("Falling-to-falling intervals:", report["interval_hist"])
+    for name in ("current", "suggested"):
+        r = report[name]
+        print(f"{name:>9}: gap={r['gap']}s debounce={r['debounce']}s -> {r['coins']} coins, "
+              f"{r['miscounted']} miscounted ({r['miscount_rate']:.1%}), "
+              f"latency avg {r['latency_avg']}s / max {r['latency_max']}s")
+
+
+def main(argv=None):
+    import config
+    parser = argparse.ArgumentParser(prog="pulse_trace", description="Record and analyze coin pulse traces.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="capture raw edges from the coin pin")
+    rec.add_argument("path")
+    rec.add_argument("--seconds", type=float, default=60)
+    rec.add_argument("--pin", type=int, default=int(config.COIN_PIN_WPI))
+    rec.add_argument("--line", type=int, default=getattr(config, "COIN_GPIO_LINE", None),
+                     help="GPIO chardev line offset (kernel timestamps); polls the backend if unset")
+    rec.add_argument("--chip", default=getattr(config, "COIN_GPIO_CHIP", "/dev/gpiochip0"))
+
+    ana = sub.add_parser("analyze", help="histograms, threshold suggestions and replay")
+    ana.add_argument("path")
+    ana.add_argument("--gap", type=float, default=float(getattr(config, "COIN_PULSE_GAP", 0.6)))
+    ana.add_argument("--debounce", type=float, default=float(getattr(config, "COIN_DEBOUNCE", 0.01)))
+    ana.add_argument("--expected", help="comma-separated pulses per coin actually inserted, e.g. 1,5,10")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        writer = TraceWriter(args.path, args.pin)
+        try:
+            if args.line is not None:
+                info = record_chardev(args.chip, args.line, args.seconds, writer)
+            else:
+                from hardware.gpio_backend import create_backend
+                gpio = create_backend(getattr(config, "GPIO_BACKEND", None))
+                gpio.setup()
+                gpio.input_pullup(args.pin)
+                info = record_polling(gpio, args.pin, args.seconds, writer)
+        finally:
+            writer.close()
+        print(f"Recorded {writer.edges} edges to {args.path} ({info})")
+    else:
+        _, _, edges = read_trace(args.path)
+        expected = [int(x) for x in args.expected.split(",")] if args.expected else None
+        _print_report(analyze(edges, args.gap, args.debounce, expected))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
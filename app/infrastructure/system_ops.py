@@ -76,46 +76,29 @@ class SystemOps:
         subprocess.run(["sudo", "reboot"])
 
     def _parse_log_line(self, line: str) -> dict | None:
-        """Parse a structured log line into a dict with timestamp, type, and message."""
-        import re
-        line = line.strip()
-        if not line:
-            return None
-        # Format: [timestamp] [TYPE] message
-        pattern = re.compile(r"\[(.+?)\] \[(.+?)\] (.*)")
-        match = pattern.search(line)
-        if match:
-            return {
-                "timestamp": match.group(1),
-                "type": match.group(2),
-                "message": match.group(3)
-            }
-        # Fallback: legacy format [timestamp] message
-        if line.startswith("[") and "]" in line:
-            split_idx = line.find("]")
-            return {"timestamp": line[1:split_idx], "type": "SYSTEM", "message": line[split_idx+1:].strip()}
-        return {"timestamp": "--", "type": "SYSTEM", "message": line}
+        from core.logger import parse_log_line
+        return parse_log_line(line)
 
     def get_system_logs(self, limit: int = 200, offset: int = 0, log_type: str = None) -> list:
-        """Return parsed log entries from system.log.
+        """Return log entries, newest first, from the indexed log store (logs.db).
         
         Args:
             limit:    Max entries to return.
             offset:   How many entries to skip from the most-recent end (for pagination).
-            log_type: Optional category filter — 'COIN', 'PORTAL', 'ADMIN', 'SECURITY', 'SYSTEM'.
-                      Maps to actual log types in the file.
+            log_type: Optional category filter — 'COIN', 'PORTAL', 'ADMIN', 'SECURITY', 'SYSTEM'
+                      (or an exact log type such as 'COIN_INSERT').
         """
-        logs = []
+        from core.log_store import log_store
+        try:
+            return log_store.query(limit=limit, offset=offset, log_type=log_type)
+        except Exception:
+            # Store not created yet or unreadable: fall back to parsing the current file
+            return self._read_log_file(limit, offset, log_type)
+
+    def _read_log_file(self, limit: int, offset: int, log_type: str = None) -> dict:
+        from core.log_store import TYPE_MAP
         if not os.path.exists("system.log"):
-            return logs
-
-        # Category → type keywords mapping (mirrors frontend getLogCategory)
-        TYPE_MAP = {
-            "COIN":     {"COIN_INSERT", "COIN_SUCCESS"},
-            "PORTAL":   {"PORTAL_EVENT"},
-            "ADMIN":    {"ADMIN_AUDIT"},
-            "SECURITY": {"SECURITY_ALERT", "CRITICAL"},
-        }
+            return {"logs": [], "total": 0, "offset": offset, "limit": limit}
 
         try:
             with open("system.log", "r") as f:
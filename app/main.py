@@ -1,4 +1,5 @@
 import os
+import time
 import asyncio
 import subprocess
 import secrets
@@ -16,6 +17,7 @@ from core import database, state
 import config
 from network import firewall
 from services import background
+from services.shutdown_service import load_snapshot
 from api.v1 import portal, admin
 from hardware import controller 
 
@@ -58,23 +60,78 @@ async def get_secure_openapi(username: str = Depends(verify_docs_access)):
 app.include_router(admin.router)
 app.include_router(portal.router)
 
+def warm_restart():
+    """
+    Puts connected users straight back online from their persisted deadlines.
+    The ipset and tc classes are rebuilt in bulk and conntrack is NOT flushed,
+    so established streams survive a plain app restart.
+    """
+    started = time.time()
+    now = time.time()
+    restored, expired = [], []
+
+    # A clean shutdown leaves the live sessions behind; fill in anything the DB lacks
+    snapshot = state.last_shutdown
+    if snapshot:
+        for session in snapshot.get("sessions", []):
+            # Connected users were all loaded at boot: never go to the DB per session
+            mac = session.get("mac")
+            data = state.users.get(mac) if state.users.is_resident(mac) else None
+            if data is None or data.get("status") != "connected": continue
+            if not data.get("expires_at") and session.get("expires_at"):
+                data["expires_at"] = session["expires_at"]
+            if not data.get("ip") and session.get("ip"):
+                data["ip"] = session["ip"]
+
+    for mac, data in state.users.with_status("connected"):
+        # Rows written before deadlines were persisted: treat "time" as what's left
+        expires_at = data.get("expires_at") or (now + data.get("time", 0))
+        if expires_at > now:
+            data["expires_at"] = expires_at
+            data["time"] = int(expires_at - now)
+            data["last_active"] = now
+            # The throttle flag isn't persisted: a used-up data plan means it was on
+            quota = data.get("quota_bytes")
+            if quota is not None and quota <= 0 and state.config.get("quota_exhausted_action", "block") == "throttle":
+                data["quota_throttled"] = True
+            restored.append((mac, data))
+        else:
+            data["time"] = 0
+            data["status"] = "expired"
+            data.pop("expires_at", None)
+            data.pop("quota_bytes", None)
+            expired.append((mac, data))
+
+    firewall.init_firewall(warm=True)
+    throttle = state.config.get("quota_throttle_mbps", 1)
+    firewall.restore_sessions((mac, data.get("ip"), throttle if data.get("quota_throttled") else None)
+                              for mac, data in restored)
+    database.sync_multiple_users(restored + expired)
+
+    shutdown_note = f"after clean {snapshot.get('reason')} shutdown" if snapshot else "after unclean stop"
+    print(f"Warm restart ({shutdown_note}): {len(restored)} session(s) restored, {len(expired)} expired in {time.time() - started:.2f}s")
+
 @app.on_event("startup")
 async def startup_event():
     print("Initializing System...")
     database.init_db()
-    state.users = database.load_users()
+    # Only the working set is loaded; idle history is reloaded on demand by MAC
+    state.users.load(database.load_users(active_only=True))
+    state.last_shutdown = load_snapshot()
     
-    # Reset states
-    for mac, data in state.users.items():
-        if data["status"] == "connected":
+    if state.config.get("warm_restart_enabled", True):
+        warm_restart()
+    else:
+        # Cold start: everyone is paused and must reconnect
+        for mac, data in state.users.with_status("connected"):
             data["status"] = "paused"
             database.sync_user(mac, data)
-            
-    firewall.init_firewall()
-    
-    try:
-        subprocess.run(["conntrack", "-F"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    except: pass
+                
+        firewall.init_firewall()
+        
+        try:
+            subprocess.run(["conntrack", "-F"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except: pass
 
     state.loop = asyncio.get_running_loop()
     controller.setup()
@@ -85,19 +142,24 @@ async def startup_event():
 def shutdown_event():
     print("System Shutting Down...")
     state.is_shutting_down = True
+
+    try: background.stop_background_tasks()
+    except: pass
     
     # Force close any active portal websockets to prevent them from blocking graceful shutdown
     if hasattr(state, "manager") and hasattr(state.manager, "active_connections"):
-        for mac, ws in list(state.manager.active_connections.items()):
-            try: asyncio.run_coroutine_threadsafe(ws.close(), state.loop)
-            except: pass
+        for mac, sockets in list(state.manager.active_connections.items()):
+            for ws in list(sockets):
+                try: asyncio.run_coroutine_threadsafe(ws.close(), state.loop)
+                except: pass
 
-    try: controller.turn_slot_off()
+    try: controller.turn_all_off()
     except: pass
     
     try: 
         fail_safe_path = os.path.join(ROOT_DIR, "fail_safe.sh")
-        subprocess.run([fail_safe_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        fail_safe_args = ["--keep-conntrack"] if state.config.get("warm_restart_enabled", True) else []
+        subprocess.run([fail_safe_path, *fail_safe_args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     except: pass
 
 if __name__ == "__main__":
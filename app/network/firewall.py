@@ -2,12 +2,20 @@ import subprocess
 import config
 import shutil
 import os
-import re
+from collections import namedtuple
 from core import state 
 
 # The name of the IPSet list where authorized users are stored
 IPSET_NAME = "authorized_users"
 
+# Per-direction accounting sets (hash:ip with counters), matched in mangle FORWARD:
+# rx = download (dst on the way out to the LAN), tx = upload (src coming in from the LAN)
+ACCT_RX_SET = "acct_rx"
+ACCT_TX_SET = "acct_tx"
+
+# One user's counters. bytes/packets are the totals (rx + tx).
+Traffic = namedtuple("Traffic", "bytes packets rx_bytes tx_bytes rx_packets tx_packets")
+
 import shutil
 
 # --- FIX: Better Conntrack Detection ---
@@ -57,7 +65,11 @@ def get_uid(ip):
     except:
         return 0
 
-def init_firewall():
+def init_firewall(warm=False):
+    """
+    Builds the iptables/ipset/tc setup. With warm=True the authorized set is
+    left alone so restore_sessions() can repopulate it in one atomic swap.
+    """
     print("Initializing Starlink-Optimized Firewall (IPSet + TC + Cloudflare DNS)...")
 
     # --- KERNEL PERFORMANCE TUNING ---
@@ -105,7 +117,12 @@ def init_firewall():
 
     # 4. Initialize IPSet
     run_cmd(f"ipset create {IPSET_NAME} hash:mac hashsize 1024 maxelem 65535 counters -exist")
-    run_cmd(f"ipset flush {IPSET_NAME}")
+    for acct_set in (ACCT_RX_SET, ACCT_TX_SET):
+        run_cmd(f"ipset create {acct_set} hash:ip hashsize 1024 maxelem 65535 counters -exist")
+    if not warm:
+        run_cmd(f"ipset flush {IPSET_NAME}")
+        run_cmd(f"ipset flush {ACCT_RX_SET}")
+        run_cmd(f"ipset flush {ACCT_TX_SET}")
 
     # 5. Standard IPTables Rules
     cmds = [
@@ -167,6 +184,13 @@ def init_firewall():
         # Block Unauthorized HTTPS (443) with DROP (iPhone Compatibility)
         f"iptables -A FORWARD -i {config.LAN_INTERFACE} -m set ! --match-set {IPSET_NAME} src -p tcp --dport 443 -j DROP",
 
+        # --- PER-DIRECTION ACCOUNTING ---
+        # mangle FORWARD sees every forwarded packet (the filter table accepts ESTABLISHED
+        # before the authorized_users match, so that set only counts new connections).
+        # No target: the set match just bumps the element's counters.
+        f"iptables -t mangle -A FORWARD -o {config.LAN_INTERFACE} -m set --match-set {ACCT_RX_SET} dst",
+        f"iptables -t mangle -A FORWARD -i {config.LAN_INTERFACE} -m set --match-set {ACCT_TX_SET} src",
+
         # --- STARLINK MSS CLAMPING (1300 to survive satellite CGNAT overhead) ---
         "iptables -t mangle -A FORWARD -p tcp --tcp-flags SYN,RST SYN -j TCPMSS --set-mss 1300",
 
@@ -212,38 +236,46 @@ def remove_speed_limit(ip):
             run_tc_cmd(f"tc filter del dev {config.LAN_INTERFACE} protocol ip parent ffff: prio {uid}")
     except Exception: pass
 
-def apply_speed_limit(ip):
-    if not ip: return
-    remove_speed_limit(ip)
+def speed_limit_cmds(ip, rate_mbps=None) -> list:
+    """
+    The tc commands (without the leading 'tc') that put one user behind the global
+    limit, or behind rate_mbps if given (e.g. a data plan that ran out).
+    """
+    if not ip: return []
+    if rate_mbps is None and not state.config.get("speed_limit_enabled", False): return []
 
-    if not state.config.get("speed_limit_enabled", False): return 
-    
-    speed_val = state.config.get("global_speed_limit", 5)
+    speed_val = rate_mbps if rate_mbps is not None else state.config.get("global_speed_limit", 5)
     speed_str = f"{speed_val}mbit"
     upload_kbps = speed_val * 1024
     gaming_mode = state.config.get("gaming_mode_enabled", False)
 
-    try:
-        uid = get_uid(ip)
-        if uid == 0: return
-        
-        # Create per-user HTB class for hard rate limiting
-        cmd_dl = f"tc class add dev {config.LAN_INTERFACE} parent 1:ffff classid 1:{uid:x} htb rate {speed_str} ceil {speed_str} burst 15k cburst 15k"
-        run_tc_cmd(cmd_dl)
+    uid = get_uid(ip)
+    if uid == 0: return []
 
-        if gaming_mode:
-            # cake with diffserv4: auto-prioritizes DSCP-marked gaming/VoIP packets inside user's class
-            run_tc_cmd(f"tc qdisc add dev {config.LAN_INTERFACE} parent 1:{uid:x} handle {uid:x}: cake bandwidth {speed_str} diffserv4")
-        else:
-            # cake standard: better AQM than fq_codel (COBALT algorithm, lower latency under load)
-            run_tc_cmd(f"tc qdisc add dev {config.LAN_INTERFACE} parent 1:{uid:x} handle {uid:x}: cake bandwidth {speed_str}")
+    cmds = [
+        # Create per-user HTB class for hard rate limiting
+        f"class add dev {config.LAN_INTERFACE} parent 1:ffff classid 1:{uid:x} htb rate {speed_str} ceil {speed_str} burst 15k cburst 15k",
+    ]
+    if gaming_mode:
+        # cake with diffserv4: auto-prioritizes DSCP-marked gaming/VoIP packets inside user's class
+        cmds.append(f"qdisc add dev {config.LAN_INTERFACE} parent 1:{uid:x} handle {uid:x}: cake bandwidth {speed_str} diffserv4")
+    else:
+        # cake standard: better AQM than fq_codel (COBALT algorithm, lower latency under load)
+        cmds.append(f"qdisc add dev {config.LAN_INTERFACE} parent 1:{uid:x} handle {uid:x}: cake bandwidth {speed_str}")
+
+    # Map user's download traffic to their class via destination IP filter
+    cmds.append(f"filter add dev {config.LAN_INTERFACE} protocol ip parent 1:0 prio {uid} u32 match ip dst {ip} flowid 1:{uid:x}")
+    # Upload Limit (Ingress Policing on LAN ingress)
+    cmds.append(f"filter add dev {config.LAN_INTERFACE} parent ffff: protocol ip prio {uid} u32 match ip src {ip} police rate {upload_kbps}kbit burst 12k drop flowid :1")
+    return cmds
+
+def apply_speed_limit(ip, rate_mbps=None):
+    if not ip: return
+    remove_speed_limit(ip)
 
-        # Map user's download traffic to their class via destination IP filter
-        run_tc_cmd(f"tc filter add dev {config.LAN_INTERFACE} protocol ip parent 1:0 prio {uid} u32 match ip dst {ip} flowid 1:{uid:x}")
-        
-        # Upload Limit (Ingress Policing on LAN ingress)
-        cmd_ul = f"tc filter add dev {config.LAN_INTERFACE} parent ffff: protocol ip prio {uid} u32 match ip src {ip} police rate {upload_kbps}kbit burst 12k drop flowid :1"
-        run_tc_cmd(cmd_ul)
+    try:
+        for cmd in speed_limit_cmds(ip, rate_mbps):
+            run_tc_cmd(f"tc {cmd}")
     except Exception: pass
 
 def refresh_all_limits(users_dict):
@@ -254,7 +286,51 @@ def refresh_all_limits(users_dict):
     for mac, data in users_dict.items():
         if data.get("status") == "connected" and data.get("ip"):
             remove_speed_limit(data["ip"])
-            apply_speed_limit(data["ip"])
+            throttle = state.config.get("quota_throttle_mbps", 1) if data.get("quota_throttled") else None
+            apply_speed_limit(data["ip"], throttle)
+
+# --- WARM RESTART ---
+
+def restore_sessions(sessions):
+    """
+    Re-authorizes many users at once after a restart: one `ipset restore` fills
+    temporary sets and swaps them in (no window where live sessions are missing),
+    one `tc -batch` rebuilds every speed-limit class.
+    sessions: iterable of (mac, ip, rate_mbps); rate_mbps None = the global limit.
+    """
+    sessions = list(sessions)
+
+    members = {
+        (IPSET_NAME, "hash:mac"): [mac for mac, _, _ in sessions],
+        (ACCT_RX_SET, "hash:ip"): [ip for _, ip, _ in sessions if ip],
+        (ACCT_TX_SET, "hash:ip"): [ip for _, ip, _ in sessions if ip],
+    }
+    lines = []
+    for (name, set_type), entries in members.items():
+        tmp = f"{name}_tmp"
+        lines += [f"create {name} {set_type} hashsize 1024 maxelem 65535 counters",
+                  f"create {tmp} {set_type} hashsize 1024 maxelem 65535 counters", f"flush {tmp}"]
+        lines += [f"add {tmp} {entry}" for entry in entries]
+        lines += [f"swap {tmp} {name}", f"destroy {tmp}"]
+    try:
+        subprocess.run(["ipset", "-exist", "restore"], input="\n".join(lines) + "\n", text=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+    except subprocess.TimeoutExpired:
+        print("[Firewall Timeout] ipset restore", flush=True)
+    except Exception: pass
+
+    tc_lines = []
+    for _, ip, rate_mbps in sessions:
+        try: tc_lines += speed_limit_cmds(ip, rate_mbps)
+        except Exception: pass
+    if tc_lines:
+        try:
+            # -force keeps going past a single bad line instead of aborting the batch
+            subprocess.run(["tc", "-force", "-batch", "-"], input="\n".join(tc_lines) + "\n", text=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+        except subprocess.TimeoutExpired:
+            print("[TC Timeout] Batch restore", flush=True)
+        except Exception: pass
 
 # --- BLOCKING & AUTHORIZATION LOGIC ---
 
@@ -266,7 +342,7 @@ def block_user(mac, ip=None):
 
     # 2. Cleanup Speed Limits & Conntrack
     try:
-        user_ip = ip
+        user_ip = ip or state.users.ip_of(mac)
         if not user_ip:
             try:
                 with open('/proc/net/arp') as f:
@@ -277,6 +353,7 @@ def block_user(mac, ip=None):
             except Exception: user_ip = ""
         
         if user_ip:
+            remove_accounting(user_ip)
             remove_speed_limit(user_ip)
             if CONNTRACK_PATH:
                 run_cmd([CONNTRACK_PATH, "-D", "-s", user_ip])
@@ -294,32 +371,71 @@ def allow_user(mac, ip=None):
     run_cmd(["ipset", "add", IPSET_NAME, mac, "-exist"])
     
     # 2. Apply Speed Limit
-    if ip: apply_speed_limit(ip)
-
-def get_user_traffic(mac: str):
-    try:
-        res = subprocess.check_output(["ipset", "list", IPSET_NAME], text=True)
-        for line in res.splitlines():
-            if mac.upper() in line.upper():
-                match = re.search(r'bytes\s+(\d+)', line)
-                if match:
-                    total_bytes = int(match.group(1))
-                    return total_bytes, 0
-    except Exception: pass
-    return 0, 0
-
-def get_all_traffic():
+    if ip:
+        add_accounting(ip)
+        apply_speed_limit(ip)
+
+# --- TRAFFIC ACCOUNTING ---
+
+def add_accounting(ip, reset=True):
+    # Zero the counters too: the IP may have belonged to another device before (DHCP).
+    # reset=False only makes sure the entry exists and leaves its counters alone.
+    counters = ["packets", "0", "bytes", "0"] if reset else []
+    for acct_set in (ACCT_RX_SET, ACCT_TX_SET):
+        run_cmd(["ipset", "add", acct_set, ip, *counters, "-exist"])
+
+def remove_accounting(ip):
+    for acct_set in (ACCT_RX_SET, ACCT_TX_SET):
+        run_cmd(["ipset", "del", acct_set, ip, "-exist"])
+
+def _parse_ipset_list(output) -> dict:
+    """`ipset list` (all sets) -> {set_name: {member: (packets, bytes)}}."""
+    sets = {}
+    members = None
+    for line in output.splitlines():
+        if line.startswith("Name:"):
+            members = sets.setdefault(line.split(":", 1)[1].strip(), {})
+            continue
+        parts = line.split()
+        if members is None or "packets" not in parts or "bytes" not in parts:
+            continue
+        try:
+            members[parts[0].lower()] = (int(parts[parts.index("packets") + 1]), int(parts[parts.index("bytes") + 1]))
+        except (ValueError, IndexError): continue
+    return sets
+
+def get_all_traffic() -> dict:
+    """
+    {mac: Traffic} for every authorized user, from a single `ipset list`.
+    Direction comes from the per-IP accounting sets (IP -> MAC via the user
+    store); a user whose IP isn't tracked yet falls back to the MAC set's
+    combined counters with rx/tx at 0.
+    """
     traffic_data = {}
     try:
-        res = subprocess.check_output(["ipset", "list", IPSET_NAME], text=True)
-        for line in res.splitlines():
-            parts = line.split()
-            if "packets" in parts and "bytes" in parts:
-                try:
-                    mac = parts[0].lower()
-                    pkt_index = parts.index("packets") + 1
-                    byte_index = parts.index("bytes") + 1
-                    traffic_data[mac] = (int(parts[byte_index]), int(parts[pkt_index]))
-                except (ValueError, IndexError): continue
-    except Exception: pass
-    return traffic_data
\ No newline at end of file
+        res = subprocess.check_output(["ipset", "list"], text=True, timeout=5)
+    except Exception:
+        return traffic_data
+    sets = _parse_ipset_list(res)
+
+    rx_set = sets.get(ACCT_RX_SET, {})
+    tx_set = sets.get(ACCT_TX_SET, {})
+    for ip in rx_set.keys() | tx_set.keys():
+        mac = state.users.mac_of(ip)
+        if not mac: continue
+        rx_packets, rx_bytes = rx_set.get(ip, (0, 0))
+        tx_packets, tx_bytes = tx_set.get(ip, (0, 0))
+        traffic_data[mac.lower()] = Traffic(rx_bytes + tx_bytes, rx_packets + tx_packets,
+                                            rx_bytes, tx_bytes, rx_packets, tx_packets)
+
+    for mac, (packets, total_bytes) in sets.get(IPSET_NAME, {}).items():
+        if mac not in traffic_data:
+            traffic_data[mac] = Traffic(total_bytes, packets, 0, 0, 0, 0)
+    return traffic_data
+
+def get_user_traffic(mac: str):
+    """Returns (rx_bytes, tx_bytes) for one user."""
+    traffic = get_all_traffic().get(mac.lower())
+    if traffic is None:
+        return 0, 0
+    return traffic.rx_bytes, traffic.tx_bytes
\ No newline at end of file
@@ -0,0 +1,141 @@
+import json
+import time
+import threading
+
+from core import state
+from core.connection_manager import fan_out
+from services.sync_publisher import quota_mb
+
+STATUS_RANK = {"connected": 1, "expired": 3}
+
+
+def user_row(mac: str, user: dict, names: dict = None) -> dict:
+    """One admin user-table row. Connected users count down locally from expires_at."""
+    return {
+        "mac": mac,
+        "name": (names or {}).get(mac) or user.get("device_name"),
+        "ip": user.get("ip"),
+        "status": user.get("status"),
+        "time": user.get("time", 0),
+        "expires_at": user.get("expires_at") if user.get("status") == "connected" else None,
+        "balance": user.get("balance", 0),
+        "points": user.get("points", 0),
+        "quota_mb": quota_mb(user),
+    }
+
+
+def sort_key(row: dict):
+    """Same order as the /admin page: connected first, then by time left."""
+    return (STATUS_RANK.get(row["status"], 2), -(row["time"] or 0))
+
+
+class AdminUserFeed:
+    """
+    Live user-table deltas for the admin dashboard.
+
+    Store change events only mark MACs dirty; once a second publish() turns
+    them into rows, adds users that appeared or vanished (the store bumps
+    `version` for those) and the throughput of every user whose rates moved
+    since the monitor's last read. The whole delta is serialized once and
+    sent to every admin socket. Each message carries a sequence number so a
+    page can load the snapshot endpoint and drop deltas it already has.
+    """
+
+    SEND_TIMEOUT = 5.0
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+        self.seq = 0
+        self.messages_sent = 0
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._known = set(state.users.keys())
+        self._store_version = state.users.version
+        self._snapshot_time = 0.0
+        self._last_rates = {}
+
+    def on_user_change(self, mac, field, old, new):
+        """UserStore listener: may be called from any thread."""
+        with self._lock:
+            self._dirty.add(mac)
+
+    # --- SUBSCRIBERS (event loop only) ---
+    def subscribe(self, websocket):
+        self._subscribers.add(websocket)
+
+    def unsubscribe(self, websocket):
+        self._subscribers.discard(websocket)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    # --- DELTAS ---
+    def collect(self):
+        """Builds the pending delta (None when nothing changed) and resets the change tracking."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+
+        users = state.users.snapshot()
+        removed = []
+        if state.users.version != self._store_version:
+            self._store_version = state.users.version
+            current = set(users)
+            dirty |= current - self._known
+            removed = sorted(self._known - current)
+            self._known = current
+
+        rates = {}
+        if self.monitor.snapshot_time != self._snapshot_time:
+            self._snapshot_time = self.monitor.snapshot_time
+            latest = {mac: (t["rx_bps"], t["tx_bps"]) for mac, t in self.monitor.snapshot.items()}
+            rates = {mac: r for mac, r in latest.items() if self._last_rates.get(mac) != r}
+            # Users that dropped out of the accounting sets go back to zero
+            rates.update({mac: (0, 0) for mac in self._last_rates if mac not in latest})
+            self._last_rates = latest
+
+        names = state.config.get("custom_device_names", {})
+        rows = [user_row(mac, users[mac], names) for mac in sorted(dirty) if mac in users]
+        if not rows and not removed and not rates:
+            return None
+        self.seq += 1
+        return {"type": "users", "seq": self.seq, "server_time": time.time(),
+                "rows": rows, "removed": removed, "rates": rates}
+
+    async def publish(self):
+        """Scheduler job. Deltas nobody is listening for are simply discarded."""
+        delta = self.collect()
+        if delta is None or not self._subscribers:
+            return
+        text = json.dumps(delta, separators=(",", ":"))
+        self.messages_sent += 1
+        for ws in await fan_out(self._subscribers, text, self.SEND_TIMEOUT):
+            # A stuck tab has missed deltas: drop it, it resyncs from the snapshot on reconnect
+            self.unsubscribe(ws)
+            try: await ws.close()
+            except: pass
+
+    def snapshot(self, page: int = 1, per_page: int = 50, search: str = "", status: str = None) -> dict:
+        """Paginated table for the first load, tagged with the seq the deltas continue from."""
+        names = state.config.get("custom_device_names", {})
+        rows = [user_row(mac, user, names) for mac, user in state.users.snapshot().items()]
+        if search:
+            needle = search.lower()
+            rows = [r for r in rows if needle in r["mac"].lower() or needle in (r["name"] or "").lower()
+                    or needle in (r["ip"] or "")]
+        if status:
+            rows = [r for r in rows if r["status"] == status]
+        rows.sort(key=sort_key)
+
+        per_page = max(1, min(per_page, 500))
+        pages = max(1, -(-len(rows) // per_page))
+        page = max(1, min(page, pages))
+        page_rows = rows[(page - 1) * per_page:page * per_page]
+        for row in page_rows:
+            row["rx_bps"], row["tx_bps"] = self._last_rates.get(row["mac"], (0, 0))
+        return {
+            "seq": self.seq, "server_time": time.time(),
+            "total": len(rows), "page": page, "pages": pages, "per_page": per_page,
+            "users": page_rows,
+        }
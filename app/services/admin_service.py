@@ -25,29 +25,35 @@ class AdminService:
 
     def manage_user_time(self, mac: str, amount: int, unit: str, action: str):
         if mac in state.users:
-            amount = abs(int(amount))
-            seconds = amount * 3600 if unit == "hours" else amount * 60
-            
-            if action == "subtract": state.users[mac]["time"] -= seconds
-            elif action == "add": state.users[mac]["time"] += seconds
-            
-            if state.users[mac]["time"] < 0: state.users[mac]["time"] = 0
-            
-            if state.users[mac]["time"] == 0 and state.users[mac]["status"] == "connected":
-                state.users[mac]["status"] = "expired"
-                state.users[mac].pop("expires_at", None)
-                firewall.block_user(mac)
-            
-            if action == "add" and state.users[mac]["time"] > 0 and state.users[mac]["status"] == "expired":
-                 state.users[mac]["status"] = "connected"
-                 state.users[mac]["expires_at"] = time.time() + state.users[mac]["time"]
-                 firewall.allow_user(mac, state.users[mac].get("ip"))
-            
-            # If user is still connected, update deadline to reflect the new time
-            if state.users[mac]["status"] == "connected":
-                state.users[mac]["expires_at"] = time.time() + state.users[mac]["time"]
+            user = state.users[mac]
+            firewall_action = None
+            # Record changes only under the store lock; the firewall calls come after
+            with state.users.lock:
+                amount = abs(int(amount))
+                seconds = amount * 3600 if unit == "hours" else amount * 60
 
-            database.sync_user(mac, state.users[mac])
+                if action == "subtract": user["time"] -= seconds
+                elif action == "add": user["time"] += seconds
+
+                if user["time"] < 0: user["time"] = 0
+
+                if user["time"] == 0 and user["status"] == "connected":
+                    user["status"] = "expired"
+                    user.pop("expires_at", None)
+                    firewall_action = "block"
+
+                if action == "add" and user["time"] > 0 and user["status"] == "expired":
+                    user["status"] = "connected"
+                    firewall_action = "allow"
+
+                # If user is still connected, update deadline to reflect the new time
+                if user["status"] == "connected":
+                    user["expires_at"] = time.time() + user["time"]
+                ip = user.get("ip")
+
+            if firewall_action == "block": firewall.block_user(mac)
+            elif firewall_action == "allow": firewall.allow_user(mac, ip)
+            database.sync_user(mac, user)
 
     def update_user_status(self, mac: str, new_status: str):
         if mac in state.users:
@@ -58,5 +64,8 @@ class AdminService:
     def delete_user(self, mac: str):
         if mac in state.users:
             firewall.block_user(mac)
+            # Deleting skips the status change that normally ends the session
+            from services import background
+            background.usage_tracker.close(mac, "deleted")
             del state.users[mac]
             database.delete_user(mac)
\ No newline at end of file
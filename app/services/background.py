@@ -4,12 +4,23 @@ import asyncio
 import ctypes
 
 from core import state
+from core.connection_manager import COALESCE_TYPES, encode
 from hardware import controller
 
 # Import our new Clean Services
 from services.coin_service import CoinService
 from services.timer_service import TimerService
 from services.network_monitor import NetworkMonitorService
+from services.maintenance_service import MaintenanceService
+from services.shutdown_service import ShutdownCoordinator
+from services.scheduler import Scheduler
+from services.sync_publisher import SyncPublisher
+from services.usage_tracker import UsageTracker
+from services.coin_queue import CoinEventQueue
+from services.stats_sampler import StatsSampler
+from services.admin_feed import AdminUserFeed
+from core.log_tailer import LogTailer
+from infrastructure.system_ops import SystemOps
 
 # Import the centralized logger
 from core.logger import system_log
@@ -21,26 +32,63 @@ def set_linux_thread_name(name):
         libc.prctl(15, name[:15].encode('utf-8'), 0, 0, 0)
     except Exception: pass
 
+def _on_event_loop() -> bool:
+    try:
+        return asyncio.get_running_loop() is state.loop
+    except RuntimeError:
+        return False
+
 def send_ws_update(mac, data):
-    """Helper to send WebSocket messages safely from background threads."""
+    """Helper to send WebSocket messages safely from the loop or from background threads."""
     if hasattr(state, "loop") and state.loop and hasattr(state, "manager"):
+        # Nobody listening: don't even serialize
+        if mac not in state.manager.active_connections:
+            return
         try:
-            asyncio.run_coroutine_threadsafe(
-                state.manager.send_personal_message(data, mac), 
-                state.loop
-            )
+            if _on_event_loop():
+                # Scheduler jobs already run on the loop: straight onto the socket's queue
+                state.manager.send(mac, data)
+            else:
+                # Serialize on this thread; the loop only appends to the queue
+                key = data.get("type") if data.get("type") in COALESCE_TYPES else None
+                state.loop.call_soon_threadsafe(state.manager.send_text, mac, encode(data), key)
         except Exception as e: 
             system_log(f"WS Error: {e}")
 
 # Instantiate Services via Dependency Injection
+usage_tracker = UsageTracker()
 coin_svc = CoinService(send_ws_update)
-timer_svc = TimerService(send_ws_update)
-monitor_svc = NetworkMonitorService(send_ws_update)
 
+def _credit_coin(event):
+    try:
+        # Credit the user (even if they accidentally clicked cancel mid-count!)
+        coin_svc.process_coin(event["pulses"], event["mac"], event.get("uid"))
+    finally:
+        # Tell UI we are done counting so it can show the Cancel button again
+        coin_svc.notify_done_counting(event["mac"])
+
+# Listeners only count pulses; crediting (SQLite + WS) happens on the queue's consumer thread
+coin_queue = CoinEventQueue(_credit_coin)
+timer_svc = TimerService(send_ws_update, usage_tracker)
+monitor_svc = NetworkMonitorService(send_ws_update, usage_tracker)
+sync_publisher = SyncPublisher(send_ws_update)
+state.users.subscribe(sync_publisher.on_user_change)
+state.users.subscribe(usage_tracker.on_user_change)
+admin_feed = AdminUserFeed(monitor_svc)
+state.users.subscribe(admin_feed.on_user_change)
 
-def _coin_listener():
-    set_linux_thread_name("Piso-Coin")
-    system_log("Coin Listener STARTED (Polling Mode).")
+# Timer, slot-expiry, monitor and cron-style maintenance jobs all run on the
+# event loop. Only the coin listeners (one per slot) keep their own threads.
+scheduler = Scheduler(max_workers=4)
+shutdown_coordinator = ShutdownCoordinator(send_ws_update, scheduler, usage_tracker, coin_queue)
+maintenance_svc = MaintenanceService(shutdown_coordinator)
+stats_sampler = StatsSampler(SystemOps().get_system_stats, scheduler.run_blocking)
+log_tailer = LogTailer("system.log")
+
+
+def _coin_listener(slot):
+    set_linux_thread_name(f"Piso-Coin-{slot.number}")
+    system_log(f"Coin Listener STARTED (Slot {slot.number}, {slot.detection_mode} mode).")
     
     while True:
         try:
@@ -49,25 +97,22 @@ def _coin_listener():
             
             def on_first_pulse():
                 # Lock in the user MAC address on the very first pulse
-                active_user[0] = controller.current_slot_user
+                active_user[0] = slot.user
                 coin_svc.notify_counting(active_user[0])
 
             # Block here and wait for a coin to drop
-            coin_value = controller.wait_for_pulse(on_detected=on_first_pulse)
+            coin_value = slot.wait_for_pulse(on_detected=on_first_pulse)
             
             if coin_value > 0:
                 mac = active_user[0]
                 user_log = mac if mac else "Unknown_Device"
                 
                 # Log exactly how the UI expects it
-                system_log(f"[COIN_INSERT] {coin_value} pulse(s) by Device: {user_log}")
+                system_log(f"[COIN_INSERT] {coin_value} pulse(s) by Device: {user_log} (Slot {slot.number})")
                 
                 if mac:
-                    # Credit the user (even if they accidentally clicked cancel mid-count!)
-                    coin_svc.process_coin(coin_value, mac)
-                    
-                    # Tell UI we are done counting so it can show the Cancel button again
-                    coin_svc.notify_done_counting(mac)
+                    # Journal + hand off; back to watching the pin right away
+                    coin_queue.put(coin_value, mac, slot.number)
                 
             # Short sleep before waiting for the next customer
             time.sleep(0.1)
@@ -77,39 +122,59 @@ def _coin_listener():
             time.sleep(1)
             
             
-def _time_manager():
-    set_linux_thread_name("Piso-Timer")
-    system_log("Time Manager & Scheduler Started...")
-    ticks = 0
-    while True:
-        try:
-            time.sleep(1)
-            ticks += 1
-            
-            if ticks % 5 == 0: timer_svc.check_reboot_schedule()
-            
-            timer_svc.tick_users(ticks)
-            timer_svc.check_slot_expiry()
+class _TimerJob:
+    """1-second tick: in-memory work on the loop, firewall/DB work on the worker pool."""
+    def __init__(self):
+        self.ticks = 0
 
-            if ticks >= 30: ticks = 0
-        except Exception as e:
-            try: system_log(f"CRITICAL ERROR in Timer loop: {e}")
-            except: pass
-            time.sleep(1)
+    async def __call__(self):
+        self.ticks += 1
+        expired, users_to_sync = timer_svc.tick_users(self.ticks)
+        sync_publisher.publish()
+        if self.ticks >= 30: self.ticks = 0
+        # Finished sessions ride along with the next batch write instead of their own
+        if expired or users_to_sync or usage_tracker.pending:
+            await scheduler.run_blocking(timer_svc.flush_tick, expired, users_to_sync, usage_tracker.drain())
 
-def _connectivity_monitor():
-    set_linux_thread_name("Piso-Monitor")
-    system_log("Connectivity Monitor STARTED.")
-    while True:
-        try:
-            time.sleep(15)  # 5s → 15s: still fast enough for 900s idle timeout, 3x less overhead
-            monitor_svc.evaluate_all_connections()
-        except Exception as e:
-            try: system_log(f"CRITICAL ERROR in Monitor loop: {e}")
-            except: pass
-            time.sleep(1)
+def _ws_heartbeat():
+    """Pings quiet portal sockets, reaps dead ones. Returns the next interval (config is live)."""
+    interval = float(state.config.get("ws_ping_interval", 20))
+    reaped = state.manager.heartbeat(interval, float(state.config.get("ws_idle_timeout", 60)))
+    if reaped:
+        system_log(f"[SYSTEM] Reaped {reaped} unresponsive portal socket(s).")
+    return interval
 
 def start_background_tasks():
-    threading.Thread(target=_coin_listener, name="Piso-Coin", daemon=True).start()
-    threading.Thread(target=_time_manager, name="Piso-Timer", daemon=True).start()
-    threading.Thread(target=_connectivity_monitor, name="Piso-Monitor", daemon=True).start()
\ No newline at end of file
+    """Must be called from the running event loop (FastAPI startup)."""
+    coin_queue.start()
+    # One listener per coin acceptor
+    for slot in controller.slots:
+        threading.Thread(target=_coin_listener, args=(slot,), name=f"Piso-Coin-{slot.number}", daemon=True).start()
+
+    scheduler.add_job("timer", _TimerJob(), interval=1, deadline=0.5)
+    scheduler.add_job("slot_expiry", timer_svc.check_slot_expiry, interval=1, deadline=0.2)
+    scheduler.add_job("evict_idle", timer_svc.evict_idle_users, interval=30, jitter=2, blocking=True)
+    # Adaptive: the monitor returns its next interval (5-30s, faster near idle timeouts)
+    scheduler.add_job("monitor", monitor_svc.evaluate_all_connections, interval=15, jitter=1, blocking=True)
+    scheduler.add_job("admin_feed", admin_feed.publish, interval=1, deadline=0.5)
+    scheduler.add_job("system_stats", stats_sampler, interval=state.config.get("system_stats_interval", 3))
+    scheduler.add_job("ws_heartbeat", _ws_heartbeat, interval=state.config.get("ws_ping_interval", 20), jitter=1)
+
+    for name, func in maintenance_svc.jobs.items():
+        cron, enabled = maintenance_svc.job_config(name)
+        try:
+            scheduler.add_cron_job(name, func, cron, enabled=enabled,
+                                   blocking=not asyncio.iscoroutinefunction(func))
+        except ValueError as e:
+            system_log(f"[CRITICAL] Maintenance job '{name}' not scheduled: {e}")
+
+    scheduler.start()
+    system_log("Scheduler STARTED (timer, slot_expiry, evict_idle, monitor, admin_feed, system_stats, ws_heartbeat + maintenance jobs).")
+
+def reschedule_maintenance_job(name):
+    """Re-reads a maintenance job's config (cron/enabled) and recomputes its next fire time."""
+    cron, enabled = maintenance_svc.job_config(name)
+    scheduler.reschedule(name, cron, enabled)
+
+def stop_background_tasks():
+    scheduler.stop()
\ No newline at end of file
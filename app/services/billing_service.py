@@ -51,4 +51,35 @@ class BillingService:
                 total_points += count * val
                 rem_balance %= denom
                 
-        return round(total_points, 2)
\ No newline at end of file
+        return round(total_points, 2)
+
+    def calculate_quota_from_balance(self, balance: int):
+        """
+        Converts balance into data plans using "quota_rates" (amount:MB:validity_minutes).
+        Returns (megabytes, minutes, amount_used); change that buys no plan stays as balance.
+        """
+        rates_str = state.config.get("quota_rates", "")
+        rates = []
+        for part in rates_str.split(','):
+            try:
+                fields = part.strip().split(':')
+                amt, mb = int(fields[0]), int(fields[1])
+                minutes = int(fields[2]) if len(fields) > 2 else 1440
+                rates.append((amt, mb, minutes))
+            except (ValueError, IndexError):
+                continue
+
+        rates.sort(key=lambda x: x[0], reverse=True)
+
+        total_mb, total_minutes = 0, 0
+        remaining_balance = int(balance)
+
+        for amt, mb, minutes in rates:
+            if amt <= 0: continue
+            count = remaining_balance // amt
+            if count > 0:
+                total_mb += count * mb
+                total_minutes += count * minutes
+                remaining_balance %= amt
+
+        return total_mb, total_minutes, int(balance) - remaining_balance
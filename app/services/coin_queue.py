@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+from collections import deque
+
+from core.logger import system_log
+
+JOURNAL_FILE = "coin_queue.journal"
+
+
+class CoinEventQueue:
+    """
+    Hands counted coins from the GPIO listeners to a single crediting thread.
+
+    A listener only appends the event to a journal (page-cache write, no
+    fsync) and queues it, then goes straight back to watching its pin; the
+    SQLite writes and WS pushes happen on the consumer. Every event is
+    journaled before it's queued and acked once credited, so coins still
+    queued when the process dies - or that overflowed the bounded queue -
+    are credited on the next start. The journal is truncated whenever the
+    queue runs empty. Each event carries a `uid` that is stored with its
+    sale, so an event replayed after it was already credited is skipped.
+    """
+
+    def __init__(self, credit, path: str = JOURNAL_FILE, maxsize: int = 256):
+        self.credit = credit
+        self.path = path
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._next_id = 1
+        self._journal = None
+        self._thread = None
+        self.enqueued = 0
+        self.credited = 0
+        self.failed = 0
+        self.overflowed = 0
+        self.recovered = 0
+        self.max_depth = 0
+        self._latencies = deque(maxlen=200)
+
+    def start(self):
+        """Replays unacked events from the journal, then starts the consumer thread."""
+        pending = self._load_journal()
+        with self._lock:
+            # Rewrite the journal with just the survivors, renumbered
+            self._journal = open(self.path, "w")
+            for event in pending:
+                event.setdefault("uid", uuid.uuid4().hex)  # journals from before uids
+                event["id"] = self._next_id
+                self._next_id += 1
+                self._write(event)
+                self._pending.add(event["id"])
+        self._thread = threading.Thread(target=self._consume, name="Piso-Credit", daemon=True)
+        self._thread.start()
+        if pending:
+            self.recovered = len(pending)
+            system_log(f"[SYSTEM] Recovered {len(pending)} uncredited coin event(s) from the journal.")
+            for event in pending:
+                self._queue.put(event)  # startup: fine to wait for the consumer
+
+    def put(self, pulses: int, mac: str, slot: int = None, ts: float = None):
+        """Called by a coin listener: journal + enqueue, never blocks on the consumer."""
+        event = {"ts": time.time() if ts is None else ts, "pulses": int(pulses), "mac": mac, "slot": slot,
+                 "uid": uuid.uuid4().hex}
+        with self._lock:
+            event["id"] = self._next_id
+            self._next_id += 1
+            self._pending.add(event["id"])
+            try: self._write(event)
+            except Exception as e:
+                system_log(f"[CRITICAL] Coin journal write failed: {e}")
+        self.enqueued += 1
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Still journaled (unacked): it will be credited on the next start
+            self.overflowed += 1
+            system_log(f"[CRITICAL] Coin queue full ({self.maxsize}). {pulses} pulse(s) for {mac} deferred to restart.")
+            return
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def wait_empty(self, timeout: float = 3.0) -> bool:
+        """Blocks until every queued coin is credited (shutdown drain). Returns False on timeout."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def metrics(self) -> dict:
+        latencies = sorted(self._latencies)
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self.maxsize,
+            "max_depth": self.max_depth,
+            "journal_pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "credited": self.credited,
+            "failed": self.failed,
+            "overflowed": self.overflowed,
+            "recovered": self.recovered,
+            "latency_ms": {"last": round(self._latencies[-1] * 1000, 1) if latencies else None,
+                           "p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+        }
+
+    # --- CONSUMER ---
+    def _consume(self):
+        while True:
+            event = self._queue.get()
+            try:
+                self.credit(event)
+                self._latencies.append(time.time() - event["ts"])
+                self.credited += 1
+                self._ack(event["id"])
+            except Exception as e:
+                # Left unacked: replayed from the journal on the next start
+                self.failed += 1
+                system_log(f"[CRITICAL] Crediting {event['pulses']} pulse(s) for {event['mac']} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    # --- JOURNAL ---
+    def _write(self, record):
+        self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+
+    def _ack(self, event_id):
+        with self._lock:
+            self._pending.discard(event_id)
+            try:
+                if not self._pending:
+                    self._journal.seek(0)
+                    self._journal.truncate()
+                else:
+                    self._write({"ack": event_id})
+            except Exception as e:
+                system_log(f"[CRITICAL] Coin journal write failed: {e}")
+
+    def _load_journal(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        events, acked = {}, set()
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try: record = json.loads(line)
+                    except ValueError: continue  # torn last line
+                    if "ack" in record: acked.add(record["ack"])
+                    else: events[record["id"]] = record
+        except Exception as e:
+            system_log(f"[CRITICAL] Could not read coin journal: {e}")
+        return [e for i, e in sorted(events.items()) if i not in acked]
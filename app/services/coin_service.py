@@ -1,6 +1,7 @@
 import time
 from core import database, state
 from core.logger import system_log
+from hardware import controller
 import config
 
 class CoinService:
@@ -17,35 +18,53 @@ class CoinService:
         if mac:
             self.ws_sender(mac, {"type": "coin_counting", "is_counting": False})
 
-    def process_coin(self, pulses: int, mac: str):
-        """Converts pulses to balance, saves to DB, and instantly updates the UI."""
-        if pulses <= 0 or not mac or mac not in state.users:
+    def process_coin(self, pulses: int, mac: str, event_id: str = None):
+        """
+        Converts pulses to balance, saves to DB, and instantly updates the UI.
+        Raises if the DB write fails (the coin queue then keeps the event for replay).
+        """
+        if pulses <= 0 or not mac:
             system_log("[WARNING] Coin processed but no valid MAC address found.")
             return
 
+        # Replayed from the journal after it was already saved (crash before the ack)
+        if event_id and database.coin_recorded(event_id):
+            system_log(f"[SYSTEM] Coin event {event_id} for {mac} already credited, skipping replay.")
+            return
+
+        # The slot owner may have been evicted from memory (and never saved if brand new);
+        # never drop real money because of that.
+        with state.users.lock:
+            if mac not in state.users:
+                state.users[mac] = {"time": 0, "status": "new", "balance": 0, "free_claimed": 0, "points": 0}
+
         if state.users[mac].get("status") == "blocked":
             return
         
         # Extend the portal slot timeout so it doesn't close while they are dropping coins
-        state.config["slot_expiry_timestamp"] = time.time() + state.config.get("slot_timeout", 30)
+        controller.extend_slot(mac, state.config.get("slot_timeout", 30))
 
         # 1. Calculate actual currency amount based on config
         pulse_value = int(state.config.get("pulse_value", 1))
         amount = pulses * pulse_value
 
         user = state.users[mac]
-        current_balance = user.get("balance", 0)
-        new_balance = current_balance + amount
-        user["balance"] = new_balance
-        user["last_active"] = time.time()
-        
+        with state.users.lock:
+            current_balance = user.get("balance", 0)
+            new_balance = current_balance + amount
+            user["balance"] = new_balance
+            user["last_active"] = time.time()
+            record = dict(user)
+
         try:
-            # 2. Save the transaction permanently to the SQLite database
-            database.sync_user(mac, user)
-            database.add_sale(mac, amount)
-        except Exception as e:
-            system_log(f"[CRITICAL] Database write failed during coin process: {e}")
-            
+            # 2. Save the user and the sale permanently, in one transaction
+            database.record_coin(mac, record, amount, event_id)
+        except Exception:
+            # Take the credit back so the replay doesn't count it twice; the queue logs the failure
+            with state.users.lock:
+                user["balance"] = user.get("balance", 0) - amount
+            raise
+
         system_log(f"[COIN_SUCCESS] Credited {amount} to {mac}. Balance: {new_balance}")
 
         # 3. Push Live WebSocket Updates to the UI
@@ -0,0 +1,70 @@
+from core import database, state
+from core.logger import system_log, compact_logs
+from core.log_store import log_store
+from network import firewall
+
+
+class MaintenanceService:
+    """
+    Named off-peak jobs fired by the cron side of the Scheduler.
+    Plain functions run on the worker pool; the async reboot job runs on the loop.
+    """
+
+    def __init__(self, shutdown_coordinator):
+        self.shutdown_coordinator = shutdown_coordinator
+        self.jobs = {
+            "reboot": self.reboot,
+            "sales_rollup": self.sales_rollup,
+            "log_compaction": self.log_compaction,
+            "db_vacuum": self.db_vacuum,
+            "free_claim_reset": self.free_claim_reset,
+            "counter_snapshot": self.counter_snapshot,
+            "usage_rollup": self.usage_rollup,
+            "log_prune": self.log_prune,
+        }
+
+    @staticmethod
+    def job_config(name: str):
+        """Returns (cron, enabled) for a job from the current config."""
+        if name == "reboot":
+            schedule = state.config.get("restart_schedule", {})
+            return schedule.get("time", "03:00"), bool(schedule.get("enabled", False))
+        defaults = state.defaults["maintenance_jobs"].get(name, {})
+        job = {**defaults, **state.config.get("maintenance_jobs", {}).get(name, {})}
+        return job.get("cron"), bool(job.get("enabled", False))
+
+    # --- JOBS ---
+    async def reboot(self):
+        await self.shutdown_coordinator.shutdown(reason="scheduled")
+
+    def sales_rollup(self):
+        rows = database.rollup_sales_daily()
+        system_log(f"[SYSTEM] Sales rollup updated {rows} day(s).")
+
+    def log_compaction(self):
+        if compact_logs():
+            system_log("[SYSTEM] Log file rolled over.")
+
+    def db_vacuum(self):
+        database.vacuum()
+        system_log("[SYSTEM] Database vacuumed.")
+
+    def free_claim_reset(self):
+        database.reset_all_free_claimed()
+        for mac, user in state.users.items():
+            if user.get("free_claimed"):
+                user["free_claimed"] = 0
+        system_log("[SYSTEM] Free time claims reset.")
+
+    def counter_snapshot(self):
+        traffic = firewall.get_all_traffic()
+        database.save_traffic_snapshot(traffic)
+
+    def usage_rollup(self):
+        database.rollup_usage_daily()
+
+    def log_prune(self):
+        days = int(state.config.get("log_retention_days", 30))
+        removed = log_store.prune(days)
+        if removed:
+            system_log(f"[SYSTEM] Pruned {removed} log entries older than {days} day(s).")
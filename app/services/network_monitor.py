@@ -1,54 +1,189 @@
 import time
 from core import database, state
 from network import firewall
+from services.rate_estimator import RateEstimator
+from services.throughput_history import ThroughputHistory
 
 class NetworkMonitorService:
-    def __init__(self, ws_sender):
+    """
+    Auto-pause for idle users.
+
+    Activity is judged on smoothed (EWMA) byte and packet rates rather than on
+    raw deltas between two reads: keep-alive trickles settle below the
+    thresholds and get paused, while a user between bursts stays above them.
+    evaluate_all_connections() returns the delay until the next check, so the
+    scheduler polls faster only while someone is close to their idle timeout.
+
+    The per-read deltas also feed `history` (minute buckets, 24h per device)
+    for the throughput and top-talker admin views and the per-session usage
+    totals, and `snapshot` keeps the latest per-direction counters and rates
+    (download = rx, upload = tx).
+    """
+
+    def __init__(self, ws_sender, usage_tracker):
         self.ws_sender = ws_sender
+        self.usage = usage_tracker
+        self.rates = RateEstimator(tau=state.config.get("idle_rate_tau_seconds", 20))
+        self.history = ThroughputHistory(max_users=int(state.config.get("throughput_history_max_users", 256)))
+        self.snapshot = {}
+        self.snapshot_time = 0.0
+        # mac -> IP we made sure is in the accounting sets (DHCP may move a user)
+        self._accounted = {}
 
     def evaluate_all_connections(self):
-        if not state.config.get("auto_pause_enabled", True): 
-            return
+        min_interval = float(state.config.get("monitor_interval_min", 5))
+        max_interval = float(state.config.get("monitor_interval_max", 30))
+        auto_pause = state.config.get("auto_pause_enabled", True)
+
+        connected = state.users.macs_with_status("connected")
+        self.rates.retain(connected)
+        for mac in [m for m in self._accounted if m not in connected]:
+            del self._accounted[mac]
+        if not connected:
+            # Nobody to watch: skip the counter read entirely
+            self.snapshot = {}
+            return max_interval
 
         timeout_limit = int(state.config.get("inactive_timeout", 60))
-        packet_limit = int(state.config.get("inactive_packet_threshold", 5))
-        bytes_limit = int(state.config.get("inactive_bytes_threshold", 500))
+        bytes_rate_limit = float(state.config.get("inactive_bytes_rate", 1024))
+        packet_rate_limit = float(state.config.get("inactive_packet_rate", 2))
+        self.rates.tau = float(state.config.get("idle_rate_tau_seconds", 20))
         now = time.time()
+        next_check = max_interval
 
         try: all_traffic_stats = firewall.get_all_traffic()
         except: all_traffic_stats = {}
+        directions = self._update_snapshot(all_traffic_stats, now)
+
+        for mac, data in state.users.with_status("connected"):
+            if data.get("status") != "connected": continue
+
+            ip = data.get("ip")
+            if ip and self._accounted.get(mac) != ip:
+                # Connecting already added (and zeroed) the entry: only a DHCP move starts over
+                firewall.add_accounting(ip, reset=mac in self._accounted)
+                self._accounted[mac] = ip
+
+            traffic = all_traffic_stats.get(mac)
+            curr_bytes, curr_packets = (traffic.bytes, traffic.packets) if traffic else (0, 0)
+            delta = self.rates.update(mac, curr_bytes, curr_packets, now)
+            baseline = delta is None
+            if baseline:
+                # The counters were zeroed when the session (or its new IP) started:
+                # everything on them is traffic nobody has counted yet
+                delta = (curr_bytes, curr_packets)
+
+            if delta[0] or delta[1]:
+                self.history.add(mac, delta[0], delta[1], now)
+                self.usage.add(mac, delta[0], delta[1], *directions.get(mac, (0, 0)))
+
+            byte_rate, packet_rate = self.rates.rates(mac)
+
+            # --- DATA PLAN QUOTA ---
+            remaining = None
+            # Read-modify-write: a plan bought meanwhile (under the lock) must not be overwritten
+            with state.users.lock:
+                quota = data.get("quota_bytes")
+                if quota is not None and not data.get("quota_throttled"):
+                    remaining = quota - int(delta[0])
+                    data["quota_bytes"] = max(0, remaining)
+            if remaining is not None:
+                if remaining <= 0:
+                    if self._quota_exhausted(mac, data):
+                        continue
+                elif byte_rate > 0:
+                    # Read again before the current pace would run through what's left
+                    next_check = min(next_check, remaining / byte_rate)
+
+            if baseline:
+                # No rate yet: the idle clock starts now
+                data["last_active"] = now
+                next_check = min(next_check, timeout_limit)
+                continue
+
+            if not auto_pause:
+                continue
+
+            if byte_rate >= bytes_rate_limit or packet_rate >= packet_rate_limit:
+                data["last_active"] = now
+                next_check = min(next_check, timeout_limit)
+                continue
+
+            idle_time = now - data.get("last_active", now)
+            if idle_time <= timeout_limit:
+                # Check again right when this user would cross the timeout
+                next_check = min(next_check, timeout_limit - idle_time)
+                continue
+
+            with state.users.lock:
+                if data.get("status") != "connected": continue
+                # Freeze the remaining seconds so the pause doesn't lose/gain time
+                if "expires_at" in data:
+                    data["time"] = max(0, int(data["expires_at"] - time.time()))
+                    del data["expires_at"]
+                data["status"] = "paused"
+            self.rates.discard(mac)
+            try:
+                firewall.block_user(mac)
+                database.sync_user(mac, data)
+            except: pass
+
+            self.ws_sender(mac, {
+                "type": "sync",
+                "status": "paused",
+                "time_remaining": data.get("time", 0)
+            })
+
+        self.history.prune(now)
+        return min(max(next_check, min_interval), max_interval)
+
+    def _quota_exhausted(self, mac, data) -> bool:
+        """Applies quota_exhausted_action. Returns True if the user was cut off."""
+        from core.logger import system_log
+        if state.config.get("quota_exhausted_action", "block") == "throttle":
+            data["quota_throttled"] = True
+            throttle = state.config.get("quota_throttle_mbps", 1)
+            try: firewall.apply_speed_limit(data.get("ip"), throttle)
+            except: pass
+            system_log(f"[TIMER] User {mac} used up their data plan. Throttled to {throttle} Mbps.")
+            return False
+
+        with state.users.lock:
+            if data.get("status") != "connected": return True
+            data["time"] = 0
+            data["status"] = "expired"
+            data.pop("expires_at", None)
+            data.pop("quota_bytes", None)
+        self.rates.discard(mac)
+        system_log(f"[TIMER] User {mac} (IP: {data.get('ip')}) used up their data plan. Disconnecting...")
+        try:
+            firewall.block_user(mac, data.get("ip"))
+            database.sync_user(mac, data)
+        except: pass
+        return True
 
-        for mac, data in list(state.users.items()):
-            if data.get("status") == "connected":
-                curr_bytes, curr_packets = all_traffic_stats.get(mac, (0, 0))
-                prev_bytes = data.get("last_byte_count", 0)
-                prev_packets = data.get("last_packet_count", 0)
-                
-                # Baseline Init
-                if prev_bytes == 0 and curr_bytes > 0:
-                    data["last_byte_count"], data["last_packet_count"] = curr_bytes, curr_packets
-                    data["last_active"] = now
-                    continue
-
-                diff_bytes = max(0, curr_bytes - prev_bytes)
-                diff_packets = max(0, curr_packets - prev_packets)
-                data["last_byte_count"], data["last_packet_count"] = curr_bytes, curr_packets
-
-                is_active = (diff_bytes > bytes_limit) or (diff_packets >= packet_limit)
-                
-                if is_active:
-                    data["last_active"] = now 
-                else:
-                    idle_time = int(now - data.get("last_active", now))
-                    if idle_time > timeout_limit:
-                        data["status"] = "paused"
-                        try:
-                            firewall.block_user(mac)
-                            database.sync_user(mac, data)
-                        except: pass
-                        
-                        self.ws_sender(mac, {
-                            "type": "sync", 
-                            "status": "paused", 
-                            "time_remaining": data.get("time", 0)
-                        })
\ No newline at end of file
+    def _update_snapshot(self, traffic, now):
+        """
+        Latest rx/tx counters per user, with the average rates since the previous read.
+        Returns {mac: (rx_delta, tx_delta)} for the session usage totals.
+        """
+        previous, elapsed = self.snapshot, now - self.snapshot_time
+        snapshot = {}
+        directions = {}
+        for mac, t in traffic.items():
+            entry = {"rx_bytes": t.rx_bytes, "tx_bytes": t.tx_bytes,
+                     "rx_packets": t.rx_packets, "tx_packets": t.tx_packets,
+                     "rx_bps": 0, "tx_bps": 0}
+            prev = previous.get(mac)
+            if not prev or t.rx_bytes < prev["rx_bytes"] or t.tx_bytes < prev["tx_bytes"]:
+                # New or re-zeroed counters: all of it is new (same rule as the totals)
+                directions[mac] = (t.rx_bytes, t.tx_bytes)
+            else:
+                directions[mac] = (t.rx_bytes - prev["rx_bytes"], t.tx_bytes - prev["tx_bytes"])
+                if elapsed > 0:
+                    entry["rx_bps"] = int(directions[mac][0] * 8 / elapsed)
+                    entry["tx_bps"] = int(directions[mac][1] * 8 / elapsed)
+            snapshot[mac] = entry
+        self.snapshot = snapshot
+        self.snapshot_time = now
+        return directions
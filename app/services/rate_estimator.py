@@ -0,0 +1,85 @@
+import math
+from array import array
+
+
+class RateEstimator:
+    """
+    Per-user smoothed byte and packet rates (EWMA), kept in flat arrays.
+
+    Each MAC gets a slot index into parallel `array('d')` columns instead of a
+    dict per user, so hundreds of users cost a few KB and no per-sample objects.
+    Samples may arrive at any interval: the smoothing factor is derived from
+    the elapsed time (alpha = 1 - e^(-dt/tau)), so an adaptive poll interval
+    doesn't change how quickly the estimate reacts.
+    """
+
+    def __init__(self, tau: float = 20.0):
+        self.tau = float(tau)
+        self._slots = {}
+        self._free = []
+        self.byte_rate = array("d")
+        self.packet_rate = array("d")
+        self._last_bytes = array("d")
+        self._last_packets = array("d")
+        self._last_ts = array("d")
+
+    def __contains__(self, mac):
+        return mac in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _slot(self, mac):
+        slot = self._slots.get(mac)
+        if slot is not None:
+            return slot, False
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self.byte_rate)
+            for column in (self.byte_rate, self.packet_rate, self._last_bytes, self._last_packets, self._last_ts):
+                column.append(0.0)
+        self._slots[mac] = slot
+        return slot, True
+
+    def update(self, mac, total_bytes, total_packets, now):
+        """
+        Feeds a cumulative counter reading. Returns the (bytes, packets) delta
+        since the previous reading, or None for a first/reset sample (baseline
+        only). The smoothed per-second rates are then available from rates().
+        """
+        slot, is_new = self._slot(mac)
+        dt = now - self._last_ts[slot]
+        d_bytes = total_bytes - self._last_bytes[slot]
+        d_packets = total_packets - self._last_packets[slot]
+
+        self._last_bytes[slot] = total_bytes
+        self._last_packets[slot] = total_packets
+        self._last_ts[slot] = now
+
+        # First sample, or counters went backwards (ipset entry re-added): re-baseline
+        if is_new or dt <= 0 or d_bytes < 0 or d_packets < 0:
+            self.byte_rate[slot] = 0.0
+            self.packet_rate[slot] = 0.0
+            return None
+
+        alpha = 1.0 - math.exp(-dt / self.tau)
+        self.byte_rate[slot] += alpha * (d_bytes / dt - self.byte_rate[slot])
+        self.packet_rate[slot] += alpha * (d_packets / dt - self.packet_rate[slot])
+        return d_bytes, d_packets
+
+    def rates(self, mac):
+        slot = self._slots.get(mac)
+        if slot is None:
+            return 0.0, 0.0
+        return self.byte_rate[slot], self.packet_rate[slot]
+
+    def discard(self, mac):
+        slot = self._slots.pop(mac, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def retain(self, macs):
+        """Frees the slots of every MAC not in `macs`."""
+        for mac in [m for m in self._slots if m not in macs]:
+            self.discard(mac)
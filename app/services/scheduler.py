@@ -0,0 +1,359 @@
+import time
+import random
+import asyncio
+import functools
+from collections import deque
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from core.logger import system_log
+
+
+class Job:
+    """A periodic job plus its timing stats."""
+    def __init__(self, name, func, interval, jitter=0.0, deadline=None, blocking=False, initial_delay=None):
+        self.name = name
+        self.func = func
+        self.interval = float(interval)
+        self.jitter = float(jitter)
+        # Time budget for one run; defaults to the interval itself
+        self.deadline = float(deadline) if deadline else self.interval
+        self.blocking = blocking
+        self.initial_delay = self.interval if initial_delay is None else float(initial_delay)
+        self.task = None
+
+        self.runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_duration = 0.0
+        self.last_run = 0.0
+        self.last_error = None
+        self._last_overrun_log = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "deadline": self.deadline,
+            "blocking": self.blocking,
+            "runs": self.runs,
+            "failures": self.failures,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "last_run": self.last_run,
+            "last_duration_ms": round(self.last_duration * 1000, 2),
+            "avg_duration_ms": round(self.total_duration / self.runs * 1000, 2) if self.runs else 0,
+            "max_duration_ms": round(self.max_duration * 1000, 2),
+            "last_error": self.last_error,
+        }
+
+
+class CronSpec:
+    """
+    Minimal cron expression: "minute hour day-of-month month day-of-week".
+    Fields accept *, numbers, ranges (1-5), lists (1,15) and steps (*/10, 8-18/2).
+    Day-of-week is 0-6 with Sunday = 0 (7 also works). "HH:MM" means daily at that time.
+    """
+    FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7))
+
+    def __init__(self, expr: str):
+        self.expr = expr.strip()
+        parts = self.expr.split()
+        if len(parts) == 1 and ":" in parts[0]:
+            hh, mm = parts[0].split(":")
+            parts = [str(int(mm)), str(int(hh)), "*", "*", "*"]
+        if len(parts) != 5:
+            raise ValueError(f"Invalid cron expression: '{expr}'")
+
+        values = []
+        for text, (name, lo, hi) in zip(parts, self.FIELDS):
+            values.append(self._parse_field(text, name, lo, hi))
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        # Sunday can be 0 or 7; Python's weekday() has Monday = 0
+        self.weekdays = {(d % 7 + 6) % 7 for d in weekdays}
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(text, name, lo, hi) -> set:
+        result = set()
+        for chunk in text.split(","):
+            step = 1
+            if "/" in chunk:
+                chunk, step_text = chunk.split("/", 1)
+                step = int(step_text)
+                if step <= 0: raise ValueError(f"Invalid step in {name}: '{text}'")
+            if chunk == "*":
+                start, end = lo, hi
+            elif "-" in chunk:
+                start, end = (int(x) for x in chunk.split("-", 1))
+            else:
+                start = end = int(chunk)
+                if step != 1: end = hi
+            if start < lo or end > hi or start > end:
+                raise ValueError(f"{name} out of range in '{text}'")
+            result.update(range(start, end + 1, step))
+        return result
+
+    def _day_matches(self, dt: datetime) -> bool:
+        in_days = dt.day in self.days
+        in_weekdays = dt.weekday() in self.weekdays
+        # Classic cron: if both are restricted, either one matching is enough
+        if not self.any_day and not self.any_weekday:
+            return in_days or in_weekdays
+        return in_days and in_weekdays
+
+    def next_after(self, dt: datetime) -> datetime:
+        """First matching minute strictly after dt."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Cron expression never fires: '{self.expr}'")
+
+
+class CronJob:
+    """A job that fires at cron times; the next fire time is computed once per run."""
+    def __init__(self, name, func, spec, enabled=True, blocking=True):
+        self.name = name
+        self.func = func
+        self.spec = CronSpec(spec) if isinstance(spec, str) else spec
+        self.enabled = enabled
+        self.blocking = blocking
+        self.next_run = None
+        self.running = False
+        self.task = None
+        self.changed = asyncio.Event()
+
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None
+        self.last_duration = 0.0
+        self.last_error = None
+
+    def stats(self) -> dict:
+        return {
+            "cron": self.spec.expr if self.spec else None,
+            "enabled": self.enabled,
+            "running": self.running,
+            "next_run": self.next_run,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "last_duration_ms": round(self.last_duration * 1000, 2),
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """
+    Runs periodic jobs as tasks on the asyncio loop.
+
+    Cheap, in-memory jobs run directly on the loop. Jobs marked blocking=True
+    (subprocess, SQLite, sleeps) run on a small bounded thread pool so they never
+    stall the loop. A job may return a number to override its next interval.
+    """
+
+    # If we wake up this late for a cron job, the wall clock jumped (NTP sync after
+    # boot on a board without RTC): recompute instead of firing a stale job.
+    CRON_LATE_TOLERANCE = 120
+
+    def __init__(self, max_workers=4):
+        self.jobs = {}
+        self.cron_jobs = {}
+        self.history = deque(maxlen=100)
+        self.loop = None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Piso-Worker")
+
+    def add_job(self, name, func, interval, jitter=0.0, deadline=None, blocking=False, initial_delay=None):
+        job = Job(name, func, interval, jitter, deadline, blocking, initial_delay)
+        self.jobs[name] = job
+        if self.loop:
+            job.task = self.loop.create_task(self._run_job(job))
+        return job
+
+    def add_cron_job(self, name, func, spec, enabled=True, blocking=True):
+        job = CronJob(name, func, spec, enabled, blocking)
+        self.cron_jobs[name] = job
+        if self.loop:
+            job.task = self.loop.create_task(self._run_cron_job(job))
+        return job
+
+    def reschedule(self, name, spec=None, enabled=None):
+        """Changes a cron job's expression and/or enabled flag; the next fire time is recomputed."""
+        job = self.cron_jobs[name]
+        if spec is not None:
+            job.spec = CronSpec(spec) if isinstance(spec, str) else spec
+        if enabled is not None:
+            job.enabled = enabled
+        job.changed.set()
+
+    async def run_cron_now(self, name) -> dict:
+        """
+        Runs a cron job immediately (admin "run now"). Returns its history entry,
+        or {"skipped": "already running"} if a run is still in progress.
+        """
+        entry = await self._execute_cron(self.cron_jobs[name], trigger="manual")
+        return entry if entry is not None else {"job": name, "skipped": "already running"}
+
+    def start(self):
+        """Must be called from inside the running loop (e.g. the FastAPI startup event)."""
+        self.loop = asyncio.get_running_loop()
+        for job in self.jobs.values():
+            if job.task is None:
+                job.task = self.loop.create_task(self._run_job(job))
+        for job in self.cron_jobs.values():
+            if job.task is None:
+                job.task = self.loop.create_task(self._run_cron_job(job))
+
+    def stop(self):
+        for job in list(self.jobs.values()) + list(self.cron_jobs.values()):
+            if job.task:
+                job.task.cancel()
+                job.task = None
+        self.executor.shutdown(wait=False)
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Runs a blocking call on the worker pool and awaits its result."""
+        loop = self.loop or asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+    def cron_stats(self) -> dict:
+        return {name: job.stats() for name, job in self.cron_jobs.items()}
+
+    async def _run_cron_job(self, job: CronJob):
+        while True:
+            job.changed.clear()
+            if not job.enabled or job.spec is None:
+                job.next_run = None
+                await job.changed.wait()
+                continue
+
+            job.next_run = job.spec.next_after(datetime.now()).timestamp()
+
+            # Sleep until the fire time; wake early only if the job is rescheduled.
+            # The 60s cap keeps us honest if the wall clock is adjusted meanwhile.
+            rescheduled = False
+            while True:
+                remaining = job.next_run - time.time()
+                if remaining <= 0: break
+                try:
+                    await asyncio.wait_for(job.changed.wait(), timeout=min(60, remaining))
+                    rescheduled = True
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            if rescheduled:
+                continue
+            if time.time() - job.next_run > self.CRON_LATE_TOLERANCE:
+                continue
+
+            await self._execute_cron(job, trigger="schedule")
+
+    async def _execute_cron(self, job: CronJob, trigger: str):
+        """Runs the job once and returns the history entry (None if it was already running)."""
+        if job.running:
+            return None
+        job.running = True
+        started_wall = time.time()
+        started = time.monotonic()
+        error = None
+        try:
+            if job.blocking:
+                await self.run_blocking(job.func)
+            else:
+                result = job.func()
+                if asyncio.iscoroutine(result):
+                    await result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e)
+            job.failures += 1
+            try: system_log(f"[CRITICAL] Maintenance job '{job.name}' failed: {e}")
+            except: pass
+        finally:
+            job.running = False
+
+        duration = time.monotonic() - started
+        job.runs += 1
+        job.last_run = started_wall
+        job.last_duration = duration
+        job.last_error = error
+        entry = {
+            "job": job.name,
+            "trigger": trigger,
+            "started": started_wall,
+            "duration_ms": round(duration * 1000, 2),
+            "ok": error is None,
+            "error": error,
+        }
+        self.history.append(entry)
+        return entry
+
+    async def _run_job(self, job: Job):
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + job.initial_delay
+
+        while True:
+            delay = next_run - loop.time()
+            if job.jitter:
+                delay += random.uniform(0, job.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            started = loop.time()
+            job.last_run = time.time()
+            next_interval = None
+            try:
+                if job.blocking:
+                    result = await self.run_blocking(job.func)
+                else:
+                    result = job.func()
+                    if asyncio.iscoroutine(result):
+                        result = await result
+                if isinstance(result, (int, float)) and not isinstance(result, bool) and result > 0:
+                    next_interval = float(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.failures += 1
+                job.last_error = str(e)
+                try: system_log(f"[CRITICAL] Job '{job.name}' failed: {e}")
+                except: pass
+
+            duration = loop.time() - started
+            job.runs += 1
+            job.total_duration += duration
+            job.last_duration = duration
+            job.max_duration = max(job.max_duration, duration)
+            if duration > job.deadline:
+                job.overruns += 1
+                # Don't flood the log if a job keeps overrunning
+                if time.time() - job._last_overrun_log > 60:
+                    job._last_overrun_log = time.time()
+                    system_log(f"[SYSTEM] Job '{job.name}' overran: {duration:.2f}s (budget {job.deadline:.2f}s)")
+
+            if next_interval:
+                job.interval = next_interval
+            next_run += job.interval
+            now = loop.time()
+            if next_run < now:
+                # Fell behind: skip the missed slots instead of running back-to-back
+                missed = int((now - next_run) // job.interval) + 1
+                job.skipped += missed
+                next_run += missed * job.interval
@@ -13,35 +13,50 @@ class SessionService:
         self.billing = billing_service
 
     # Change to async def
-    async def connect_user(self, mac: str) -> dict: 
-        user = state.users.get(mac)
+    async def connect_user(self, mac: str, plan: str = "time") -> dict: 
+        # A miss reads SQLite: keep it off the event loop
+        user = await background.scheduler.run_blocking(state.users.get, mac)
         if user and user.get("status") == "blocked": 
             return {"result": "blocked"}
 
         if user:
-            balance = user.get("balance", 0)
-            if balance > 0:
-                added_minutes = self.billing.calculate_time_from_balance(balance)
-                user["time"] += (added_minutes * 60)
-                
-                if state.config.get("points_enabled", False):
-                    earned_points = self.billing.calculate_points_from_balance(balance)
-                    if "points" not in user: user["points"] = 0
-                    user["points"] = round(user["points"] + earned_points, 2)
-                
-                user["balance"] = 0
+            was_throttled = False
+            # Hold the store lock so a coin credited mid-conversion isn't wiped by balance = 0
+            with state.users.lock:
+                balance = user.get("balance", 0)
+                if balance > 0 and plan == "data":
+                    # Data plan: MB cap plus a validity window; unused change stays as balance
+                    added_mb, added_minutes, spent = self.billing.calculate_quota_from_balance(balance)
+                    if spent > 0:
+                        user["quota_bytes"] = (user.get("quota_bytes") or 0) + added_mb * 1024 * 1024
+                        user["time"] += (added_minutes * 60)
+                        was_throttled = bool(user.pop("quota_throttled", False))
+                        self._award_points(user, spent)
+                        user["balance"] = balance - spent
+                elif balance > 0:
+                    added_minutes = self.billing.calculate_time_from_balance(balance)
+                    user["time"] += (added_minutes * 60)
+                    self._award_points(user, balance)
+                    user["balance"] = 0
+
+                can_connect = user["time"] > 0
+                if can_connect:
+                    user["status"] = "connected"
+                    user["last_active"] = time.time()
+                    # Set the deadline timestamp — this is the single source of truth
+                    # for the timer while the user is connected.
+                    user["expires_at"] = time.time() + user["time"]
+
+            if balance > 0 and not can_connect:
                 database.sync_user(mac, user)
             
-            if user["time"] > 0:
-                user["status"] = "connected"
-                user["last_active"] = time.time()
-                # Set the deadline timestamp — this is the single source of truth
-                # for the timer while the user is connected.
-                user["expires_at"] = time.time() + user["time"]
+            if can_connect:
                 firewall.allow_user(mac, user.get("ip"))
+                if was_throttled:
+                    # Fresh data plan: drop the exhausted-quota throttle
+                    firewall.apply_speed_limit(user.get("ip"))
                 
-                if controller.current_slot_user == mac:
-                    controller.turn_slot_off()
+                controller.release_slot(mac)
                 
                 database.sync_user(mac, user)
                 
@@ -49,23 +64,28 @@ class SessionService:
                 await asyncio.sleep(1.0) 
                 
                 if mac in state.manager.active_connections:
-                    background.send_ws_update(mac, {
-                        "type": "sync", "status": "connected",
-                        "time_remaining": user["time"], "balance": 0,
-                        "points": user.get("points", 0) 
-                    })
+                    background.send_ws_update(mac, background.sync_publisher.build_message(user))
                 return {"result": "success"}
         return {"result": "fail"}
 
+    def _award_points(self, user: dict, amount: int):
+        if state.config.get("points_enabled", False):
+            earned_points = self.billing.calculate_points_from_balance(amount)
+            if "points" not in user: user["points"] = 0
+            user["points"] = round(user["points"] + earned_points, 2)
+
     def pause_user(self, mac: str) -> dict:
         if state.users.get(mac, {}).get("status") == "blocked": return {"result": "fail"}
-        if state.users.get(mac) and state.users[mac]["status"] == "connected":
-            user = state.users[mac]
-            # Snapshot true remaining seconds from deadline before clearing it
-            if "expires_at" in user:
-                user["time"] = max(0, int(user["expires_at"] - time.time()))
-                del user["expires_at"]
-            user["status"] = "paused"
+        user = state.users.get(mac)
+        with state.users.lock:
+            is_connected = bool(user) and user["status"] == "connected"
+            if is_connected:
+                # Snapshot true remaining seconds from deadline before clearing it
+                if "expires_at" in user:
+                    user["time"] = max(0, int(user["expires_at"] - time.time()))
+                    del user["expires_at"]
+                user["status"] = "paused"
+        if is_connected:
             firewall.block_user(mac)
             database.sync_user(mac, user)
             
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import asyncio
+import subprocess
+
+from core import database, state
+from core.logger import system_log, logger
+from hardware import controller
+
+SNAPSHOT_FILE = "shutdown_state.json"
+
+
+def load_snapshot(remove=True):
+    """
+    Reads the marker written by a clean shutdown (None after a crash/power cut).
+    Removed once read so a later unclean stop isn't mistaken for a clean one.
+    """
+    try:
+        with open(SNAPSHOT_FILE, "r") as f:
+            snapshot = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if remove:
+        try: os.remove(SNAPSHOT_FILE)
+        except: pass
+    return snapshot
+
+
+class ShutdownCoordinator:
+    """
+    Drains the system before a reboot, in phases, without blocking the event loop:
+
+      1. stop_coins - close the coin slots and refuse new slots, let a coin in flight settle and be credited
+      2. notify     - tell every open portal the system is restarting
+      3. flush      - freeze deadlines and write every resident user in ONE transaction
+      4. snapshot   - write the session list + shutdown marker used by the warm restart
+      5. sync       - flush filesystem buffers
+      6. reboot
+
+    Each phase is timed; the report is logged and kept in `last_report`.
+    """
+
+    # Time for a coin already dropping to finish counting after the relay is off
+    COIN_SETTLE_SECONDS = 1.0
+
+    def __init__(self, ws_sender, scheduler, usage_tracker, coin_queue):
+        self.ws_sender = ws_sender
+        self.scheduler = scheduler
+        self.usage = usage_tracker
+        self.coin_queue = coin_queue
+        self.in_progress = False
+        self.last_report = None
+        self.task = None
+
+    def start(self, reason="manual", reboot=True):
+        """
+        Runs shutdown() as a background task (so the caller's response still goes out).
+        The task is kept here: the loop only holds it weakly.
+        """
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.shutdown(reason=reason, reboot=reboot))
+            self.task.add_done_callback(self._on_task_done)
+        return self.task
+
+    @staticmethod
+    def _on_task_done(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[CRITICAL] Shutdown task failed: {task.exception()}")
+
+    async def shutdown(self, reason="scheduled", reboot=True):
+        if self.in_progress:
+            return self.last_report
+        self.in_progress = True
+        state.is_shutting_down = True
+        system_log(f"[SYSTEM] Shutdown started ({reason}).")
+
+        report = {"reason": reason, "started": time.time(), "phases": {}}
+        self.last_report = report
+        phases = [
+            ("stop_coins", self._stop_coins),
+            ("notify", self._notify),
+            ("flush", self._flush),
+            ("snapshot", lambda: self._snapshot(reason)),
+            ("sync", self._sync),
+        ]
+        if reboot:
+            phases.append(("reboot", self._reboot))
+
+        try:
+            for name, phase in phases:
+                started = time.monotonic()
+                try:
+                    await phase()
+                    error = None
+                except Exception as e:
+                    # Keep going: a failed phase must not leave the box half shut down
+                    error = str(e)
+                report["phases"][name] = {"ms": round((time.monotonic() - started) * 1000, 1), "error": error}
+
+                if name == "sync":
+                    # Last chance to get the timings on disk before the reboot
+                    timings = ", ".join(f"{n} {p['ms']}ms" for n, p in report["phases"].items())
+                    system_log(f"[SYSTEM] Shutdown drained in {sum(p['ms'] for p in report['phases'].values()):.0f}ms: {timings}")
+        finally:
+            reboot_phase = report["phases"].get("reboot")
+            if not reboot_phase or reboot_phase["error"]:
+                self._resume(reason, reboot_phase["error"] if reboot_phase else None)
+
+        return report
+
+    def _resume(self, reason, error=None):
+        """No reboot is coming: take coins and slot openings again instead of staying drained."""
+        if error:
+            try: logger.error(f"[CRITICAL] Reboot after {reason} shutdown failed: {error}. Resuming service.")
+            except: pass
+        # A clean-shutdown marker left behind would make a later crash look clean
+        try: os.remove(SNAPSHOT_FILE)
+        except: pass
+        state.is_shutting_down = False
+        self.in_progress = False
+
+    # --- PHASES ---
+    async def _stop_coins(self):
+        for slot in controller.slots:
+            if slot.user:
+                self.ws_sender(slot.user, {"type": "slot_closed"})
+        await self.scheduler.run_blocking(controller.turn_all_off)
+        await asyncio.sleep(self.COIN_SETTLE_SECONDS)
+        # Credit whatever the listeners already queued (anything left stays in the journal)
+        await self.scheduler.run_blocking(self.coin_queue.wait_empty, 3.0)
+
+    async def _notify(self):
+        state.manager.broadcast({"type": "system_message", "message": "System is restarting. Please wait..."})
+
+    async def _flush(self):
+        now = time.time()
+        to_sync = []
+        with state.users.lock:
+            for mac, data in state.users.items():
+                if data.get("status") == "connected" and data.get("expires_at"):
+                    data["time"] = max(0, int(data["expires_at"] - now))
+                if data.get("status") != "new" or data.get("balance") or data.get("points"):
+                    to_sync.append((mac, data))
+        self.usage.close_all("shutdown")
+        await self.scheduler.run_blocking(database.sync_multiple_users, to_sync, self.usage.drain())
+
+    async def _snapshot(self, reason):
+        sessions = [{"mac": mac, "ip": data.get("ip"), "expires_at": data.get("expires_at")}
+                    for mac, data in state.users.with_status("connected")]
+        snapshot = {"reason": reason, "timestamp": time.time(), "sessions": sessions}
+        await self.scheduler.run_blocking(self._write_snapshot, snapshot)
+
+    @staticmethod
+    def _write_snapshot(snapshot):
+        temp_file = SNAPSHOT_FILE + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, SNAPSHOT_FILE)
+
+    async def _sync(self):
+        await self.scheduler.run_blocking(os.sync)
+
+    async def _reboot(self):
+        # Fire and forget: systemd stops us (SIGTERM -> FastAPI shutdown) on its own
+        await self.scheduler.run_blocking(
+            subprocess.Popen, ["sudo", "systemctl", "reboot"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
@@ -0,0 +1,77 @@
+import json
+import time
+from collections import deque
+
+from core import state
+from core.connection_manager import fan_out
+
+
+class StatsSampler:
+    """
+    One system-stats sample per interval, shared by every admin stats socket.
+
+    The psutil/thermal reads run on the scheduler's worker pool, the result is
+    serialized once and the same text goes to all subscribers. Opening more
+    admin tabs adds a send, not another sampling loop. A short history of the
+    headline numbers is kept for charts.
+    """
+
+    SEND_TIMEOUT = 5.0
+
+    def __init__(self, sample, run_blocking, history: int = 200):
+        self.sample = sample
+        self.run_blocking = run_blocking
+        self.latest = None
+        self.latest_text = None
+        self.history = deque(maxlen=history)  # (ts, cpu, ram, temp, wan_rx_total, wan_tx_total)
+        self._subscribers = set()
+        self.samples = 0
+        self.failures = 0
+
+    # --- SUBSCRIBERS (event loop only) ---
+    async def subscribe(self, websocket):
+        """Adds an (accepted) socket and sends it the last sample right away."""
+        self._subscribers.add(websocket)
+        if self.latest_text:
+            try: await websocket.send_text(self.latest_text)
+            except: self.unsubscribe(websocket)
+
+    def unsubscribe(self, websocket):
+        self._subscribers.discard(websocket)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    # --- SAMPLING ---
+    async def __call__(self):
+        """Scheduler job: sample off the loop, then fan out. Returns the next interval."""
+        interval = float(state.config.get("system_stats_interval", 3))
+        try:
+            stats = await self.run_blocking(self.sample)
+        except Exception:
+            self.failures += 1
+            return interval
+        stats["ts"] = time.time()
+        self.latest = stats
+        self.latest_text = json.dumps(stats)
+        self.samples += 1
+        self.history.append((round(stats["ts"], 1), stats.get("cpu"), stats.get("ram"), stats.get("temp"),
+                             stats.get("wan_rx_total"), stats.get("wan_tx_total")))
+        await self._broadcast(self.latest_text)
+        return interval
+
+    async def _broadcast(self, text: str):
+        if not self._subscribers:
+            return
+        # A closed or stuck tab just stops getting updates
+        for ws in await fan_out(self._subscribers, text, self.SEND_TIMEOUT):
+            self.unsubscribe(ws)
+
+    def get_history(self, seconds: float = None) -> list:
+        rows = list(self.history)
+        if seconds:
+            cutoff = time.time() - seconds
+            rows = [r for r in rows if r[0] >= cutoff]
+        return [{"ts": ts, "cpu": cpu, "ram": ram, "temp": temp, "wan_rx_total": rx, "wan_tx_total": tx}
+                for ts, cpu, ram, temp, rx, tx in rows]
@@ -0,0 +1,85 @@
+import time
+import threading
+from core import state
+
+
+def quota_mb(user: dict):
+    """Remaining data plan in MB (one decimal), or None for time plans."""
+    quota = user.get("quota_bytes")
+    return None if quota is None else round(quota / (1024 * 1024), 1)
+
+
+class SyncPublisher:
+    """
+    Change-driven portal sync.
+
+    Instead of pushing a "sync" to every user every 5 seconds, a message is only
+    sent to MACs with an open portal socket, and only when their status, balance,
+    points or deadline changed, or when the coarse checkpoint comes around. The
+    portal counts down locally from `expires_at`, so it doesn't need per-second
+    updates.
+    """
+
+    def __init__(self, ws_sender):
+        self.ws_sender = ws_sender
+        self._dirty = set()
+        self._lock = threading.Lock()
+        # mac -> (status, balance, points, quota MB, expires_at, time) of the last message we sent
+        self._last_sent = {}
+        self._last_checkpoint = time.time()
+        self.messages_sent = 0
+
+    def on_user_change(self, mac, field, old, new):
+        """UserStore listener: may be called from any thread."""
+        with self._lock:
+            self._dirty.add(mac)
+
+    @staticmethod
+    def build_message(user: dict) -> dict:
+        message = {
+            "type": "sync",
+            "time_remaining": user.get("time", 0),
+            "status": user.get("status"),
+            "balance": user.get("balance", 0),
+            "points": user.get("points", 0),
+            "server_time": time.time()
+        }
+        if user.get("status") == "connected" and user.get("expires_at"):
+            message["expires_at"] = user["expires_at"]
+        # null tells the portal there's no data cap (time plan)
+        message["quota_mb"] = quota_mb(user)
+        return message
+
+    def publish(self):
+        """Runs every timer tick on the event loop."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+
+        sockets = state.manager.active_connections
+        now = time.time()
+        checkpoint_every = int(state.config.get("ws_sync_checkpoint_seconds", 60))
+        is_checkpoint = now - self._last_checkpoint >= checkpoint_every
+
+        if is_checkpoint:
+            self._last_checkpoint = now
+            targets = list(sockets.keys())
+            # Forget MACs whose portal is gone
+            for mac in list(self._last_sent):
+                if mac not in sockets: del self._last_sent[mac]
+        else:
+            targets = [mac for mac in dirty if mac in sockets]
+
+        # Only resident records: never hit SQLite from the loop for a sync
+        users = state.users.snapshot()
+        for mac in targets:
+            user = users.get(mac)
+            if user is None: continue
+            # The quota shrinks on every monitor pass: only resend when the shown MB changes.
+            # Deadline/time are in so admin time edits reach the portal countdown right away.
+            signature = (user.get("status"), user.get("balance", 0), user.get("points", 0), quota_mb(user),
+                         user.get("expires_at"), user.get("time"))
+            if not is_checkpoint and self._last_sent.get(mac) == signature:
+                continue
+            self._last_sent[mac] = signature
+            self.ws_sender(mac, self.build_message(user))
+            self.messages_sent += 1
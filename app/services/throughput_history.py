@@ -0,0 +1,115 @@
+import threading
+from array import array
+
+
+class ThroughputHistory:
+    """
+    Per-user traffic history: one fixed-size ring of minute buckets per MAC.
+
+    All users share flat arrays (`slot * buckets + minute % buckets`), so
+    24h at 1-minute resolution costs ~17 KB per device and nothing is
+    allocated per sample. A slot remembers the last minute it wrote; buckets
+    older than that are zeroed lazily when the ring moves forward, and on read
+    anything outside the window counts as zero.
+
+    Devices keep their history after disconnecting until it falls out of the
+    window or the slot is needed for someone else (oldest activity goes first).
+    """
+
+    def __init__(self, buckets: int = 1440, resolution: int = 60, max_users: int = 256):
+        self.buckets = buckets
+        self.resolution = resolution
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._free = []
+        self._bytes = array("Q")
+        self._packets = array("L")
+        self._last_bucket = array("q")
+
+    def __contains__(self, mac):
+        return mac in self._slots
+
+    def _slot(self, mac, bucket):
+        slot = self._slots.get(mac)
+        if slot is not None:
+            return slot
+        if not self._free and len(self._slots) >= self.max_users:
+            self._release_oldest()
+        if self._free:
+            slot = self._free.pop()
+            base = slot * self.buckets
+            for i in range(base, base + self.buckets):
+                self._bytes[i] = 0
+                self._packets[i] = 0
+        else:
+            slot = len(self._last_bucket)
+            self._bytes.extend(array("Q", [0]) * self.buckets)
+            self._packets.extend(array("L", [0]) * self.buckets)
+            self._last_bucket.append(0)
+        self._last_bucket[slot] = bucket
+        self._slots[mac] = slot
+        return slot
+
+    def _release_oldest(self):
+        oldest = min(self._slots, key=lambda m: self._last_bucket[self._slots[m]])
+        self._free.append(self._slots.pop(oldest))
+
+    def add(self, mac, n_bytes, n_packets, now):
+        """Adds a traffic delta to the bucket of `now`."""
+        bucket = int(now // self.resolution)
+        with self._lock:
+            slot = self._slot(mac, bucket)
+            base = slot * self.buckets
+            last = self._last_bucket[slot]
+            if bucket > last:
+                # Zero the buckets we skipped over (at most one full lap)
+                for b in range(max(last + 1, bucket - self.buckets + 1), bucket + 1):
+                    i = base + b % self.buckets
+                    self._bytes[i] = 0
+                    self._packets[i] = 0
+                self._last_bucket[slot] = bucket
+            elif bucket <= last - self.buckets:
+                return  # older than the window
+            i = base + bucket % self.buckets
+            self._bytes[i] += int(n_bytes)
+            self._packets[i] += int(n_packets)
+
+    def series(self, mac, minutes, now):
+        """Returns (start_ts, bytes_list, packets_list) for the last `minutes` buckets, oldest first."""
+        minutes = max(1, min(int(minutes), self.buckets))
+        end = int(now // self.resolution)
+        start = end - minutes + 1
+        byte_series = [0] * minutes
+        packet_series = [0] * minutes
+        with self._lock:
+            slot = self._slots.get(mac)
+            if slot is not None:
+                base = slot * self.buckets
+                last = self._last_bucket[slot]
+                for k in range(max(start, last - self.buckets + 1), min(end, last) + 1):
+                    i = base + k % self.buckets
+                    byte_series[k - start] = self._bytes[i]
+                    packet_series[k - start] = self._packets[i]
+        return start * self.resolution, byte_series, packet_series
+
+    def total(self, mac, minutes, now):
+        _, byte_series, packet_series = self.series(mac, minutes, now)
+        return sum(byte_series), sum(packet_series)
+
+    def top_talkers(self, minutes, now, limit=10):
+        """MACs with the most bytes in the last `minutes`, as [(mac, bytes, packets)]."""
+        horizon = int(now // self.resolution) - int(minutes)
+        with self._lock:
+            macs = [m for m, s in self._slots.items() if self._last_bucket[s] > horizon]
+        totals = [(mac, *self.total(mac, minutes, now)) for mac in macs]
+        totals = [t for t in totals if t[1] > 0]
+        totals.sort(key=lambda t: t[1], reverse=True)
+        return totals[:limit]
+
+    def prune(self, now):
+        """Frees the slots of devices with no traffic inside the window."""
+        horizon = int(now // self.resolution) - self.buckets
+        with self._lock:
+            for mac in [m for m, s in self._slots.items() if self._last_bucket[s] <= horizon]:
+                self._free.append(self._slots.pop(mac))
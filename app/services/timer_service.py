@@ -1,56 +1,25 @@
 import time
-import datetime
-import subprocess
 from core import database, state
 from network import firewall
 from hardware import controller
 
 class TimerService:
-    def __init__(self, ws_sender):
+    def __init__(self, ws_sender, usage_tracker):
         self.ws_sender = ws_sender
-        self.reboot_triggered = False
+        self.usage = usage_tracker
 
-    def check_reboot_schedule(self):
-        schedule = state.config.get("restart_schedule", {"enabled": False})
-        if not schedule.get("enabled"): return
-        
-        current_time = datetime.datetime.now().strftime("%H:%M")
-        target_time = schedule.get("time", "03:00")
-
-        if current_time == target_time and not self.reboot_triggered:
-            self.reboot_triggered = True 
-            
-            # 1. Notify UI
-            for user_mac in list(state.users.keys()):
-                self.ws_sender(user_mac, {"type": "system_message", "message": "System is restarting. Please wait..."})
-            
-            time.sleep(3) 
-            
-            # 2. Save Data
-            for user_mac, user_data in list(state.users.items()):
-                if user_data.get("status") != "new":
-                    try: database.sync_user(user_mac, user_data)
-                    except: pass
-            
-            # 3. Hardware Reboot
-            try: subprocess.run(["sync"], check=True)
-            except: pass
-            time.sleep(2)
-            try: subprocess.run(["sudo", "systemctl", "reboot"])
-            except: pass
-
-        if current_time != target_time:
-            self.reboot_triggered = False
-                
-                
     def tick_users(self, ticks: int):
+        """
+        In-memory pass over connected users (safe to run on the event loop).
+        Returns (expired, users_to_sync); hand them to flush_tick() off the loop.
+        """
+        expired = []
         users_to_sync = []
         now = time.time()
 
-        for mac, data in list(state.users.items()):
-            status = data.get("status")
-
-            if status == "connected":
+        # Only connected users have a running clock
+        for mac, data in state.users.with_status("connected"):
+            if data.get("status") == "connected":
                 expires_at = data.get("expires_at")
 
                 if expires_at is None:
@@ -64,44 +33,60 @@ class TimerService:
                 data["time"] = max(0, int(time_left))  # keep "time" in sync for DB writes
 
                 if time_left <= 0:
-                    data["time"] = 0
-                    data["status"] = "expired"
-                    data.pop("expires_at", None)
-                    try:
-                        from core.logger import system_log
-                        system_log(f"[TIMER] User {mac} (IP: {data.get('ip')}) out of time. Disconnecting...")
-                        firewall.block_user(mac, data.get("ip"))
-                        users_to_sync.append((mac, data))
-                    except Exception as e:
-                        import logging
-                        logging.error(f"Firewall block error: {e}")
+                    with state.users.lock:
+                        # Re-check: an admin/portal action may have extended or paused meanwhile
+                        if data.get("status") != "connected" or data.get("expires_at", 0) > now:
+                            continue
+                        data["time"] = 0
+                        data["status"] = "expired"
+                        data.pop("expires_at", None)
+                        # A data plan ends with its validity window
+                        data.pop("quota_bytes", None)
+                        data.pop("quota_throttled", None)
+                    expired.append((mac, data))
+                    users_to_sync.append((mac, data))
 
             # Queue DB sync every 30 seconds (data["time"] is already up-to-date above)
             if ticks >= 30 and data.get("status") == "connected":
                 users_to_sync.append((mac, data))
 
-            # Update UI every 5 seconds
-            if ticks % 5 == 0:
-                self.ws_sender(mac, {
-                    "type": "sync",
-                    "time_remaining": data.get("time", 0),
-                    "status": data.get("status"),
-                    "balance": data.get("balance", 0),
-                    "points": data.get("points", 0)
-                })
+        # UI updates are pushed by the SyncPublisher (change-driven, see background.py)
+        return expired, users_to_sync
+
+    def flush_tick(self, expired: list, users_to_sync: list, usage_rows: list = None):
+        """Blocking side of a tick: firewall blocks for expired users + one batch DB write (users + finished sessions)."""
+        for mac, data in expired:
+            try:
+                from core.logger import system_log
+                system_log(f"[TIMER] User {mac} (IP: {data.get('ip')}) out of time. Disconnecting...")
+                firewall.block_user(mac, data.get("ip"))
+            except Exception as e:
+                import logging
+                logging.error(f"Firewall block error: {e}")
 
         # Execute single batch write
-        if users_to_sync:
+        if users_to_sync or usage_rows:
             try:
-                database.sync_multiple_users(users_to_sync)
+                if not database.sync_multiple_users(users_to_sync, usage_rows) and usage_rows:
+                    self.usage.requeue(usage_rows)
             except Exception as e:
                 import logging
                 logging.error(f"Batch sync error: {e}")
 
+    def evict_idle_users(self):
+        """Drops long-idle zero-balance records from memory (they stay in SQLite)."""
+        state.users.max_users = int(state.config.get("user_cache_max", 500))
+        idle_seconds = int(state.config.get("user_idle_evict_seconds", 1800))
+        evicted = state.users.evict_idle(idle_seconds)
+        if evicted:
+            from core.logger import system_log
+            system_log(f"[SYSTEM] Evicted {evicted} idle device(s) from memory. Resident: {len(state.users)}")
+
     def check_slot_expiry(self):
-        if controller.current_slot_user:
-            slot_time_left = state.config.get("slot_expiry_timestamp", 0) - time.time()
-            if slot_time_left <= 0:
-                self.ws_sender(controller.current_slot_user, {"type": "slot_closed"})
-                try: controller.turn_slot_off()
+        now = time.time()
+        for slot in controller.slots:
+            mac = slot.user
+            if mac and slot.expires_at - now <= 0:
+                self.ws_sender(mac, {"type": "slot_closed"})
+                try: controller.release_slot(mac)
                 except: pass
\ No newline at end of file
@@ -0,0 +1,77 @@
+import time
+import threading
+
+
+class UsageTracker:
+    """
+    Per-session traffic totals, written to the `usage` table when a session ends.
+
+    A session opens when a user's status turns "connected" (or lazily, the first
+    time the monitor sees traffic for a connected user, e.g. after a warm
+    restart) and closes on any other status: paused, expired, blocked, or
+    when an admin deletes the user.
+    Traffic is added from the monitor's counter deltas. Closed sessions wait in
+    `pending` until the timer's batch sync writes them in the same transaction
+    as the user rows, so this adds no writes of its own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # mac -> [start_ts, bytes, packets, rx_bytes, tx_bytes]
+        self._open = {}
+        self._pending = []
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._pending)
+
+    def on_user_change(self, mac, field, old, new):
+        """UserStore listener: may be called from any thread."""
+        if field != "status" or old == new:
+            return
+        with self._lock:
+            if new == "connected":
+                self._open.setdefault(mac, [time.time(), 0, 0, 0, 0])
+            elif old == "connected":
+                self._close(mac, new)
+
+    def add(self, mac, n_bytes=0, n_packets=0, rx_bytes=0, tx_bytes=0):
+        with self._lock:
+            session = self._open.get(mac)
+            if session is None:
+                session = self._open[mac] = [time.time(), 0, 0, 0, 0]
+            session[1] += int(n_bytes)
+            session[2] += int(n_packets)
+            session[3] += int(rx_bytes)
+            session[4] += int(tx_bytes)
+
+    def _close(self, mac, end_status):
+        session = self._open.pop(mac, None)
+        if session is None:
+            return
+        start, n_bytes, n_packets, rx_bytes, tx_bytes = session
+        end = time.time()
+        self._pending.append((mac, int(start), int(end), int(end - start),
+                              n_bytes, n_packets, rx_bytes, tx_bytes, end_status))
+
+    def close(self, mac, end_status):
+        """Closes one user's open session (e.g. the record is being deleted)."""
+        with self._lock:
+            self._close(mac, end_status)
+
+    def close_all(self, end_status):
+        """Closes every open session (shutdown), so traffic so far isn't lost."""
+        with self._lock:
+            for mac in list(self._open):
+                self._close(mac, end_status)
+
+    def drain(self) -> list:
+        """Takes the closed sessions waiting to be written (rows for database.USAGE_INSERT)."""
+        with self._lock:
+            rows, self._pending = self._pending, []
+        return rows
+
+    def requeue(self, rows):
+        """Puts rows back after a failed write so the next batch retries them."""
+        with self._lock:
+            self._pending[:0] = rows
@@ -5,7 +5,10 @@
 ipset flush authorized_users 2>/dev/null
 
 # 2. Kill all active connections (Stop videos/games immediately)
-conntrack -F 2>/dev/null
+# Skipped with --keep-conntrack (warm restart: established streams survive the restart)
+if [ "$1" != "--keep-conntrack" ]; then
+    conntrack -F 2>/dev/null
+fi
 
 # 3. (Optional) Turn off Coin Slot Relay (GPIO 5 on Orange Pi)
 # We use 'gpio' command if available, or sysfs
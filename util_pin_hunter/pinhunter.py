@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+GPIO diagnostics for installers: find the coin/relay pins and check that this
+board samples fast enough to catch the acceptor's pulses.
+
+    sudo python3 pinhunter.py scan [--pins 3,5,7] [--seconds 30] [--rate 2000]
+    sudo python3 pinhunter.py pulse [--coin-pin 3] [--relay-pin 5]
+    sudo python3 pinhunter.py relay [--pins 5,7] [--on 2]
+    sudo python3 pinhunter.py state [--pin 3]
+    sudo python3 pinhunter.py reset
+    sudo python3 pinhunter.py record trace.ptr --seconds 120   (see app/hardware/pulse_trace.py)
+    sudo python3 pinhunter.py analyze trace.ptr --expected 1,5,10
+    python3 pinhunter.py traffic
+
+Every GPIO command takes --backend simulated (plus --simulate 5,1,10 to play
+coins on the coin pin), so the tool itself can be tried without a board.
+"""
+import os
+import sys
+import time
+import argparse
+
+# Run from anywhere: the app folder holds config.py and the GPIO backends
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+sys.path.insert(0, APP_DIR)
+
+import config
+from hardware.gpio_backend import create_backend
+
+# Safe PHYSICAL pins on Orange Pi 3 LTS (Pins 1-26 header)
+# Excludes 5V (2,4), 3.3V (1,17) and GND (6,9,14,20,25)
+VALID_PINS = [3, 5, 7, 8, 10, 11, 12, 13, 15, 16, 18, 19, 21, 22, 23, 24, 26]
+
+# Narrowest coin pulse we expect to see (most acceptors: 20-100 ms LOW)
+MIN_EXPECTED_PULSE_MS = 20
+
+
+def _pins(value):
+    return [int(p) for p in value.split(",")] if value else VALID_PINS
+
+
+def _backend(args):
+    gpio = create_backend(args.backend or getattr(config, "GPIO_BACKEND", None))
+    gpio.setup()
+    return gpio
+
+
+def _simulate(gpio, args, pin):
+    if args.simulate:
+        if gpio.name != "simulated":
+            sys.exit("--simulate needs --backend simulated")
+        gpio.play(pin, [int(c) for c in args.simulate.split(",")], interval=1.0)
+
+
+class EdgeStats:
+    """Edge counts and LOW pulse widths for one pin."""
+
+    def __init__(self):
+        self.falling = 0
+        self.rising = 0
+        self.widths = []
+        self._fell_at = None
+
+    def update(self, level, now):
+        if level == 0:
+            self.falling += 1
+            self._fell_at = now
+        else:
+            self.rising += 1
+            if self._fell_at is not None:
+                self.widths.append(now - self._fell_at)
+                self._fell_at = None
+
+    def summary(self):
+        if not self.widths:
+            return "-"
+        ms = sorted(w * 1000 for w in self.widths)
+        return f"min {ms[0]:.1f} / avg {sum(ms) / len(ms):.1f} / max {ms[-1]:.1f} ms"
+
+
+# --- COMMANDS ---
+def cmd_scan(args):
+    """Samples every candidate pin, reports edges, pulse widths and the achieved sampling rate."""
+    gpio = _backend(args)
+    pins = _pins(args.pins)
+    for pin in pins:
+        try: gpio.input_pullup(pin)
+        except Exception as e: print(f"   Could not set up pin {pin}: {e}")
+
+    print(f"Scanning {len(pins)} pin(s) for {args.seconds}s"
+          f"{f' at {args.rate} Hz' if args.rate else ' as fast as possible'}. Insert a coin now (Ctrl+C stops).")
+    stats = {pin: EdgeStats() for pin in pins}
+    last = {pin: gpio.read(pin) for pin in pins}
+    # Play the coins on the configured coin pin if it's being scanned, else on the first one
+    coin_pin = int(config.COIN_PIN_WPI)
+    _simulate(gpio, args, coin_pin if coin_pin in pins else pins[0])
+    period = 1.0 / args.rate if args.rate else 0
+    sweeps, worst_gap = 0, 0.0
+    start = prev = time.perf_counter()
+    end = start + args.seconds
+    try:
+        while True:
+            now = time.perf_counter()
+            if now >= end: break
+            worst_gap = max(worst_gap, now - prev)
+            prev = now
+            for pin in pins:
+                level = gpio.read(pin)
+                if level != last[pin]:
+                    stats[pin].update(level, now)
+                    last[pin] = level
+                    if level == 0 and stats[pin].falling == 1:
+                        print(f"   Pulse on PHYSICAL PIN {pin}  <--- FOUND IT!")
+            sweeps += 1
+            if period:
+                # Pace to the requested rate (sleep most of the way, spin the rest)
+                next_tick = start + sweeps * period
+                delay = next_tick - time.perf_counter()
+                if delay > 0.002: time.sleep(delay - 0.001)
+                while time.perf_counter() < next_tick: pass
+    except KeyboardInterrupt:
+        pass
+
+    elapsed = max(1e-9, time.perf_counter() - start)
+    rate = sweeps / elapsed
+    print()
+    print(f"Sampling: {rate:,.0f} sweeps/s over {len(pins)} pin(s) ({rate * len(pins):,.0f} reads/s), "
+          f"avg interval {1000 / max(rate, 1e-9):.3f} ms, worst gap {worst_gap * 1000:.2f} ms")
+    print(f"{'PIN':>4} | {'FALLING':>7} | {'RISING':>6} | PULSE WIDTH (LOW)")
+    for pin in pins:
+        s = stats[pin]
+        if s.falling or s.rising or args.all:
+            print(f"{pin:>4} | {s.falling:>7} | {s.rising:>6} | {s.summary()}")
+
+    # A pulse shorter than the worst gap between two samples of the same pin can be missed
+    catchable = worst_gap * 1000
+    verdict = "OK" if catchable * 2 <= MIN_EXPECTED_PULSE_MS else "TOO SLOW (pulses can be missed)"
+    print(f"Shortest pulse guaranteed to be seen: {catchable:.2f} ms -> {verdict} "
+          f"for {MIN_EXPECTED_PULSE_MS} ms coin pulses")
+
+
+def cmd_pulse(args):
+    """Powers the coin slot relay and prints every pulse, grouped into coins."""
+    gpio = _backend(args)
+    gpio.input_pullup(args.coin_pin)
+    gpio.output(args.relay_pin)
+    gpio.write(args.relay_pin, 1)
+    _simulate(gpio, args, args.coin_pin)
+    print(f"Relay {args.relay_pin} ON. Watching coin pin {args.coin_pin} (coins end after {args.gap}s of silence). Ctrl+C stops.")
+
+    stats, last, coin_pulses, last_pulse = EdgeStats(), 1, 0, 0.0
+    try:
+        while True:
+            now = time.perf_counter()
+            level = gpio.read(args.coin_pin)
+            if level != last:
+                stats.update(level, now)
+                if level == 0:
+                    coin_pulses += 1
+                    last_pulse = now
+                else:
+                    print(f"   pulse {coin_pulses}: width {stats.widths[-1] * 1000:.1f} ms")
+                last = level
+            if coin_pulses and now - last_pulse >= args.gap:
+                print(f"COIN: {coin_pulses} pulse(s)")
+                coin_pulses = 0
+            time.sleep(0.0005)
+    except KeyboardInterrupt:
+        print()
+    finally:
+        gpio.write(args.relay_pin, 0)
+        print(f"Relay {args.relay_pin} OFF. Total pulses: {stats.falling}, widths: {stats.summary()}")
+
+
+def cmd_relay(args):
+    """Turns each pin ON for a moment: watch the coin slot light or listen for the click."""
+    gpio = _backend(args)
+    pins = _pins(args.pins)
+    try:
+        for pin in pins:
+            print(f"Testing PHYSICAL PIN {pin} ...", end="", flush=True)
+            gpio.output(pin)
+            gpio.write(pin, 1)
+            print(" [ ON ] ", end="", flush=True)
+            time.sleep(args.on)
+            gpio.write(pin, 0)
+            print(" [ OFF ]")
+            gpio.input_pullup(pin)  # back to input for safety
+            time.sleep(0.5)
+        print("Scan complete.")
+    except KeyboardInterrupt:
+        print("\nStopped. Turning every pin off...")
+        cmd_reset(args)
+
+
+def cmd_state(args):
+    """Prints the level of one pin twice a second."""
+    gpio = _backend(args)
+    gpio.input_pullup(args.pin)
+    _simulate(gpio, args, args.pin)
+    try:
+        while True:
+            if gpio.read(args.pin) == 0: print(f"Pin {args.pin}: 0 (LOW) - ACTIVE/GROUNDED")
+            else: print(f"Pin {args.pin}: 1 (HIGH) - IDLE")
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+
+
+def cmd_reset(args):
+    gpio = _backend(args)
+    for pin in _pins(getattr(args, "pins", None)):
+        gpio.output(pin)
+        gpio.write(pin, 0)
+    print("All pins are now OFF.")
+
+
+def cmd_traffic(args):
+    """Live per-device counters from the accounting sets (what the idle monitor sees)."""
+    # The app runs from the repo root: that's where pisowifi.db lives
+    os.chdir(os.path.dirname(APP_DIR))
+    from core import database, state
+    from network import firewall
+    # Counters are keyed by IP; the user table maps them back to MACs
+    state.users.load(database.load_users(active_only=True))
+    prev = firewall.get_all_traffic()
+    try:
+        while True:
+            time.sleep(args.interval)
+            curr = firewall.get_all_traffic()
+            print(f"\n{'MAC ADDRESS':<18} | {'DOWN B/s':>10} | {'UP B/s':>10} | {'PKTS/s':>7}")
+            for mac, t in sorted(curr.items()):
+                p = prev.get(mac, t)
+                print(f"{mac:<18} | {(t.rx_bytes - p.rx_bytes) / args.interval:>10.0f} | "
+                      f"{(t.tx_bytes - p.tx_bytes) / args.interval:>10.0f} | {(t.packets - p.packets) / args.interval:>7.1f}")
+            if not curr: print("No users in the accounting sets.")
+            prev = curr
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pinhunter", description="PisoWifi GPIO diagnostics.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def gpio_command(name, func, help_text):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--backend", choices=["wiringpi", "simulated"], help="default: config.GPIO_BACKEND")
+        p.add_argument("--simulate", help="simulated backend: coins to play, e.g. 5,1,10")
+        p.set_defaults(func=func)
+        return p
+
+    p = gpio_command("scan", cmd_scan, "find the coin pin and measure the sampling rate")
+    p.add_argument("--pins", help=f"comma-separated physical pins (default: {len(VALID_PINS)} safe header pins)")
+    p.add_argument("--seconds", type=float, default=30)
+    p.add_argument("--rate", type=float, help="target sweeps per second (default: as fast as possible)")
+    p.add_argument("--all", action="store_true", help="list pins without edges too")
+
+    p = gpio_command("pulse", cmd_pulse, "power the slot and print pulse widths and coins")
+    p.add_argument("--coin-pin", type=int, default=int(config.COIN_PIN_WPI))
+    p.add_argument("--relay-pin", type=int, default=int(config.RELAY_PINS[0]))
+    p.add_argument("--gap", type=float, default=float(getattr(config, "COIN_PULSE_GAP", 0.6)))
+
+    p = gpio_command("relay", cmd_relay, "switch pins on one by one to find the relay")
+    p.add_argument("--pins")
+    p.add_argument("--on", type=float, default=2.0, help="seconds each pin stays on")
+
+    p = gpio_command("state", cmd_state, "print one pin's level")
+    p.add_argument("--pin", type=int, default=int(config.COIN_PIN_WPI))
+
+    p = gpio_command("reset", cmd_reset, "turn every pin off")
+    p.add_argument("--pins")
+
+    p = sub.add_parser("traffic", help="live per-device traffic from the firewall counters")
+    p.add_argument("--interval", type=float, default=2.0)
+    p.set_defaults(func=cmd_traffic)
+
+    for name in ("record", "analyze"):
+        p = sub.add_parser(name, help="pulse trace " + name + " (see hardware/pulse_trace.py)", add_help=False)
+        p.set_defaults(func=None)
+
+    args, rest = parser.parse_known_args(argv)
+    if args.func is None:
+        from hardware import pulse_trace
+        return pulse_trace.main([args.command] + rest)
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())